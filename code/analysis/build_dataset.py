@@ -11,6 +11,8 @@
                           成長性・収益性/アナリスト/最新四半期サマリ）
         - transcripts  : 決算トランスクリプト 1 四半期 = 1 行
                           （財務ハイライト + センチメント + 定型テキスト指標）
+        - correlations : 銘柄ごとの日次リターン相関上位 k 銘柄
+                          （code/data/correlation_peers.parquet があれば取り込む）
     code/analysis/stocks.parquet / transcripts.parquet ... 可搬なエクスポート
 
 データの用意:
@@ -33,6 +35,8 @@ from typing import Any, Iterable
 
 REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 ANALYSIS_DIR = os.path.dirname(os.path.abspath(__file__))
+# risk_return (correlation.py) が書き出す相関上位の索引
+CORRELATION_PEERS_PATH = os.path.join(os.path.dirname(ANALYSIS_DIR), "data", "correlation_peers.parquet")
 
 
 # --------------------------------------------------------------------------
@@ -370,6 +374,14 @@ def build(reports_dir: str, out_path: str) -> tuple[int, int]:
             con.execute(
                 f"COPY transcripts TO '{os.path.join(ANALYSIS_DIR, 'transcripts.parquet')}' (FORMAT PARQUET)"
             )
+        # 相関索引は Parquet をそのまま読み込む（行ごとの Python ループは不要）
+        con.execute("DROP TABLE IF EXISTS correlations")
+        if os.path.exists(CORRELATION_PEERS_PATH):
+            con.execute(
+                "CREATE TABLE correlations AS SELECT * FROM read_parquet(?)", [CORRELATION_PEERS_PATH]
+            )
+        else:
+            print(f"warning: 相関索引がありません（{CORRELATION_PEERS_PATH}）", file=sys.stderr)
     finally:
         con.close()
 
@@ -5,6 +5,7 @@
 -- テーブル:
 --   stocks       : 1 銘柄 = 1 行（最新スナップショット）
 --   transcripts  : 1 四半期 = 1 行（決算トランスクリプト）
+--   correlations : 銘柄 × 窓 (window_days) ごとの日次リターン相関上位 k 銘柄
 -- 比率系（margin, growth, yield, roe...）は小数（0.15 = 15%）で格納。
 
 
@@ -12,7 +13,7 @@
 -- 利用可能な列を確認する。
 SELECT table_name, column_name, data_type
 FROM information_schema.columns
-WHERE table_name IN ('stocks', 'transcripts', 'theme_metrics')
+WHERE table_name IN ('stocks', 'transcripts', 'theme_metrics', 'correlations')
 ORDER BY table_name, ordinal_position;
 
 
@@ -119,6 +120,17 @@ WHERE s.pe_forward > 0 AND s.pe_forward < m.sector_pe
 ORDER BY pe_vs_sector ASC;
 
 
+-- name: correlated_cross_sector
+-- 値動きが強く連動しているのにセクターが異なる組み合わせ（直近 252 取引日）。
+-- セクター分類では見えない共通のリスク要因の手掛かりになる。
+SELECT c.symbol, a.sector AS sector, c.peer, b.sector AS peer_sector, c.rank, c.corr
+FROM correlations c
+JOIN stocks a ON a.symbol = c.symbol
+JOIN stocks b ON b.symbol = c.peer
+WHERE c.window_days = 252 AND c.corr >= 0.7 AND a.sector <> b.sector
+ORDER BY c.corr DESC;
+
+
 -- name: transcript_sentiment_movers
 -- 直近決算トランスクリプトのセンチメントが特に高い / 低い銘柄。
 SELECT s.symbol, s.security_ja, s.sector,
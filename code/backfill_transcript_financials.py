@@ -14,7 +14,8 @@ import argparse
 import sys
 import time
 
-from defeatbeta_api.data.ticker import Ticker
+# utils 経由で import すると defeatbeta の update_time 正規化パッチが当たる
+from utils import DBTicker as Ticker
 
 from generate_transcript_report import (
     fetch_quarter_financials,
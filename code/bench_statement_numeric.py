@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""財務諸表の数値化 (statement_numeric) と従来のセルごとの変換の速度比較。
+
+ネットワークを使わず、 実データと同じ形の DataFrame を合成して計測する:
+  - yfinance   : 行 = 項目 (約 40〜80)、 列 = 期末日 (年次 4〜5 / 四半期 5〜6)、 float64
+  - defeatbeta : 行 = 項目 (約 40〜70)、 列 = 期末日 (四半期 約 40)、 object
+                 (Decimal が大半、 未開示は '*'、 一部 None)
+両者の結果が一致することも確認する (不一致なら exit 1)。
+
+使い方:
+    python bench_statement_numeric.py
+    python bench_statement_numeric.py --repeat 50
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+
+import statement_numeric
+
+# (名前, 行数, 列数, defeatbeta 形式か)
+SHAPES = (
+    ("yfinance balance_sheet (annual)", 80, 5, False),
+    ("yfinance income_stmt (quarterly)", 45, 6, False),
+    ("yfinance cashflow (annual)", 70, 5, False),
+    ("defeatbeta quarterly_income_statement", 45, 40, True),
+    ("defeatbeta quarterly_balance_sheet", 70, 40, True),
+    ("defeatbeta quarterly_cash_flow", 60, 40, True),
+)
+
+
+def legacy_coerce(pandas_df):
+    """従来の fundamentals.extract_with_aliases の変換 (セルごとの文字列判定 + to_numeric)。"""
+    pandas_df = pandas_df.copy()
+    for col in pandas_df.columns:
+        if pandas_df[col].dtype == object:
+            pandas_df[col] = pandas_df[col].apply(lambda x: float(x) if x is not None and str(x).replace('.','',1).replace('-','',1).isdigit() else np.nan if x == '*' else x)
+        pandas_df[col] = pd.to_numeric(pandas_df[col], errors='coerce').astype(float)
+    return pandas_df
+
+
+def make_statement(rows, cols, defeatbeta, seed=0):
+    rng = np.random.default_rng(seed)
+    values = rng.normal(0, 1e9, (rows, cols)).round(0)
+    missing = rng.random((rows, cols)) < 0.15
+    index = [f"Item {i}" for i in range(rows)]
+    columns = [str(d.date()) for d in pd.date_range("2015-03-31", periods=cols, freq="QE")][::-1]
+    if not defeatbeta:
+        values[missing] = np.nan
+        return pd.DataFrame(values, index=index, columns=columns)
+    cells = np.empty((rows, cols), dtype=object)
+    cells[:] = [[Decimal(str(v)) for v in row] for row in values]
+    cells[missing] = "*"
+    cells[rng.random((rows, cols)) < 0.02] = None
+    return pd.DataFrame(cells, index=index, columns=columns)
+
+
+def best_time(func, df, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t = time.perf_counter()
+        func(df)
+        best = min(best, time.perf_counter() - t)
+    return best
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=20, help="計測回数 (最速値を採る)")
+    args = parser.parse_args(argv)
+
+    failed = False
+    print(f"{'statement':<40} {'shape':>8} {'legacy':>10} {'new':>10} {'speedup':>8}")
+    for i, (name, rows, cols, defeatbeta) in enumerate(SHAPES):
+        df = make_statement(rows, cols, defeatbeta, seed=i)
+        if not legacy_coerce(df).equals(statement_numeric.coerce_statement_frame(df)):
+            print(f"{name}: 結果が一致しません")
+            failed = True
+        legacy = best_time(legacy_coerce, df, args.repeat)
+        new = best_time(statement_numeric.coerce_statement_frame, df, args.repeat)
+        print(f"{name:<40} {rows:>3}x{cols:<4} {legacy * 1e3:>8.2f}ms {new * 1e3:>8.2f}ms {legacy / new:>7.1f}x")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
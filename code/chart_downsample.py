@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""長い時系列トレースの間引き (LTTB: Largest-Triangle-Three-Buckets)。
+
+日足 10 年分 (約 2,500 点) をそのままレポート JSON に載せると、 描画幅
+(数百 px) に対して点が多すぎる。 LTTB は先頭・末尾の点を残し、 間を
+CHART_MAX_POINTS - 2 個のバケツに分けて、 各バケツから「前のバケツで選んだ点・
+次のバケツの平均」と作る三角形の面積が最大の点を 1 つ選ぶ。 山・谷の形が
+保たれるので、 見た目はほぼ変わらない。
+
+本来の LTTB は前のバケツの選択結果に依存する逐次処理だが、 ここでは
+バケツを 2 次元配列に並べて全バケツを一括で計算する:
+  1 回目: 前のバケツの平均を起点に選ぶ
+  2 回目: 1 回目に前のバケツで選んだ点を起点に選び直す
+NaN (欠損) の点は線の切れ目を保つため常に残す。 そのため欠損のある系列では
+残る点が最大で CHART_MAX_POINTS + 欠損の点数になり、 上限を超えることがある。
+"""
+import os
+
+import numpy as np
+
+# 1 トレースあたりの最大点数 (0 以下なら間引かない)
+CHART_MAX_POINTS = int(os.getenv("CHART_MAX_POINTS", 500))
+
+
+def _select(px, py, idx, mask, ax, ay, cx, cy):
+    """各バケツ (行) で三角形 (a, p, c) の面積が最大の点の列番号。"""
+    with np.errstate(invalid="ignore"):
+        area = np.abs((ax[:, None] - cx[:, None]) * (py - ay[:, None])
+                      - (ax[:, None] - px) * (cy[:, None] - ay[:, None]))
+    area = np.where(mask & ~np.isnan(area), area, -1.0)
+    return area.argmax(axis=1)
+
+
+def lttb_indices(x, y, max_points=None):
+    """LTTB で残す点の位置 (昇順) を返す。
+
+    x: 単調増加の数値 (日付は整数に変換して渡す)、 y: 値 (NaN 可)
+    max_points の既定は CHART_MAX_POINTS。 点数が収まる場合は全点を返す。
+    NaN の点はすべて残すため、 戻り値は max_points + NaN の点数まで増えうる。
+    """
+    max_points = CHART_MAX_POINTS if max_points is None else max_points
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(y)
+    if max_points <= 0 or n <= max_points or max_points < 3:
+        return np.arange(n)
+
+    # 先頭・末尾を除く点 [1, n-1) を n_buckets 個に分ける
+    n_buckets = max_points - 2
+    edges = np.floor(np.linspace(1, n - 1, n_buckets + 1)).astype(np.int64)
+    start, end = edges[:-1], edges[1:]
+    width = end - start
+    idx = start[:, None] + np.arange(width.max())
+    mask = idx < end[:, None]
+    idx = np.minimum(idx, n - 1)
+
+    valid = ~np.isnan(y)
+    y0 = np.where(valid, y, 0.0)
+    cum_x = np.concatenate([[0.0], np.cumsum(x)])
+    cum_y = np.concatenate([[0.0], np.cumsum(y0)])
+    cum_n = np.concatenate([[0], np.cumsum(valid)])
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean_x = (cum_x[end] - cum_x[start]) / width
+        mean_y = (cum_y[end] - cum_y[start]) / (cum_n[end] - cum_n[start])
+
+    # 次のバケツの平均 (最後のバケツは末尾の点)
+    cx = np.append(mean_x[1:], x[-1])
+    cy = np.append(mean_y[1:], y[-1])
+    px, py = x[idx], y[idx]
+
+    # 1 回目: 前のバケツの平均を起点にする (最初のバケツは先頭の点)
+    ax = np.insert(mean_x[:-1], 0, x[0])
+    ay = np.insert(mean_y[:-1], 0, y[0])
+    rows = np.arange(n_buckets)
+    chosen = idx[rows, _select(px, py, idx, mask, ax, ay, cx, cy)]
+    # 2 回目: 前のバケツで選んだ点を起点にする
+    ax = np.insert(x[chosen[:-1]], 0, x[0])
+    ay = np.insert(y[chosen[:-1]], 0, y[0])
+    chosen = idx[rows, _select(px, py, idx, mask, ax, ay, cx, cy)]
+
+    keep = np.concatenate([[0], chosen, [n - 1], np.flatnonzero(~valid)])
+    return np.unique(keep)
+
+
+def downsample(x, y, max_points=None):
+    """(x, y) を LTTB で間引いた (x, y) を返す。 x が datetime64 でもよい。"""
+    x = np.asarray(x)
+    y = np.asarray(y)
+    xs = x.astype("datetime64[ns]").astype(np.int64) if np.issubdtype(x.dtype, np.datetime64) else x
+    keep = lttb_indices(xs, y, max_points)
+    if len(keep) == len(y):
+        return x, y
+    return x[keep], y[keep]
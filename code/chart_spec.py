@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+"""Plotly 形式のチャート dict を直接組み立てる軽量ビルダー。
+
+レポートのチャートはフロントエンドの Chart.js が Plotly 形式の dict
+({"data": [trace, ...], "layout": {...}}) を解釈して描画する。 plotly.graph_objects
+の Figure は add_trace のたびに全プロパティを検証し、 to_plotly_json() で配列を
+base64 (bdata) にエンコードするため、 generate_json_reports.normalize_chart_data が
+それをリストに戻していた。 ここでは go.Figure / go.Scatter / go.Bar と同じ書き方で、
+numpy / polars / pandas の列から JSON にそのまま書ける値 (NaN / Inf は None、
+日付は ISO 文字列) の dict を直接作る。
+
+出力は従来の fig_to_dict(go.Figure) と同じ。 ただし layout.template は
+テンプレート名のまま (Plotly が展開する数 KB のテンプレート定義は埋め込まない)。
+HTML が必要な場合だけ to_html() で plotly の Figure に変換する。
+"""
+import datetime
+import math
+import re
+import warnings
+from decimal import Decimal
+
+import numpy as np
+
+# 名前に "_" を含む (magic underscore で分割してはいけない) プロパティ
+_UNDERSCORE_PROPS = {"paper_bgcolor", "plot_bgcolor", "error_x", "error_y"}
+# 数値を渡しても文字列として扱われるプロパティ
+_STRING_PROPS = {"offsetgroup", "legendgroup", "alignmentgroup"}
+_AXIS_KEY = re.compile(r"^[xy]axis\d*$")
+
+
+def _scalar(v):
+    if v is None or isinstance(v, (str, bool, int)):
+        return v
+    if isinstance(v, float):
+        return v if math.isfinite(v) else None
+    if isinstance(v, np.generic):
+        return _scalar(v.item())
+    if isinstance(v, Decimal):
+        return _scalar(float(v))
+    if isinstance(v, (datetime.datetime, datetime.date)):
+        return v.isoformat()
+    return v
+
+
+def _array(arr):
+    """numpy 配列をリストにする (NaN / Inf / NaT は None、 日付は ISO 文字列)。"""
+    kind = arr.dtype.kind
+    if kind == "f":
+        values = arr.tolist()
+        finite = np.isfinite(arr)
+        if not finite.all():
+            return _plain(values)
+        return values
+    if kind in "iub":
+        return arr.tolist()
+    if kind == "M":
+        if np.datetime_data(arr.dtype)[0] != "D":
+            arr = arr.astype("datetime64[us]")
+        return [None if v is None else v.isoformat() for v in arr.tolist()]
+    return _plain(arr.tolist())
+
+
+def _plain(value):
+    """値を JSON に書ける素の Python の値に再帰的に変換する。"""
+    if isinstance(value, dict):
+        return {k: _plain(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_plain(v) if isinstance(v, (list, tuple, dict)) else _scalar(v) for v in value]
+    if isinstance(value, np.ndarray):
+        return _array(value)
+    if hasattr(value, "to_numpy") and hasattr(value, "dtype") and not isinstance(value, np.generic):
+        # polars / pandas の Series
+        if type(value).__module__.startswith("polars"):
+            if value.dtype.is_numeric() and not value.dtype.is_decimal():
+                return _array(value.cast(float).to_numpy()) if value.dtype.is_float() or value.has_nulls() else value.to_list()
+            return _plain(value.to_list())
+        return _array(value.to_numpy())
+    return _scalar(value)
+
+
+def _wrap_titles(props, axis_like):
+    """"title": "文字列" を Plotly と同じく {"text": "文字列"} にする。"""
+    if axis_like and isinstance(props.get("title"), str):
+        props["title"] = {"text": props["title"]}
+    return props
+
+
+def _expand(kwargs):
+    """magic underscore (marker_color=... など) を入れ子の dict に展開する。"""
+    out = {}
+    for key, value in kwargs.items():
+        if value is None:
+            continue
+        if "_" in key and key not in _UNDERSCORE_PROPS:
+            head, rest = key.split("_", 1)
+            value = _expand({rest: value})
+            key = head
+        elif key in _STRING_PROPS and not isinstance(value, str):
+            value = str(value)
+        _merge(out, {key: value})
+    return out
+
+
+def _merge(dst, src):
+    """dict を再帰的に更新する (リストやスカラーは置き換え)。"""
+    for key, value in src.items():
+        if isinstance(value, dict) and isinstance(dst.get(key), dict):
+            _merge(dst[key], value)
+        else:
+            dst[key] = value
+    return dst
+
+
+def _normalize_layout(props):
+    props = _plain(_expand(props))
+    for key, value in props.items():
+        if isinstance(value, dict) and (_AXIS_KEY.match(key) or key == "legend"):
+            _wrap_titles(value, True)
+    return _wrap_titles(props, True)
+
+
+class Trace(dict):
+    """1 本の trace の dict。 go.Scatter 等と同じく属性でも値を読める (無ければ None)。"""
+
+    def __getattr__(self, name):
+        return self.get(name)
+
+
+def _trace(trace_type, kwargs):
+    trace = Trace(_plain(_expand(kwargs)))
+    trace["type"] = trace_type
+    return trace
+
+
+def Scatter(**kwargs):
+    return _trace("scatter", kwargs)
+
+
+def Bar(**kwargs):
+    return _trace("bar", kwargs)
+
+
+class Figure:
+    """go.Figure のうちレポートのチャート生成で使う操作だけを持つ軽量版。"""
+
+    def __init__(self):
+        self.data = []
+        self.layout = {}
+
+    def add_trace(self, trace):
+        self.data.append(trace)
+        return self
+
+    def update_traces(self, **kwargs):
+        update = _plain(_expand(kwargs))
+        for trace in self.data:
+            _merge(trace, update)
+        return self
+
+    def update_layout(self, dict1=None, **kwargs):
+        _merge(self.layout, _normalize_layout({**(dict1 or {}), **kwargs}))
+        return self
+
+    def _update_axes(self, prefix, kwargs):
+        update = _wrap_titles(_plain(_expand(kwargs)), True)
+        keys = [k for k in self.layout if _AXIS_KEY.match(k) and k.startswith(prefix)] or [f"{prefix}axis"]
+        for key in keys:
+            _merge(self.layout.setdefault(key, {}), update)
+        return self
+
+    def update_xaxes(self, **kwargs):
+        return self._update_axes("x", kwargs)
+
+    def update_yaxes(self, **kwargs):
+        return self._update_axes("y", kwargs)
+
+    def to_plotly_json(self):
+        """{"data": [...], "layout": {...}} (値は正規化済み)。"""
+        return {"data": [dict(t) for t in self.data], "layout": self.layout}
+
+    def to_html(self, **kwargs):
+        """plotly の Figure に変換して HTML を返す (レポート JSON の生成では使わない)。"""
+        import plotly.graph_objects as go
+        fix_plotly_templates()
+        return go.Figure(self.to_plotly_json()).to_html(**kwargs)
+
+
+# Plotly 6.0.0+ template migration:
+# Default templates still contain 'scattermapbox' references.
+# We migrate them to 'scattermap' to align with Plotly 6.0 recommendations.
+# pio.templates[name] は参照した時点でテンプレート JSON を読み込むため、 全テンプレート
+# の走査は plotly で HTML を作るときに 1 度だけ行う。
+_plotly_templates_fixed = False
+
+def fix_plotly_templates():
+    global _plotly_templates_fixed
+    if _plotly_templates_fixed:
+        return
+    _plotly_templates_fixed = True
+    import plotly.io as pio
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        for name in pio.templates:
+            template = pio.templates[name]
+            try:
+                data = template.layout.template.data
+                if hasattr(data, 'scattermapbox'):
+                    smb = data.scattermapbox
+                    if smb:
+                        data.scattermap = smb
+                    data.scattermapbox = None
+            except:
+                pass
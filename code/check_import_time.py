@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""主要モジュールの import 時間を `python -X importtime` の出力から計測する。
+
+utils は yfinance / curl_cffi / google.genai / defeatbeta_api を遅延 import
+している (utils._LazyModule)。 誰かがトップレベルで再び直接 import すると、
+全スクリプト・全ワーカーの起動が数秒ずつ遅くなるため、 CI でこれを検知する。
+
+判定:
+  - 各モジュールを素の子プロセスで import し、 重い依存 (HEAVY_PACKAGES) が
+    読み込まれていたら失敗 (exit 1)。 実行環境の速度に依存しない決定的な判定。
+  - --budget-ms を指定した場合は累積 import 時間 (--repeat 回の中央値) が
+    予算を超えたモジュールも失敗とする。
+
+使い方:
+    python check_import_time.py
+    python check_import_time.py --repeat 5 --budget-ms 1500 utils fundamentals
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+CODE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+DEFAULT_MODULES = (
+    "utils",
+    "fundamentals",
+    "risk_return",
+    "market_data",
+    "performance_comparison",
+    # エントリポイント (CI で最初に import される)
+    "main",
+    "fetch_raw_data",
+    "generate_json_reports",
+)
+
+# import 時に読み込まれてはいけない重い依存 (初回利用時まで遅延させる)
+HEAVY_PACKAGES = ("yfinance", "curl_cffi", "google.genai", "defeatbeta_api")
+
+
+def parse_importtime(stderr: str) -> dict[str, tuple[int, int]]:
+    """-X importtime の出力を {モジュール名: (self_us, cumulative_us)} に変換する。
+
+    行の形式: "import time:  self [us] | cumulative | imported package"
+    """
+    result = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3:
+            continue
+        try:
+            self_us = int(parts[0].strip())
+            cumulative_us = int(parts[1].strip())
+        except ValueError:
+            continue  # ヘッダ行
+        result[parts[2].strip()] = (self_us, cumulative_us)
+    return result
+
+
+def measure(module: str) -> dict[str, tuple[int, int]]:
+    """module を新しいインタプリタで import し、 importtime の集計を返す。"""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=CODE_DIR,
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        tail = "\n".join(proc.stderr.strip().splitlines()[-5:])
+        raise RuntimeError(f"import {module} failed:\n{tail}")
+    return parse_importtime(proc.stderr)
+
+
+def heavy_imports(timings: dict[str, tuple[int, int]]) -> list[str]:
+    """timings に含まれる HEAVY_PACKAGES (およびそのサブモジュール) を返す。"""
+    return sorted(
+        pkg for pkg in HEAVY_PACKAGES
+        if any(name == pkg or name.startswith(pkg + ".") for name in timings)
+    )
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("modules", nargs="*", default=list(DEFAULT_MODULES))
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="計測回数 (中央値を採用。既定 3)")
+    parser.add_argument("--budget-ms", type=float, default=None,
+                        help="累積 import 時間の上限 (ms)。省略時は時間では判定しない")
+    args = parser.parse_args(argv)
+
+    failures = []
+    print(f"{'module':<24} {'cumulative':>12}  heavy imports")
+    for module in args.modules:
+        runs = [measure(module) for _ in range(max(1, args.repeat))]
+        cumulative_ms = statistics.median(
+            r.get(module, (0, 0))[1] for r in runs
+        ) / 1000.0
+        heavy = sorted({pkg for r in runs for pkg in heavy_imports(r)})
+        print(f"{module:<24} {cumulative_ms:>10.0f}ms  {', '.join(heavy) or '-'}")
+        if heavy:
+            failures.append(f"{module}: eagerly imports {', '.join(heavy)}")
+        if args.budget_ms is not None and cumulative_ms > args.budget_ms:
+            failures.append(
+                f"{module}: {cumulative_ms:.0f}ms exceeds budget {args.budget_ms:.0f}ms"
+            )
+
+    if failures:
+        print("\nImport-time check failed:")
+        for f in failures:
+            print(f"  - {f}")
+        return 1
+    print("\nImport-time check passed.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+"""全銘柄のリターン相関と「値動きの近い銘柄」(相関上位 k 銘柄) の索引。
+
+risk_metrics.build_return_matrix の日付で揃えたリターン行列から、 指定した
+窓 (直近 n 取引日) の銘柄ペアごとの相関を求める。 N × N 行列を一度に作らず、
+行方向に CORRELATION_BLOCK_SIZE 銘柄ずつのブロック (float32) で計算するため、
+メモリは ブロック × N に収まる。 全行列が必要な場合は np.memmap に書き出せる。
+
+欠損 (上場前・取引の無い日) はペアごとに除外する (pairwise complete)。 両方の
+銘柄に値がある日が窓の 80% 未満のペアは相関なし (NaN) とする。
+
+結果は 1 銘柄 = 上位 k 行の縦持ちテーブル (data/correlation_peers.parquet:
+symbol, window_days, rank, peer, corr) として保存し、 レポートの類似銘柄と
+analysis の DuckDB (correlations テーブル) から参照する。
+
+索引の更新: risk_return.calculate_market_metrics_parallel が価格データを取得した
+ついでに作り直す (個別銘柄が CORRELATION_MIN_SYMBOLS 以上ある場合だけ。
+generate_json_reports.py / generate_msft_only.py の __main__ のような部分的な実行では
+前回の索引がそのまま使われる)。 CI (main.py → worker-processor の generate-reports.mjs)
+はこの経路を通らず索引も使わないため、 索引は手元で全銘柄を計算して更新する:
+
+    uv run python - <<'EOF'
+    import market_data, risk_return
+    df = market_data.fetch_sp_indices_companies()
+    risk_return.calculate_market_metrics_parallel(
+        df["Symbol_YF"].to_list(), sectors=dict(zip(df["Symbol_YF"], df["GICS Sector"])))
+    EOF
+
+その後に analysis/build_dataset.py を実行すると DuckDB の correlations も更新される。
+"""
+import os
+import threading
+
+import numpy as np
+
+import risk_metrics
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CORRELATION_PEERS_PATH = os.path.join(BASE_DIR, "data", "correlation_peers.parquet")
+# 相関を求める窓 (取引日数、 カンマ区切り)。 先頭がレポートに載せる既定の窓
+CORRELATION_WINDOWS = [int(w) for w in os.getenv("CORRELATION_WINDOWS", "252,63").split(",") if w.strip()]
+CORRELATION_TOP_K = int(os.getenv("CORRELATION_TOP_K", 10))
+CORRELATION_BLOCK_SIZE = int(os.getenv("CORRELATION_BLOCK_SIZE", 512))
+# 索引を書き換える最小の銘柄数。 MSFT だけ・テスト用の数十銘柄といった部分的な
+# 実行で、 全銘柄分の索引を小さな索引に置き換えないようにする
+CORRELATION_MIN_SYMBOLS = int(os.getenv("CORRELATION_MIN_SYMBOLS", 300))
+
+_peers_memo = {}
+_peers_lock = threading.Lock()
+
+
+def _window_matrix(returns, window, min_overlap):
+    """窓の行列を float32 の (中心化した値, 有効フラグ) にする。
+
+    有効な日が min_overlap に満たない銘柄は全日を無効にする (どのペアも NaN になる)。
+    """
+    r = returns[-window:] if window else returns
+    valid = ~np.isnan(r)
+    valid &= valid.sum(axis=0) >= min_overlap
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.where(valid, r, 0.0).sum(axis=0) / valid.sum(axis=0)
+    # 平均を引いてから float32 にする (二乗和の桁落ちを抑える)
+    x = np.where(valid, r - np.nan_to_num(mean), 0.0).astype(np.float32)
+    return x, valid.astype(np.float32)
+
+
+def correlation_blocks(returns, window, min_overlap=None, block_size=None):
+    """窓 window の相関行列を行ブロックごとに返すジェネレータ。
+
+    yield (start, stop, corr)。 corr は float32 の (stop - start) × 銘柄数 で、
+    両方の銘柄に値がある日が min_overlap (既定は窓の 80%) 未満のペアは NaN。
+    """
+    block_size = block_size or CORRELATION_BLOCK_SIZE
+    window = min(window, returns.shape[0])
+    if min_overlap is None:
+        min_overlap = max(3, int(np.ceil(window * 0.8)))
+    x, m = _window_matrix(returns, window, min_overlap)
+    x2 = x * x
+    n_syms = x.shape[1]
+    for start in range(0, n_syms, block_size):
+        stop = min(start + block_size, n_syms)
+        xb, mb, x2b = x[:, start:stop], m[:, start:stop], x2[:, start:stop]
+        # ペアごとに両方が有効な日だけの件数・和・二乗和・積和 (いずれも行列積)
+        n = mb.T @ m
+        sx = xb.T @ m
+        sy = mb.T @ x
+        sxx = x2b.T @ m
+        syy = mb.T @ x2
+        sxy = xb.T @ x
+        with np.errstate(invalid="ignore", divide="ignore"):
+            cov = sxy - sx * sy / n
+            var_x = sxx - sx * sx / n
+            var_y = syy - sy * sy / n
+            corr = cov / np.sqrt(var_x * var_y)
+        corr = np.where((n >= min_overlap) & (var_x > 0) & (var_y > 0), np.clip(corr, -1.0, 1.0), np.nan)
+        yield start, stop, corr.astype(np.float32, copy=False)
+
+
+def correlation_matrix(returns, window, memmap_path=None, **kwargs):
+    """窓 window の N × N 相関行列 (float32)。 memmap_path を渡すとファイルに書き出す。"""
+    n_syms = returns.shape[1]
+    if memmap_path:
+        out = np.lib.format.open_memmap(memmap_path, mode="w+", dtype=np.float32, shape=(n_syms, n_syms))
+    else:
+        out = np.empty((n_syms, n_syms), dtype=np.float32)
+    for start, stop, corr in correlation_blocks(returns, window, **kwargs):
+        out[start:stop] = corr
+    if memmap_path:
+        out.flush()
+    return out
+
+
+def top_k_peers(returns, window, k=None, **kwargs):
+    """各銘柄の相関上位 k 銘柄 (自身を除く) の列番号と相関を返す。
+
+    戻り値: (peer_idx, peer_corr)。 いずれも 銘柄数 × k で、 相関の降順。
+    該当なし (相関が NaN) の欄は -1 / NaN。
+    """
+    k = k or CORRELATION_TOP_K
+    n_syms = returns.shape[1]
+    k = min(k, max(n_syms - 1, 0))
+    peer_idx = np.full((n_syms, k), -1, dtype=np.int32)
+    peer_corr = np.full((n_syms, k), np.nan, dtype=np.float32)
+    if k == 0:
+        return peer_idx, peer_corr
+    for start, stop, corr in correlation_blocks(returns, window, **kwargs):
+        rows = np.arange(stop - start)
+        corr = np.where(np.isnan(corr), -np.inf, corr)
+        corr[rows, rows + start] = -np.inf
+        # ブロック内で上位 k を選んでから並べ替える (全体のソートはしない)
+        part = np.argpartition(-corr, k - 1, axis=1)[:, :k]
+        vals = np.take_along_axis(corr, part, axis=1)
+        order = np.argsort(-vals, axis=1, kind="stable")
+        idx = np.take_along_axis(part, order, axis=1)
+        vals = np.take_along_axis(vals, order, axis=1)
+        found = np.isfinite(vals)
+        peer_idx[start:stop] = np.where(found, idx, -1)
+        peer_corr[start:stop] = np.where(found, vals, np.nan)
+    return peer_idx, peer_corr
+
+
+def build_correlation_peers(series, windows=None, k=None):
+    """[(symbol, dates, closes), ...] から相関上位 k 銘柄の縦持ちテーブルを作る。
+
+    戻り値: polars.DataFrame (symbol, window_days, rank, peer, corr)。
+    window は SQL の予約語なので列名は window_days にしている。
+    """
+    import polars as pl
+
+    windows = windows or CORRELATION_WINDOWS
+    _, symbols, returns = risk_metrics.build_return_matrix(series)
+    frames = []
+    if symbols:
+        sym_arr = np.array(symbols, dtype=object)
+        for window in windows:
+            peer_idx, peer_corr = top_k_peers(returns, window, k)
+            found = peer_idx >= 0
+            row, rank = np.nonzero(found)
+            frames.append(pl.DataFrame({
+                "symbol": sym_arr[row].tolist(),
+                "window_days": pl.Series(np.full(len(row), window, dtype=np.int32)),
+                "rank": pl.Series((rank + 1).astype(np.int32)),
+                "peer": sym_arr[peer_idx[found]].tolist(),
+                "corr": pl.Series(peer_corr[found]),
+            }))
+    if not frames:
+        return pl.DataFrame(schema={"symbol": pl.String, "window_days": pl.Int32, "rank": pl.Int32,
+                                    "peer": pl.String, "corr": pl.Float32})
+    return pl.concat(frames)
+
+
+def update_correlation_peers(series, path=None, windows=None, k=None, min_symbols=None):
+    """相関上位の索引を作り直して parquet に保存する (一時ファイル経由で置き換え)。
+
+    series の銘柄数が min_symbols (既定は CORRELATION_MIN_SYMBOLS) 未満の場合は
+    部分的な実行とみなして既存の索引を残し、 None を返す。
+    """
+    min_symbols = CORRELATION_MIN_SYMBOLS if min_symbols is None else min_symbols
+    if len(series) < min_symbols:
+        print(f"相関索引の更新をスキップ ({len(series)} 銘柄 < {min_symbols} 銘柄)")
+        return None
+    path = path or CORRELATION_PEERS_PATH
+    df = build_correlation_peers(series, windows, k)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    df.write_parquet(path + ".tmp")
+    os.replace(path + ".tmp", path)
+    with _peers_lock:
+        _peers_memo.clear()
+    return df
+
+
+def load_correlation_peers(window=None, path=None):
+    """保存済みの索引を {symbol: [{"Symbol": peer, "corr": 相関}, ...]} で返す。
+
+    window の既定は CORRELATION_WINDOWS の先頭。 索引が無ければ空の dict。
+    """
+    window = window or CORRELATION_WINDOWS[0]
+    path = path or CORRELATION_PEERS_PATH
+    key = (path, window)
+    with _peers_lock:
+        if key in _peers_memo:
+            return _peers_memo[key]
+    peers = {}
+    # 索引が無い・読めない場合も空の結果を覚える (レポートごとに読み直さない)。
+    # update_correlation_peers が索引を書き換えると覚えた結果は捨てられる
+    if os.path.exists(path):
+        try:
+            import polars as pl
+            df = pl.read_parquet(path).filter(pl.col("window_days") == window).sort(["symbol", "rank"])
+            for symbol, peer, corr in zip(df["symbol"].to_list(), df["peer"].to_list(), df["corr"].to_list()):
+                peers.setdefault(symbol, []).append({"Symbol": peer, "corr": round(corr, 4)})
+        except Exception as e:
+            print(f"相関索引の読み込みに失敗 ({path}): {e}")
+            peers = {}
+    with _peers_lock:
+        _peers_memo[key] = peers
+    return peers
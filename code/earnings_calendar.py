@@ -0,0 +1,260 @@
+# -*- coding: utf-8 -*-
+"""決算日カレンダー (過去・予定の決算日と EPS) のキャッシュ。
+
+yfinance の earnings_dates は遅く失敗しやすいエンドポイントで、 これまでは
+fetch_raw_data (R2 に上げる生データ)・risk_return (直近の決算日)・
+generate_json_reports (EPS サプライズ / 次回決算)・find_recent (直近 1 週間の
+決算) がそれぞれ銘柄ごとに取得していた。 ここで
+ユニバース全体を 1 日 1 回まとめて取得し、 data/earnings_calendar.parquet に
+保存して各処理から参照する。
+
+鮮度の扱い (stale-while-revalidate):
+  - 当日取得済み          : キャッシュをそのまま返す
+  - EARNINGS_STALE_DAYS 日以内: キャッシュを返しつつ、 バックグラウンドで再取得
+  - それより古い / 未取得 : その場で取得する
+取得に失敗した (データが返らない) 場合は既存のキャッシュを残す。
+"""
+import atexit
+import datetime
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import pytz
+
+import utils
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+EARNINGS_CACHE_PATH = os.path.join(BASE_DIR, "data", "earnings_calendar.parquet")
+EARNINGS_META_PATH = os.path.join(BASE_DIR, "data", "earnings_calendar.meta.json")
+EARNINGS_STALE_DAYS = int(os.getenv("EARNINGS_STALE_DAYS", 7))
+EARNINGS_MAX_WORKERS = int(os.getenv("EARNINGS_MAX_WORKERS", 4))
+
+_COLUMNS = ["EPS Estimate", "Reported EPS", "Surprise(%)"]
+
+_lock = threading.Lock()
+_frames = {}      # symbol -> earnings_dates 形式の DataFrame (データなしは None)
+_fetched = {}     # symbol -> 最終取得日 (YYYY-MM-DD)
+_loaded = False
+_dirty = False
+_revalidating = set()
+_background = None
+
+
+def _today():
+    return datetime.date.today().isoformat()
+
+
+def _load_locked():
+    global _loaded
+    if _loaded:
+        return
+    _loaded = True
+    try:
+        with open(EARNINGS_META_PATH, "r", encoding="utf-8") as f:
+            _fetched.update(json.load(f))
+    except Exception:
+        return
+    try:
+        df = pd.read_parquet(EARNINGS_CACHE_PATH)
+    except Exception:
+        df = None
+    if df is not None and not df.empty:
+        for symbol, group in df.groupby("Symbol", sort=False):
+            tz = group["tz"].iloc[0] or "UTC"
+            index = pd.DatetimeIndex(group["Earnings Date"]).tz_convert(tz)
+            index.name = "Earnings Date"
+            _frames[symbol] = group[_COLUMNS].set_index(index)
+    for symbol in _fetched:
+        _frames.setdefault(symbol, None)
+
+
+def _save_locked():
+    global _dirty
+    rows = []
+    for symbol, frame in _frames.items():
+        if frame is None or frame.empty:
+            continue
+        part = frame.reindex(columns=_COLUMNS).reset_index(drop=True)
+        index = pd.DatetimeIndex(frame.index)
+        part.insert(0, "Earnings Date", index.tz_convert("UTC"))
+        part.insert(0, "tz", str(index.tz) if index.tz is not None else "UTC")
+        part.insert(0, "Symbol", symbol)
+        rows.append(part)
+    try:
+        os.makedirs(os.path.dirname(EARNINGS_CACHE_PATH), exist_ok=True)
+        if rows:
+            df = pd.concat(rows, ignore_index=True)
+            df[_COLUMNS] = df[_COLUMNS].astype("float64")
+            df.to_parquet(EARNINGS_CACHE_PATH + ".tmp", index=False)
+            os.replace(EARNINGS_CACHE_PATH + ".tmp", EARNINGS_CACHE_PATH)
+        with open(EARNINGS_META_PATH + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(_fetched, f, sort_keys=True)
+        os.replace(EARNINGS_META_PATH + ".tmp", EARNINGS_META_PATH)
+        _dirty = False
+    except Exception as e:
+        print(f"決算日カレンダーの保存に失敗: {e}")
+
+
+def flush():
+    """未保存の取得結果をファイルに書き出す。"""
+    with _lock:
+        if _dirty:
+            _save_locked()
+
+
+atexit.register(flush)
+
+
+def _fetch(symbol):
+    """earnings_dates を取得する (データが無い / 失敗時は None)。"""
+    try:
+        ticker = utils.get_ticker(symbol)
+        ed = utils.safe_get(ticker, 'earnings_dates')
+        if ed is None or ed.empty:
+            return None
+        ed = ed.copy()
+        for col in _COLUMNS:
+            if col not in ed.columns:
+                ed[col] = float("nan")
+        return ed
+    except Exception as e:
+        utils.log_event("DEBUG", symbol, f"earnings calendar fetch failed: {e}")
+        return None
+
+
+def _store(symbol, frame):
+    global _dirty
+    with _lock:
+        # 取得できなかった場合は前回の結果を残す
+        if frame is not None or symbol not in _frames:
+            _frames[symbol] = frame
+        _fetched[symbol] = _today()
+        _dirty = True
+
+
+def _fetch_many(symbols, max_workers, save=True):
+    symbols = list(symbols)
+    if not symbols:
+        return
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(symbols)))) as executor:
+        for symbol, frame in zip(symbols, executor.map(_fetch, symbols)):
+            _store(symbol, frame)
+    if save:
+        flush()
+
+
+def _revalidate(symbols, max_workers):
+    try:
+        _fetch_many(symbols, max_workers)
+    finally:
+        with _lock:
+            _revalidating.difference_update(symbols)
+
+
+def _schedule_revalidate(symbols, max_workers):
+    """古いキャッシュの再取得をバックグラウンドで 1 ジョブとして投入する。"""
+    global _background
+    with _lock:
+        symbols = [s for s in symbols if s not in _revalidating]
+        _revalidating.update(symbols)
+        if not symbols:
+            return
+        if _background is None:
+            _background = ThreadPoolExecutor(max_workers=1, thread_name_prefix="earnings-revalidate")
+        _background.submit(_revalidate, symbols, max_workers)
+
+
+def _classify(symbols):
+    """(当日取得済み, 再検証で足りるもの, その場で取得が必要なもの) に分ける。"""
+    today = datetime.date.today()
+    fresh, stale, missing = [], [], []
+    for symbol in symbols:
+        fetched = _fetched.get(symbol)
+        if fetched is None:
+            missing.append(symbol)
+            continue
+        age = (today - datetime.date.fromisoformat(fetched)).days
+        if age <= 0:
+            fresh.append(symbol)
+        elif age <= EARNINGS_STALE_DAYS:
+            stale.append(symbol)
+        else:
+            missing.append(symbol)
+    return fresh, stale, missing
+
+
+def prefetch(symbols, max_workers=None, wait=False):
+    """symbols の決算日をまとめて読み込む (1 日 1 回取得)。
+
+    未取得・期限切れの銘柄はその場で並列に取得し、 期限内の古い銘柄は
+    キャッシュを使いつつバックグラウンドで再取得する (wait=True なら待つ)。
+    """
+    max_workers = max_workers or EARNINGS_MAX_WORKERS
+    symbols = list(dict.fromkeys(s for s in symbols if s))
+    with _lock:
+        _load_locked()
+        fresh, stale, missing = _classify(symbols)
+    print(f"決算日カレンダー: 取得済み {len(fresh)} / 再検証 {len(stale)} / 新規取得 {len(missing)}")
+    _fetch_many(missing, max_workers)
+    if wait:
+        _fetch_many(stale, max_workers)
+    else:
+        _schedule_revalidate(stale, max_workers)
+
+
+def get_earnings_dates(symbol):
+    """yfinance の earnings_dates と同じ形式の DataFrame (無ければ None) を返す。"""
+    with _lock:
+        _load_locked()
+        _, stale, missing = _classify([symbol])
+    if missing:
+        # 保存は flush (prefetch の最後 / 終了時) にまとめる
+        _fetch_many(missing, 1, save=False)
+    elif stale:
+        _schedule_revalidate(stale, EARNINGS_MAX_WORKERS)
+    with _lock:
+        frame = _frames.get(symbol)
+    return frame.copy() if frame is not None else None
+
+
+def latest_earnings_date(symbol, now=None):
+    """直近の過去の決算日 (YYYY-MM-DD) を返す。無ければ None。"""
+    ed = get_earnings_dates(symbol)
+    if ed is None or ed.empty:
+        return None
+    # タイムゾーンの有無を確認
+    if now is None:
+        now = datetime.datetime.now()
+    if ed.index.tzinfo is not None:
+        # インデックスがタイムゾーン付きの場合、now もタイムゾーン付きにする（UTCベース）
+        if now.tzinfo is None:
+            now = datetime.datetime.now(pytz.timezone('UTC'))
+        ed.index = ed.index.tz_convert('UTC')
+    # インデックスを日付として扱い、現在時刻より前の最新のものを探す
+    past = ed[ed.index <= now]
+    if past.empty:
+        return None
+    return past.index.max().strftime('%Y-%m-%d')
+
+
+def recent_earnings(symbols, days=7, now=None):
+    """直近 days 日以内に決算があった銘柄を [(symbol, date), ...] で返す。"""
+    now = now or datetime.datetime.now(pytz.utc)
+    since = now - datetime.timedelta(days=days)
+    prefetch(symbols)
+    found = []
+    for symbol in symbols:
+        ed = get_earnings_dates(symbol)
+        if ed is None or ed.empty:
+            continue
+        if ed.index.tzinfo is not None:
+            ed.index = ed.index.tz_convert('UTC')
+        past = ed[ed.index <= now]
+        if not past.empty:
+            latest = past.index.max()
+            if latest >= since:
+                found.append((symbol, latest.date()))
+    return found
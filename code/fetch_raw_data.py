@@ -6,14 +6,15 @@ import random
 import datetime
 import threading
 import pandas as pd
-import yfinance as yf
+from utils import yf  # 遅延 import (初回の yf.Ticker で読み込む)
 import polars as pl
 import numpy as np
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from tqdm import tqdm
 import utils
 import market_data
-from defeatbeta_api.data.ticker import Ticker as DBTicker
+import earnings_calendar
+from utils import DBTicker
 import boto3
 from botocore.exceptions import NoCredentialsError
 from dotenv import load_dotenv
@@ -132,11 +133,20 @@ def df_to_dict_safe(df):
         print(f"Conversion error: {e}")
     return None
 
-def _safe_get(fn, symbol, field):
-    """yfinance プロパティ取得をラップし、失敗時は None を返す"""
+def _safe_get(fn, symbol, field, upstream="yahoo"):
+    """yfinance プロパティ取得をラップし、失敗時は None を返す。
+
+    上流 × エンドポイント種別のサーキットブレーカーが open の間は取得を
+    試みずに None を返す (IP ブロック時に全銘柄が待たされるのを防ぐ)。"""
+    breaker = utils.get_circuit_breaker(upstream, utils.endpoint_class(field))
+    if not breaker.allow():
+        return None
     try:
-        return fn()
+        val = fn()
+        breaker.record_success()
+        return val
     except Exception as e:
+        breaker.record_error(e)
         print(f"[{symbol}] {field} fetch failed: {e}")
         return None
 
@@ -145,7 +155,9 @@ def fetch_raw_data_for_ticker(symbol):
     1銘柄の生データを yfinance と defeatbeta-api から取得
     """
     try:
-        ticker = yf.Ticker(symbol)
+        # info / calendar / アナリスト予想 / holders 等の quoteSummary 系は
+        # モジュールをまとめて 1〜2 リクエストで取得する
+        ticker = utils.enable_quote_summary_batching(yf.Ticker(symbol))
 
         def _df(fn, field):
             return df_to_dict_safe(_safe_get(fn, symbol, field))
@@ -155,26 +167,28 @@ def fetch_raw_data_for_ticker(symbol):
             レート制限を受けたりするので、空 DataFrame / 429 の場合は指数バック
             オフで再試行する。master の utils.safe_get と同等の堅牢性を持たせる。"""
             last = None
+            breaker = utils.get_circuit_breaker("yahoo", utils.endpoint_class(field))
             for i in range(attempts):
+                if not breaker.allow():
+                    break
                 # master 同様に各リクエスト前に微小スロットリングを入れて
                 # Yahoo 側のスパイク検知を回避する。
                 time.sleep(random.uniform(0.1, 0.3))
                 try:
                     last = fn()
+                    breaker.record_success()
                 except Exception as e:
-                    err_str = str(e)
-                    is_rate_limit = (
-                        "Too Many Requests" in err_str
-                        or "429" in err_str
-                        or "Rate limited" in err_str
-                        or "YFRateLimitError" in type(e).__name__
-                    )
-                    if is_rate_limit:
+                    if utils.is_rate_limit_error(e):
+                        breaker.record_failure()
+                        if not breaker.is_closed:
+                            print(f"[{symbol}] {field} rate-limited: circuit {breaker.name} open, giving up")
+                            break
                         wait = (i + 1) * 15 + random.uniform(0, 10)
                         print(f"[{symbol}] {field} rate-limited attempt {i+1}: waiting {wait:.1f}s")
                         time.sleep(wait)
                         last = None
                         continue
+                    breaker.record_error(e)
                     print(f"[{symbol}] {field} attempt {i+1} failed: {e}")
                     last = None
                 if last is not None and hasattr(last, 'empty') and not last.empty:
@@ -192,13 +206,9 @@ def fetch_raw_data_for_ticker(symbol):
             return df_to_dict_safe(val)
 
         def _df_earnings():
-            # yfinance の earnings_dates はよく失敗するので、個別にエラーを抑制して取得
-            try:
-                val = ticker.earnings_dates
-                return df_to_dict_safe(val)
-            except Exception:
-                # エラーメッセージを出さずに None を返す
-                return None
+            # 決算日カレンダー (main の prefetch で 1 日 1 回まとめて取得・キャッシュ)
+            # から引く。 取得に失敗した銘柄は前回取得できた決算日を返す。
+            return df_to_dict_safe(earnings_calendar.get_earnings_dates(symbol))
 
         def _cal():
             cal = _safe_get(lambda: ticker.calendar, symbol, "calendar")
@@ -248,13 +258,15 @@ def fetch_raw_data_for_ticker(symbol):
         def _rev_seg():
             if rev_adapter is None:
                 return None
-            val = _safe_get(rev_adapter.revenue_by_segment, symbol, "revenue_by_segment")
+            val = _safe_get(rev_adapter.revenue_by_segment, symbol, "revenue_by_segment",
+                            upstream="defeatbeta")
             return df_to_dict_safe(val)
 
         def _rev_geo():
             if rev_adapter is None:
                 return None
-            val = _safe_get(rev_adapter.revenue_by_geography, symbol, "revenue_by_geography")
+            val = _safe_get(rev_adapter.revenue_by_geography, symbol, "revenue_by_geography",
+                            upstream="defeatbeta")
             return df_to_dict_safe(val)
 
         raw_payload = {
@@ -379,6 +391,10 @@ def main(symbols_override=None):
         print("All symbols already fetched today. Nothing to do.")
         return
 
+    # 決算日は銘柄ごとに取りに行かず、 決算日カレンダーでまとめて読み込む
+    # (未取得の銘柄だけその場で取得し、 古いものはバックグラウンドで再取得)
+    earnings_calendar.prefetch(pending)
+
     max_workers = 1 if len(pending) <= 3 else int(os.getenv("MAX_WORKERS", 2))
 
     def _fetch_and_record(s):
@@ -405,5 +421,16 @@ def main(symbols_override=None):
                 except Exception:
                     pass
 
+    # 取得中に追加した決算日をキャッシュに書き出す
+    earnings_calendar.flush()
+
+    # ブレーカーが作動した場合は、 どのエンドポイントをどれだけ諦めたかを
+    # 明示する (該当フィールドは None のまま保存されている)。
+    breaker_summary = utils.circuit_breaker_summary()
+    if breaker_summary:
+        print("Circuit breaker summary (fields skipped while open are saved as null):")
+        for name, st in breaker_summary.items():
+            print(f"  {name}: state={st['state']} rejected={st['rejected']} transitions={st['transitions']}")
+
 if __name__ == "__main__":
     main()
@@ -1,44 +1,20 @@
 # -*- coding: utf-8 -*-
-import yfinance as yf
-import polars as pl
-import pandas as pd
-import plotly.graph_objects as go
-import plotly.io as pio
-from plotly.subplots import make_subplots
-import numpy as np
 import warnings
 # Plotly 6.0.0+ deprecation warnings (scattermapbox -> scattermap)
 warnings.filterwarnings("ignore", category=FutureWarning, message=".*scattermapbox.*")
 
-import yfinance as yf
 import polars as pl
 import pandas as pd
-import plotly.graph_objects as go
-import plotly.io as pio
-from plotly.subplots import make_subplots
 import numpy as np
 import utils
+import chart_spec
+import statement_numeric
 import datetime
 
-# Plotly 6.0.0+ template migration:
-# Default templates still contain 'scattermapbox' references.
-# We migrate them to 'scattermap' to align with Plotly 6.0 recommendations.
-def fix_plotly_templates():
-    with warnings.catch_warnings():
-        warnings.simplefilter("ignore")
-        for name in pio.templates:
-            template = pio.templates[name]
-            try:
-                data = template.layout.template.data
-                if hasattr(data, 'scattermapbox'):
-                    smb = data.scattermapbox
-                    if smb:
-                        data.scattermap = smb
-                    data.scattermapbox = None
-            except:
-                pass
-
-fix_plotly_templates()
+
+def _new_figure():
+    """空のチャート (chart_spec.Figure、 go.Figure と同じ書き方で Plotly 形式の dict を作る) を返す。"""
+    return chart_spec.Figure()
 
 # ==========================================
 #  Part A: ファンダメンタルズ分析 (グラフ生成)
@@ -57,6 +33,54 @@ def get_melt(df):
     df_melt = df_melt.with_columns(pl.col('Date').cast(pl.String).str.slice(0, 10)).sort(['Item', 'Date'])
     return df_melt
 
+def _resolve_alias_names(item_list, valid, alias_dict):
+    """標準名ごとに採用する行を決め、 リネーム後の項目名のリストを返す。
+
+    item_list: 元の項目名 (行順)、 valid: 行ごとに有効な値があるか
+    標準名が (大文字小文字を無視して) 存在し有効ならそれを、 無ければ aliases を
+    順に見て最初の有効なものを標準名にリネームする (無効な標準名の行は
+    OLD_<標準名> に退避)。 項目名の検索は元の名前に対して最初に一致した行で行い、
+    有効判定はその時点の名前で最初に一致した行で行う (逐次リネームしていた
+    従来の処理と同じ結果になる)。
+    """
+    names = list(item_list)
+    first_index = {}
+    rows_by_name = {}
+    for i, name in enumerate(item_list):
+        first_index.setdefault(str(name).lower(), i)
+        rows_by_name.setdefault(name, []).append(i)
+
+    def rename(old, new):
+        rows = rows_by_name.pop(old, [])
+        for i in rows:
+            names[i] = new
+        if rows:
+            rows_by_name[new] = sorted(rows_by_name.get(new, []) + rows)
+
+    def is_valid(name):
+        rows = rows_by_name.get(name) if name is not None else None
+        return bool(rows) and bool(valid[rows[0]])
+
+    for standard_name, aliases in alias_dict.items():
+        idx = first_index.get(standard_name.lower())
+        if idx is not None and is_valid(item_list[idx]):
+            # 大文字小文字が異なる場合は標準名にリネームしておく（後でフィルタリングできるように）
+            if item_list[idx] != standard_name:
+                rename(item_list[idx], standard_name)
+            continue
+        # 有効な標準名がない場合、または標準名が全データNaNの場合、エイリアスから検索してリネームする
+        for alias in aliases:
+            idx = first_index.get(alias.lower())
+            if idx is None or not is_valid(item_list[idx]):
+                continue
+            actual_name = item_list[idx]
+            if actual_name != standard_name:
+                # 既存の無効な標準名を退避してから、 エイリアスを標準名にする
+                rename(standard_name, f"OLD_{standard_name}")
+                rename(actual_name, standard_name)
+            break # 有効なエイリアスを採用したので終了
+    return names
+
 def get_financial_data(ticker_obj):
     """1つのTickerオブジェクトから4種類の財務データ（Annual & Quarterly）を取得・整形"""
     data = {}
@@ -74,82 +98,22 @@ def get_financial_data(ticker_obj):
             return pl.DataFrame()
         try:
             # Cast all columns to numeric (float) to avoid Decimal/object issues with Polars
-            pandas_df = pandas_df.copy()
+            # (Decimal / 数値文字列 / '*' / None を型ごとに一括で float64 にする)
+            pandas_df = statement_numeric.coerce_statement_frame(pandas_df)
             # Rename index to 'Item' for Polars if not already
             if pandas_df.index.name != 'Item':
-                pandas_df.index.name = 'Item'
-                
-            for col in pandas_df.columns:
-                # 確実に数値に変換し、'*'などの文字列をNaNにする
-                # Decimalオブジェクト対策として明示的にfloatに変換
-                if pandas_df[col].dtype == object:
-                    pandas_df[col] = pandas_df[col].apply(lambda x: float(x) if x is not None and str(x).replace('.','',1).replace('-','',1).isdigit() else np.nan if x == '*' else x)
-                pandas_df[col] = pd.to_numeric(pandas_df[col], errors='coerce').astype(float)
-            
+                pandas_df = pandas_df.rename_axis('Item')
+
             # Polarsに変換する前にインデックスを列に戻す
             df = pl.from_pandas(pandas_df.reset_index())
             
-            # アイテム名リスト（小文字）を準備
-            item_list = df['Item'].to_list()
-            item_list_lower = [str(x).lower() for x in item_list]
-            
-            for standard_name, aliases in alias_dict.items():
-                # 標準名が既に存在し、かつ全期間でNaNでないか確認
-                standard_name_lower = standard_name.lower()
-                has_valid_standard = False
-                if standard_name_lower in item_list_lower:
-                    idx = item_list_lower.index(standard_name_lower)
-                    actual_standard_name = item_list[idx]
-                    # 標準名列の全データの合計をチェック（より堅牢な判定）
-                    row_df = df.filter(pl.col('Item') == actual_standard_name).select(pl.all().exclude('Item'))
-                    if not row_df.is_empty():
-                        # いずれかの列に null 以外、かつ NaN 以外の有効な値があるか確認
-                        is_valid = row_df.select(
-                            pl.any_horizontal(
-                                pl.all().is_not_null() & pl.all().is_not_nan()
-                            )
-                        ).to_series()[0]
-                        if is_valid:
-                            has_valid_standard = True
-                            # 大文字小文字が異なる場合は標準名にリネームしておく（後でフィルタリングできるように）
-                            if actual_standard_name != standard_name:
-                                df = df.with_columns(
-                                    pl.when(pl.col('Item') == actual_standard_name)
-                                    .then(pl.lit(standard_name))
-                                    .otherwise(pl.col('Item'))
-                                    .alias('Item')
-                                )
-                
-                # 有効な標準名がない場合、または標準名が全データNaNの場合、エイリアスから検索してリネームする
-                if not has_valid_standard:
-                    for alias in aliases:
-                        alias_lower = alias.lower()
-                        if alias_lower in item_list_lower:
-                            idx = item_list_lower.index(alias_lower)
-                            actual_name = item_list[idx]
-                            
-                            # そのエイリアスが有効な値（非NaN）を持っているか確認
-                            row_df = df.filter(pl.col('Item') == actual_name).select(pl.all().exclude('Item'))
-                            if not row_df.is_empty():
-                                is_valid = row_df.select(
-                                    pl.any_horizontal(
-                                        pl.all().is_not_null() & pl.all().is_not_nan()
-                                    )
-                                ).to_series()[0]
-                                if is_valid:
-                                    # リネーム処理
-                                    if actual_name != standard_name:
-                                        # 標準名がNaNで存在する場合も、その名前をこの有効なエイリアスに譲るために一度別名にするなどの処理はPolarsのwhen().then()で対応可能
-                                        df = df.with_columns(
-                                            pl.when(pl.col('Item') == actual_name)
-                                            .then(pl.lit(standard_name))
-                                            .when(pl.col('Item') == standard_name)
-                                            .then(pl.lit(f"OLD_{standard_name}")) # 既存の無効な標準名を退避
-                                            .otherwise(pl.col('Item'))
-                                            .alias('Item')
-                                        )
-                                    break # 有効なエイリアスを採用したので終了
-            
+            # 行ごとの有効判定 (いずれかの期間に NaN 以外の値がある) は一括で行い、
+            # 標準名 / エイリアスの採用とリネームは行番号の上で決めて最後に 1 回で反映する
+            values = pandas_df.to_numpy(dtype=float)
+            valid = (~np.isnan(values)).any(axis=1) if values.shape[1] else np.zeros(len(values), dtype=bool)
+            names = _resolve_alias_names(df['Item'].to_list(), valid, alias_dict)
+            df = df.with_columns(pl.Series('Item', names, dtype=df['Item'].dtype))
+
             target_list = list(alias_dict.keys())
             df_filtered = df.filter(pl.col('Item').is_in(target_list))
             
@@ -581,9 +545,9 @@ def _build_revenue_bar_chart(df, item_label: str):
     if not active_q and not active_a:
         return _NO_DATA_MSG
 
-    fig = go.Figure()
+    fig = _new_figure()
     for i, col in enumerate(active_q):
-        fig.add_trace(go.Bar(
+        fig.add_trace(chart_spec.Bar(
             name=f"{col} (四半期)",
             x=df_q['Date'], y=df_q[col],
             marker_color=_CHART_COLORS[i % len(_CHART_COLORS)],
@@ -591,7 +555,7 @@ def _build_revenue_bar_chart(df, item_label: str):
             hovertemplate=f'日付: %{{x}}<br>{item_label}: {col}<br>収益: $%{{y:,.0f}}<extra></extra>',
         ))
     for i, col in enumerate(active_a):
-        fig.add_trace(go.Bar(
+        fig.add_trace(chart_spec.Bar(
             name=f"{col} (通年)",
             x=df_a['Year'], y=df_a[col],
             marker_color=_CHART_COLORS[i % len(_CHART_COLORS)],
@@ -626,10 +590,10 @@ def get_valuation_chart_data(valuation_data):
     color = "#2ca02c" if v['current'] <= v['median'] else "#ff7f0e"
     if v['current'] > v['max']: color = "#d62728" # Deep red if over max
 
-    fig = go.Figure()
+    fig = _new_figure()
 
     # Base track (range min to max)
-    fig.add_trace(go.Scatter(
+    fig.add_trace(chart_spec.Scatter(
         x=[v['min'], v['max']], y=[0, 0],
         mode='lines+markers',
         line=dict(color='#E5E7EB', width=12),
@@ -639,7 +603,7 @@ def get_valuation_chart_data(valuation_data):
     ))
 
     # Median Tick
-    fig.add_trace(go.Scatter(
+    fig.add_trace(chart_spec.Scatter(
         x=[v['median']], y=[0],
         mode='markers+text',
         marker=dict(size=20, symbol='line-ns', color='#4B5563', line=dict(width=2)),
@@ -649,7 +613,7 @@ def get_valuation_chart_data(valuation_data):
     ))
 
     # Current Point
-    fig.add_trace(go.Scatter(
+    fig.add_trace(chart_spec.Scatter(
         x=[v['current']], y=[0],
         mode='markers+text',
         marker=dict(size=18, color=color, line=dict(color='white', width=2)),
@@ -686,7 +650,7 @@ def get_dps_eps_chart_data(data_dict, is_data_dict):
     
     if df_annual.is_empty() and df_q.is_empty(): return '配当実績なし'
     
-    fig = go.Figure()
+    fig = _new_figure()
     
     # --- 1. 年間配当 & 利回りトレース (棒グラフ & 折れ線) ---
     if not df_annual.is_empty():
@@ -702,7 +666,7 @@ def get_dps_eps_chart_data(data_dict, is_data_dict):
         labels_base = [get_label(r) for r in df_ann_plot.to_dicts()]
 
         # 実績分の配当 (棒グラフ - 土台)
-        fig.add_trace(go.Bar(
+        fig.add_trace(chart_spec.Bar(
             name='実績配当 (年間推移)', x=df_ann_plot['Date'], y=df_ann_plot['ActualValue'],
             marker_color='#1f77b4', # 濃い青
             text=labels_base,
@@ -718,7 +682,7 @@ def get_dps_eps_chart_data(data_dict, is_data_dict):
             # 推定がある年度のみラベルを表示
             labels_est = [f"${r['Value']:.2f}" if r['IsEstimate'] else "" for r in df_ann_plot.to_dicts()]
             
-            fig.add_trace(go.Bar(
+            fig.add_trace(chart_spec.Bar(
                 name='推定配当 (年間推移)', x=df_ann_plot['Date'], y=df_ann_plot['EstimatedPart'],
                 marker_color='#aec7e8', # 薄い青（水色）
                 text=labels_est,
@@ -731,7 +695,7 @@ def get_dps_eps_chart_data(data_dict, is_data_dict):
         
         # 利回りトレース (年初株価ベース - 折れ線)
         if 'Yield' in df_ann_plot.columns:
-            fig.add_trace(go.Scatter(
+            fig.add_trace(chart_spec.Scatter(
                 name='配当利回り (年間推移)', x=df_ann_plot['Date'], y=df_ann_plot['Yield'],
                 mode='lines+markers',
                 line=dict(color='#ff7f0e', width=3),
@@ -746,7 +710,7 @@ def get_dps_eps_chart_data(data_dict, is_data_dict):
         df_q_plot = df_q.sort('Date').tail(20)
         
         # 配当額 (棒グラフ)
-        fig.add_trace(go.Bar(
+        fig.add_trace(chart_spec.Bar(
             name='配当額 (権利落日別)', x=df_q_plot['Date'], y=df_q_plot['Value'],
             marker_color='#1f77b4',
             hovertemplate='権利落日: %{x}<br>配当額: $%{y:.4f}<extra></extra>',
@@ -758,7 +722,7 @@ def get_dps_eps_chart_data(data_dict, is_data_dict):
             df_q_plot = df_q_plot.with_columns(
                 (pl.col('Value') * 4 / pl.col('Price')).alias('Yield_Q')
             )
-            fig.add_trace(go.Scatter(
+            fig.add_trace(chart_spec.Scatter(
                 name='配当利回り (権利落日別)', x=df_q_plot['Date'], y=df_q_plot['Yield_Q'],
                 mode='lines+markers',
                 line=dict(color='#d62728', width=2),
@@ -807,7 +771,7 @@ def get_bs_chart_data(data_dict):
     df_q = data_dict.get('quarterly', pl.DataFrame())
     if df_a.is_empty() and df_q.is_empty(): return 'データなし'
     
-    fig = go.Figure()
+    fig = _new_figure()
 
     def add_bs_traces(fig, df, suffix="", visible=True):
         if df.is_empty(): return 0
@@ -853,45 +817,45 @@ def get_bs_chart_data(data_dict):
         has_breakdown = (df_plot['CurrAssets'].sum() != 0)
         if has_breakdown:
             # 資産側 - 下から順に追加 (固定->流動)
-            fig.add_trace(go.Bar(
+            fig.add_trace(chart_spec.Bar(
                 name='固定資産' + suffix, x=df_plot['Date'], y=df_plot['NonCurrAssets'], 
                 marker_color='#1f77b4', offsetgroup=0, visible=visible,
                 text=format_bs_val(df_plot['NonCurrAssets']), textposition='auto'
             )) 
-            fig.add_trace(go.Bar(
+            fig.add_trace(chart_spec.Bar(
                 name='流動資産' + suffix, x=df_plot['Date'], y=df_plot['CurrAssets'], 
                 marker_color='#aec7e8', offsetgroup=0, visible=visible,
                 text=format_bs_val(df_plot['CurrAssets']), textposition='auto'
             ))
             # 負債・純資産側 - 下から順に追加 (純資産->固定負債->流動負債)
-            fig.add_trace(go.Bar(
+            fig.add_trace(chart_spec.Bar(
                 name='純資産' + suffix, x=df_plot['Date'], y=df_plot['Equity'], 
                 marker_color='#2ca02c', offsetgroup=1, visible=visible,
                 text=format_bs_val(df_plot['Equity']), textposition='auto'
             ))
-            fig.add_trace(go.Bar(
+            fig.add_trace(chart_spec.Bar(
                 name='固定負債' + suffix, x=df_plot['Date'], y=df_plot['FixedLiab'], 
                 marker_color='#ff7f0e', offsetgroup=1, visible=visible,
                 text=format_bs_val(df_plot['FixedLiab']), textposition='auto'
             ))
-            fig.add_trace(go.Bar(
+            fig.add_trace(chart_spec.Bar(
                 name='流動負債' + suffix, x=df_plot['Date'], y=df_plot['CurrLiab'], 
                 marker_color='#ffbb78', offsetgroup=1, visible=visible,
                 text=format_bs_val(df_plot['CurrLiab']), textposition='auto'
             ))
             trace_count = 5
         else:
-            fig.add_trace(go.Bar(
+            fig.add_trace(chart_spec.Bar(
                 name='総資産' + suffix, x=df_plot['Date'], y=df_plot['TotalAssets'], 
                 marker_color='#1f77b4', offsetgroup=0, visible=visible,
                 text=format_bs_val(df_plot['TotalAssets']), textposition='auto'
             ))
-            fig.add_trace(go.Bar(
+            fig.add_trace(chart_spec.Bar(
                 name='純資産' + suffix, x=df_plot['Date'], y=df_plot['Equity'], 
                 marker_color='#2ca02c', offsetgroup=1, visible=visible,
                 text=format_bs_val(df_plot['Equity']), textposition='auto'
             ))
-            fig.add_trace(go.Bar(
+            fig.add_trace(chart_spec.Bar(
                 name='総負債' + suffix, x=df_plot['Date'], y=df_plot['TotalLiab'], 
                 marker_color='#ff7f0e', offsetgroup=1, visible=visible,
                 text=format_bs_val(df_plot['TotalLiab']), textposition='auto'
@@ -920,7 +884,7 @@ def get_is_chart_data(data_dict):
     df_q = data_dict.get('quarterly', pl.DataFrame())
     if df_a.is_empty() and df_q.is_empty(): return 'データなし'
 
-    fig = go.Figure()
+    fig = _new_figure()
 
     def add_is_traces(fig, df, suffix="", visible=True):
         if df.is_empty(): return 0
@@ -945,7 +909,7 @@ def get_is_chart_data(data_dict):
         for item_key, name, color in items:
             sub = get_aligned_data(item_key)
             if not sub.is_empty():
-                fig.add_trace(go.Bar(name=name + suffix, x=sub['Date'], y=sub['Value'], marker_color=color, visible=visible))
+                fig.add_trace(chart_spec.Bar(name=name + suffix, x=sub['Date'], y=sub['Value'], marker_color=color, visible=visible))
                 trace_count += 1
         
         # 利益率
@@ -971,7 +935,7 @@ def get_is_chart_data(data_dict):
                         else:
                             calc_val.append(None)
                     
-                    fig.add_trace(go.Scatter(name=name + suffix, x=rev['Date'], y=calc_val, line=dict(color=color, width=2), mode='lines+markers', yaxis='y2', hovertemplate='%{y:.1%}', visible=visible))
+                    fig.add_trace(chart_spec.Scatter(name=name + suffix, x=rev['Date'], y=calc_val, line=dict(color=color, width=2), mode='lines+markers', yaxis='y2', hovertemplate='%{y:.1%}', visible=visible))
                     trace_count += 1
         except Exception as e:
             # print(f"Error calculating ratios: {e}")
@@ -1009,7 +973,7 @@ def get_cf_chart_data(data_dict):
     df_q = data_dict.get('quarterly', pl.DataFrame())
     if df_a.is_empty() and df_q.is_empty(): return 'データなし'
     
-    fig = go.Figure()
+    fig = _new_figure()
 
     def add_cf_traces(fig, df, suffix="", visible=True):
         if df.is_empty(): return 0
@@ -1034,7 +998,7 @@ def get_cf_chart_data(data_dict):
         for item_key, name, color in items:
             sub = get_aligned_data(item_key)
             if not sub.is_empty():
-                fig.add_trace(go.Bar(name=name + suffix, x=sub['Date'], y=sub['Value'], marker_color=color, visible=visible))
+                fig.add_trace(chart_spec.Bar(name=name + suffix, x=sub['Date'], y=sub['Value'], marker_color=color, visible=visible))
                 trace_count += 1
         return trace_count
 
@@ -1058,7 +1022,7 @@ def get_tp_chart_data(data_dict):
     df_q = data_dict.get('quarterly', pl.DataFrame())
     if df_a.is_empty() and df_q.is_empty(): return 'データなし'
 
-    fig = go.Figure()
+    fig = _new_figure()
     
     def add_tp_traces(fig, df, suffix="", visible=True):
         if df.is_empty(): return 0
@@ -1098,24 +1062,24 @@ def get_tp_chart_data(data_dict):
         trace_count = 0
         # 純利益
         if not ni.is_empty():
-            fig.add_trace(go.Bar(name='純利益' + suffix, x=ni['Date'], y=ni['Value'], marker_color='#2ca02c', offsetgroup=0, visible=visible))
+            fig.add_trace(chart_spec.Bar(name='純利益' + suffix, x=ni['Date'], y=ni['Value'], marker_color='#2ca02c', offsetgroup=0, visible=visible))
             trace_count += 1
         # 還元
         if not div.is_empty():
             dv = div['Value'].abs()
-            fig.add_trace(go.Bar(name='配当金' + suffix, x=div['Date'], y=dv, marker_color='#aec7e8', offsetgroup=1, visible=visible))
+            fig.add_trace(chart_spec.Bar(name='配当金' + suffix, x=div['Date'], y=dv, marker_color='#aec7e8', offsetgroup=1, visible=visible))
             trace_count += 1
         if not repo.is_empty():
             rv = repo['Value'].abs()
-            fig.add_trace(go.Bar(name='自社株買い' + suffix, x=repo['Date'], y=rv, marker_color='#1f77b4', offsetgroup=1, visible=visible))
+            fig.add_trace(chart_spec.Bar(name='自社株買い' + suffix, x=repo['Date'], y=rv, marker_color='#1f77b4', offsetgroup=1, visible=visible))
             trace_count += 1
         
         # 性向
         if not div_r.is_empty():
-            fig.add_trace(go.Scatter(name='配当性向' + suffix, x=div_r['Date'], y=div_r['Value'], marker_color='#ffbb78', mode='lines+markers', yaxis='y2', hovertemplate='%{y:.1%}', visible=visible))
+            fig.add_trace(chart_spec.Scatter(name='配当性向' + suffix, x=div_r['Date'], y=div_r['Value'], marker_color='#ffbb78', mode='lines+markers', yaxis='y2', hovertemplate='%{y:.1%}', visible=visible))
             trace_count += 1
         if not total_r.is_empty():
-            fig.add_trace(go.Scatter(name='総還元性向' + suffix, x=total_r['Date'], y=total_r['Value'], marker_color='#ff7f0e', mode='lines+markers', yaxis='y2', hovertemplate='%{y:.1%}', visible=visible))
+            fig.add_trace(chart_spec.Scatter(name='総還元性向' + suffix, x=total_r['Date'], y=total_r['Value'], marker_color='#ff7f0e', mode='lines+markers', yaxis='y2', hovertemplate='%{y:.1%}', visible=visible))
             trace_count += 1
         return trace_count
 
@@ -3,25 +3,29 @@ import concurrent.futures
 import os
 import json
 import math
+import re
 import polars as pl
 import pandas as pd
 import numpy as np
 import time
-from yfinance.exceptions import YFRateLimitError
 import base64
 from tqdm import tqdm
 import plotly.io as pio
 import logging
 import datetime
 import threading
+import boto3
 # Suppress noisy yfinance errors
 logging.getLogger('yfinance').setLevel(logging.CRITICAL)
 
 import fundamentals
 import risk_return
 import performance_comparison
+import chart_spec
 import utils
 import market_data
+import earnings_calendar
+import correlation
 from utils import get_gemini_model
 
 import time
@@ -39,20 +43,42 @@ gemini_client = get_gemini_client()
 # flash-lite の 500 リクエスト/日にはほとんど影響しない。
 GEMINI_MODEL_NAME = "models/gemini-3.1-flash-lite"
 
-translation_cache = {}
+translation_cache = utils.get_cache("translation", max_bytes=int(float(os.getenv("TRANSLATION_CACHE_MB", 32)) * 1024 * 1024))
 rotation_translation_counter = 0
 translation_lock = threading.Lock()
 MAX_ROTATION_TRANSLATIONS_PER_DAY = 2
 
-from google.genai import types
+# google.genai は utils 側で遅延 import される
+from utils import types
+
+# R2 接続設定 (散布図・ベンチマークの共有データセットをレポートと同じ reports/ 以下に置く)
+R2_ACCOUNT_ID = os.getenv("R2_ACCOUNT_ID")
+R2_ACCESS_KEY_ID = os.getenv("R2_ACCESS_KEY_ID")
+R2_SECRET_ACCESS_KEY = os.getenv("R2_SECRET_ACCESS_KEY")
+R2_BUCKET_NAME = os.getenv("R2_BUCKET_NAME", "stock-data-c1")
+
+s3_client = None
+if R2_ACCOUNT_ID and R2_ACCESS_KEY_ID and R2_SECRET_ACCESS_KEY:
+    s3_client = boto3.client(
+        's3',
+        endpoint_url=f"https://{R2_ACCOUNT_ID}.r2.cloudflarestorage.com",
+        aws_access_key_id=R2_ACCESS_KEY_ID,
+        aws_secret_access_key=R2_SECRET_ACCESS_KEY,
+        region_name="auto"
+    )
+
+# true にすると R2 へアップロードできなくても共有データセットを参照させる
+# (ローカルの astro dev で public/reports を直接配信する場合のみ)
+SHARED_DATASETS_LOCAL = os.getenv("SHARED_DATASETS_LOCAL", "false").lower() == "true"
 
 def translate_summary(symbol, summary):
     if not summary or not gemini_client:
         return None
-    
-    if symbol in translation_cache:
-        return translation_cache[symbol]
-        
+    # 同じ銘柄の翻訳を複数スレッドが同時に要求しても API 呼び出しは 1 回
+    # (失敗 = None は覚えない)
+    return translation_cache.get_or_load(symbol, lambda: _translate(symbol, summary))
+
+def _translate(symbol, summary):
     for attempt in range(2):
         try:
             # 原文に忠実な翻訳を指示するプロンプト
@@ -67,7 +93,6 @@ def translate_summary(symbol, summary):
                     ),
                 )
             )
-            translation_cache[symbol] = response.text
             return response.text
         except Exception as e:
             if "429" in str(e):
@@ -126,6 +151,7 @@ def fig_to_dict(fig):
     """チャート図オブジェクトを JSON シリアライズ可能な dict に変換する。
 
     - 文字列が渡された場合はエラーメッセージとして包んで返す
+    - ``chart_spec.Figure`` は組み立て時に正規化済みの dict をそのまま返す
     - ``to_plotly_json()`` メソッドを持つオブジェクトはそれを呼び出す
       （現状はバックエンドのチャートデータ構築で用いている図オブジェクトが
       該当する。フロントエンドではこの dict を Chart.js が解釈する）
@@ -134,6 +160,10 @@ def fig_to_dict(fig):
     if isinstance(fig, str):
         return {"error": fig}
 
+    if isinstance(fig, chart_spec.Figure):
+        # chart_spec は組み立て時に値を正規化済み (bdata の展開も不要)
+        return fig.to_plotly_json()
+
     if hasattr(fig, 'to_plotly_json'):
         data = fig.to_plotly_json()
     else:
@@ -141,7 +171,7 @@ def fig_to_dict(fig):
 
     return normalize_chart_data(data)
 
-def generate_json_for_ticker(row, df_info, df_metrics, output_dir, force_translate=False, monex_symbols=None, rakuten_symbols=None, sbi_symbols=None, mufg_symbols=None, matsui_symbols=None, dmm_symbols=None, paypay_symbols=None, moomoo_symbols=None, iwaicosmo_symbols=None):
+def generate_json_for_ticker(row, df_info, df_metrics, output_dir, force_translate=False, monex_symbols=None, rakuten_symbols=None, sbi_symbols=None, mufg_symbols=None, matsui_symbols=None, dmm_symbols=None, paypay_symbols=None, moomoo_symbols=None, iwaicosmo_symbols=None, broker_mask=None, scatter_dataset=None, benchmark_dataset=None):
     # Add a small random delay to mimic human behavior and avoid rate limits
     time.sleep(random.uniform(0.5, 1.5))
     
@@ -152,39 +182,33 @@ def generate_json_for_ticker(row, df_info, df_metrics, output_dir, force_transla
     exchange = row['Exchange']
     
     # Check availability
-    # *symbols に表示用・Symbol_YF の両方を渡すことで、ティッカー変更後も
+    # broker_mask は market_data.with_broker_availability で全銘柄分をまとめて
+    # 計算したビットマスク。 渡されなかった場合は個別のリストから索引を作る。
+    # 表示用・Symbol_YF の両方で照合することで、ティッカー変更後も
     # 旧ティッカーのまま登録している証券会社のリストで正しく照合できる。
-    def check_availability(symbol_list, *symbols):
-        if not symbol_list: return False
-        for sym in symbols:
-            if not sym: continue
-            if sym in symbol_list: return True
-            # BRK-B ⇔ BRKB / BRK.B のような表記ゆれを吸収
-            for v in [sym.replace("-", ""), sym.replace("-", "."), sym.replace(".", "-")]:
-                if v in symbol_list: return True
-        return False
-
-    is_available_monex = check_availability(monex_symbols, ticker_display, chart_target_symbol)
-    is_available_rakuten = check_availability(rakuten_symbols, ticker_display, chart_target_symbol)
-    is_available_sbi = check_availability(sbi_symbols, ticker_display, chart_target_symbol)
-    is_available_mufg = check_availability(mufg_symbols, ticker_display, chart_target_symbol)
-    is_available_matsui = check_availability(matsui_symbols, ticker_display, chart_target_symbol)
-    is_available_dmm = check_availability(dmm_symbols, ticker_display, chart_target_symbol)
-    is_available_paypay = check_availability(paypay_symbols, ticker_display, chart_target_symbol)
-    is_available_moomoo = check_availability(moomoo_symbols, ticker_display, chart_target_symbol)
-    is_available_iwaicosmo = check_availability(iwaicosmo_symbols, ticker_display, chart_target_symbol)
+    if broker_mask is None:
+        index = market_data.build_broker_symbol_index({
+            "monex": monex_symbols, "rakuten": rakuten_symbols, "sbi": sbi_symbols,
+            "mufg": mufg_symbols, "matsui": matsui_symbols, "dmm": dmm_symbols,
+            "paypay": paypay_symbols, "moomoo": moomoo_symbols, "iwaicosmo": iwaicosmo_symbols,
+        })
+        broker_mask = market_data.broker_mask(index, ticker_display, chart_target_symbol)
+    bits = market_data.BROKER_BITS
+    is_available_monex = bool(broker_mask & bits["monex"])
+    is_available_rakuten = bool(broker_mask & bits["rakuten"])
+    is_available_sbi = bool(broker_mask & bits["sbi"])
+    is_available_mufg = bool(broker_mask & bits["mufg"])
+    is_available_matsui = bool(broker_mask & bits["matsui"])
+    is_available_dmm = bool(broker_mask & bits["dmm"])
+    is_available_paypay = bool(broker_mask & bits["paypay"])
+    is_available_moomoo = bool(broker_mask & bits["moomoo"])
+    is_available_iwaicosmo = bool(broker_mask & bits["iwaicosmo"])
     # TradingView symbol
     tv_ticker = ticker_display.replace("-", ".")
     full_symbol = f"{exchange}:{tv_ticker}"
     
     # Sector ETF (SPDR)
-    sector_map = {
-        "Communication Services": "XLC", "Consumer Discretionary": "XLY",
-        "Consumer Staples": "XLP", "Energy": "XLE", "Financials": "XLF",
-        "Health Care": "XLV", "Industrials": "XLI", "Information Technology": "XLK",
-        "Materials": "XLB", "Real Estate": "XLRE", "Utilities": "XLU"
-    }
-    sector_etf_ticker = sector_map.get(current_sector, "SPY")
+    sector_etf_ticker = risk_return.SECTOR_ETF_MAP.get(current_sector, "SPY")
     
     # Financial sector flag for FCF warning
     is_financial = current_sector in ["Financials", "Real Estate"]
@@ -295,8 +319,8 @@ def generate_json_for_ticker(row, df_info, df_metrics, output_dir, force_transla
             return s
 
         try:
-            # yfinance property access for earnings_dates is notoriously flaky
-            ed = utils.safe_get(ticker_obj, 'earnings_dates')
+            # earnings_dates は決算日カレンダーのキャッシュ (1 日 1 回取得) から引く
+            ed = earnings_calendar.get_earnings_dates(chart_target_symbol)
             
             if ed is not None and not ed.empty:
                 # Ensure it's a DataFrame and has required columns
@@ -613,24 +637,25 @@ def generate_json_for_ticker(row, df_info, df_metrics, output_dir, force_transla
 
     # 2. Risk Return Chart
     try:
-        # Ensure Symbol column in df_metrics is string
-        df_metrics = df_metrics.with_columns(pl.col("Symbol").cast(pl.String))
-        
-        # Join df_info to df_metrics to add Security column for hover tooltips
-        df_metrics_with_name = df_metrics.join(
-            df_info.select(["Symbol_YF", "Security"]), 
-            left_on="Symbol", 
-            right_on="Symbol_YF", 
-            how="left"
-        )
-        fig_rr = risk_return.generate_scatter_fig(df_metrics_with_name, chart_target_symbol, sector_etf_ticker, target_index=row.get('Index'))
+        # export_json_reports から渡された場合は Security 付与済み
+        if "Security" in df_metrics.columns:
+            df_metrics_with_name = df_metrics
+        else:
+            df_metrics_with_name = _metrics_with_name(df_info, df_metrics)
+        # scatter_dataset = (共有データセット, 出力先からの相対パス)。 渡された場合、
+        # その他の銘柄の点は埋め込まずに共有ファイルを参照させる
+        dataset, dataset_path = scatter_dataset or (None, None)
+        fig_rr = risk_return.generate_scatter_fig(df_metrics_with_name, chart_target_symbol, sector_etf_ticker, target_index=row.get('Index'), dataset=dataset, dataset_path=dataset_path)
         report_data["charts"]["risk_return"] = fig_to_dict(fig_rr)
     except Exception as e:
         print(f"Error generating risk-return for {ticker_display}: {e}")
 
     # 3. Performance Comparison Chart
     try:
-        fig_perf = performance_comparison.generate_performance_chart_fig(chart_target_symbol, sector_etf_ticker)
+        # benchmark_dataset = (共有ベンチマーク系列, 出力先からの相対パス)。 渡された場合、
+        # セクター ETF・S&P 500 の系列は埋め込まずに共有ファイルを参照させる
+        bench, bench_path = benchmark_dataset or (None, None)
+        fig_perf = performance_comparison.generate_performance_chart_fig(chart_target_symbol, sector_etf_ticker, dataset=bench, dataset_path=bench_path)
         report_data["charts"]["performance"] = fig_to_dict(fig_perf)
     except Exception as e:
         print(f"Error generating performance comparison for {ticker_display}: {e}")
@@ -653,6 +678,16 @@ def generate_json_for_ticker(row, df_info, df_metrics, output_dir, force_transla
         "sector": get_peer_list(other_peers)
     }
 
+    # 値動きの近い銘柄 (日次リターンの相関上位。 correlation.py の索引、 読み込みは 1 回)
+    report_data["peers"]["correlated"] = []
+    try:
+        correlated = correlation.load_correlation_peers().get(chart_target_symbol, [])
+        if correlated:
+            df_corr = pl.DataFrame(correlated).join(peer_metrics, on="Symbol", how="left")
+            report_data["peers"]["correlated"] = df_corr.select(["Symbol", "corr", "Daily_Change"]).to_dicts()
+    except Exception as e:
+        print(f"Error loading correlated peers for {ticker_display}: {e}")
+
     # 5. Movement Reason (from df_metrics if exists)
     if "movement_reason" in df_metrics.columns:
         symbol_reason = df_metrics.filter(pl.col("Symbol") == chart_target_symbol).select("movement_reason").to_series().to_list()
@@ -675,6 +710,112 @@ def generate_json_for_ticker(row, df_info, df_metrics, output_dir, force_transla
         if os.path.exists(temp_path):
             os.remove(temp_path)
 
+def _metrics_with_name(df_info, df_metrics):
+    """散布図のツールチップ用に df_metrics へ Security 列を付ける。"""
+    # Ensure Symbol column in df_metrics is string
+    df_metrics = df_metrics.with_columns(pl.col("Symbol").cast(pl.String))
+    return df_metrics.join(
+        df_info.select(["Symbol_YF", "Security"]),
+        left_on="Symbol",
+        right_on="Symbol_YF",
+        how="left"
+    )
+
+
+def publish_shared_dataset(dataset, rel_path, output_dir):
+    """共有データセットを output_dir/rel_path に書き、 R2 の reports/<rel_path> にアップロードする。
+
+    フロントエンド (shared-dataset.ts) は R2 の reports/<rel_path> を読むため、
+    レポートに参照を書いてよいのはアップロードが成功した場合だけ。 参照してよければ
+    True を返す (SHARED_DATASETS_LOCAL=true ならローカルの書き出しだけで True)。
+    各レポートより先に呼ぶこと。
+    """
+    try:
+        body = json.dumps(normalize_chart_data(dataset), ensure_ascii=False, allow_nan=False)
+    except Exception as e:
+        print(f"共有データセットのシリアライズに失敗 ({rel_path}): {e}")
+        return False
+
+    path = os.path.join(output_dir, rel_path)
+    written = False
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            f.write(body)
+        os.replace(path + ".tmp", path)
+        written = True
+    except Exception as e:
+        print(f"共有データセットの書き出しに失敗 ({rel_path}): {e}")
+
+    if s3_client is None:
+        if not SHARED_DATASETS_LOCAL:
+            print(f"R2 is not configured. Skipping shared dataset upload ({rel_path}).")
+        return written and SHARED_DATASETS_LOCAL
+    try:
+        s3_client.put_object(
+            Bucket=R2_BUCKET_NAME,
+            Key=f"reports/{rel_path}",
+            Body=body.encode("utf-8"),
+            ContentType="application/json"
+        )
+        return True
+    except Exception as e:
+        print(f"共有データセットの R2 アップロードに失敗 ({rel_path}): {e}")
+        return False
+
+
+def export_scatter_datasets(df_info, df_metrics_with_name, output_dir):
+    """リスク・リターン散布図の「その他の銘柄」の点を指数ごとの共有 JSON に書き出す。
+
+    全銘柄の HV / リターンを各レポートに埋め込むと同じデータが銘柄数ぶん
+    シリアライズされるため、 output_dir/risk_return/<指数>.json に 1 回だけ書いて
+    R2 に公開し (publish_shared_dataset)、 各レポートには対象銘柄・セクター ETF・
+    S&P 500 の点と参照だけを持たせる。
+    戻り値: {指数名: (dataset, output_dir からの相対パス)}。 公開できなかった指数は
+    含めない (その指数のレポートには点を埋め込む)。 df_info に Index 列が無い場合は
+    全銘柄を 1 つのデータセット (キー None) にまとめる。
+    """
+    if "Index" in df_info.columns:
+        groups = {
+            idx: df_metrics_with_name.filter(pl.col("Symbol").is_in(df_idx["Symbol_YF"].implode()))
+            for (idx,), df_idx in df_info.group_by("Index", maintain_order=True)
+            if idx
+        }
+    else:
+        groups = {None: df_metrics_with_name}
+
+    datasets = {}
+    for idx, df_idx in groups.items():
+        dataset = risk_return.build_scatter_dataset(df_idx, index_name=idx)
+        rel_path = f"risk_return/{re.sub(r'[^A-Za-z0-9]', '-', idx or 'all')}.json"
+        if publish_shared_dataset(dataset, rel_path, output_dir):
+            datasets[idx] = (dataset, rel_path)
+        else:
+            # 公開できなければ従来どおり各レポートに埋め込む
+            print(f"散布図データセットを公開できないため点を埋め込みます ({idx})")
+    print(f"散布図データセット出力: {', '.join(p for _, p in datasets.values())}")
+    return datasets
+
+
+def export_benchmark_dataset(symbols, output_dir):
+    """セクター ETF・指数の累積リターン系列を共有 JSON (output_dir/performance/benchmarks.json) に書き出す。
+
+    散布図の共有データセットと同じく R2 の reports/ 以下にも公開する (publish_shared_dataset)。
+    戻り値: (dataset, output_dir からの相対パス)。 公開できなければ None
+    (各レポートに従来どおり埋め込む)。
+    """
+    dataset = performance_comparison.build_benchmark_dataset(symbols)
+    if not dataset['symbols']:
+        return None
+    rel_path = "performance/benchmarks.json"
+    if not publish_shared_dataset(dataset, rel_path, output_dir):
+        # 公開できなければ従来どおり各レポートに埋め込む
+        print("ベンチマーク系列を公開できないため各レポートに埋め込みます")
+        return None
+    print(f"ベンチマーク系列出力: {rel_path} ({len(dataset['symbols'])} 銘柄)")
+    return dataset, rel_path
+
+
 def export_json_reports(df_info, df_metrics, output_dir="../stock-blog/public/reports"):
     global rotation_translation_counter
     rotation_translation_counter = 0  # Reset daily counter
@@ -712,16 +853,17 @@ def export_json_reports(df_info, df_metrics, output_dir="../stock-blog/public/re
     except Exception as e:
         print(f"一括データ取得エラー (スキップして続行します): {e}")
 
-    # 取扱銘柄リストを取得 (キャッシュされるため高速)
-    monex_symbols = market_data.get_monex_available_symbols()
-    rakuten_symbols = market_data.get_rakuten_available_symbols()
-    sbi_symbols = market_data.get_sbi_available_symbols()
-    mufg_symbols = market_data.get_mufg_available_symbols()
-    matsui_symbols = market_data.get_matsui_available_symbols()
-    dmm_symbols = market_data.get_dmm_available_symbols()
-    paypay_symbols = market_data.get_paypay_available_symbols()
-    moomoo_symbols = market_data.get_moomoo_available_symbols()
-    iwaicosmo_symbols = market_data.get_iwaicosmo_available_symbols()
+    # 決算日 (EPS サプライズ / 次回決算) を全銘柄まとめて読み込んでおく
+    earnings_calendar.prefetch(symbols_list)
+
+    # 取扱銘柄リストを取得し (全社を並列に読み込み、 パース結果はキャッシュされる)、
+    # 全銘柄の取扱社ビットマスクを 1 回の join で計算しておく
+    df_availability = market_data.with_broker_availability(df_info)
+    broker_masks = dict(zip(df_availability["Symbol"].to_list(), df_availability["broker_mask"].to_list()))
+
+    # リスク・リターン散布図の全銘柄の点は指数ごとの共有ファイルに 1 回だけ書く
+    df_metrics = _metrics_with_name(df_info, df_metrics)
+    scatter_datasets = export_scatter_datasets(df_info, df_metrics, output_dir)
 
     rows = df_info.to_dicts()
     # Ensure consistent order by sorting by Symbol
@@ -751,13 +893,14 @@ def export_json_reports(df_info, df_metrics, output_dir="../stock-blog/public/re
     # Prefetch common data for performance charts
     common_etfs = ["XLC", "XLY", "XLP", "XLE", "XLF", "XLV", "XLI", "XLK", "XLB", "XLRE", "XLU", "SPY", "^GSPC"]
     performance_comparison.prefetch_common_data(common_etfs)
+    benchmark_dataset = export_benchmark_dataset(common_etfs, output_dir)
 
     with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
         futures = {}
         for i, row in enumerate(rows):
             # Check if this stock is in today's batch
             force_translate = (i >= start_idx and i < end_idx)
-            futures[executor.submit(generate_json_for_ticker, row, df_info, df_metrics, output_dir, force_translate, monex_symbols, rakuten_symbols, sbi_symbols, mufg_symbols, matsui_symbols, dmm_symbols, paypay_symbols, moomoo_symbols, iwaicosmo_symbols)] = row['Symbol']
+            futures[executor.submit(generate_json_for_ticker, row, df_info, df_metrics, output_dir, force_translate, broker_mask=broker_masks.get(row['Symbol'], 0), scatter_dataset=scatter_datasets.get(row.get('Index')), benchmark_dataset=benchmark_dataset)] = row['Symbol']
             
         for future in tqdm(concurrent.futures.as_completed(futures), total=len(rows)):
             try:
@@ -766,6 +909,20 @@ def export_json_reports(df_info, df_metrics, output_dir="../stock-blog/public/re
                 ticker = futures[future]
                 print(f"Error processing {ticker}: {e}")
 
+    breaker_summary = utils.circuit_breaker_summary()
+    if breaker_summary:
+        print("Circuit breaker summary (fields skipped while open are omitted):")
+        for name, st in breaker_summary.items():
+            print(f"  {name}: state={st['state']} rejected={st['rejected']} transitions={st['transitions']}")
+
+    cache_summary = utils.cache_summary()
+    if cache_summary:
+        print("Cache summary:")
+        for name, st in cache_summary.items():
+            print(f"  {name}: hits={st['hits']} misses={st['misses']} coalesced={st['coalesced']} "
+                  f"evictions={st['evictions']} entries={st['entries']} bytes={st['bytes']}")
+        utils.log_cache_summary()
+
 if __name__ == "__main__":
     print("Testing JSON generation for all sectors (2 stocks per sector + MSFT)...")
     
@@ -808,5 +965,6 @@ if __name__ == "__main__":
     df_info = pl.DataFrame(test_data)
     test_symbols = df_info["Symbol_YF"].to_list()
     
-    df_metrics = risk_return.calculate_market_metrics_parallel(test_symbols)
+    sectors = dict(zip(df_info["Symbol_YF"].to_list(), df_info["GICS Sector"].to_list()))
+    df_metrics = risk_return.calculate_market_metrics_parallel(test_symbols, sectors=sectors)
     export_json_reports(df_info, df_metrics, output_dir="../stock-blog/public/reports")
@@ -23,7 +23,8 @@ def generate_msft_report():
     }])
     
     # 2. リスク指標の計算
-    df_metrics = risk_return.calculate_market_metrics_parallel(["MSFT"])
+    sectors = dict(zip(df_sp500["Symbol_YF"].to_list(), df_sp500["GICS Sector"].to_list()))
+    df_metrics = risk_return.calculate_market_metrics_parallel(["MSFT"], sectors=sectors)
     
     # 3. JSONレポートの生成 (修正した fundamentals.py が使用される)
     # 出力先は自動的に ../stock-blog/public/reports/ になる
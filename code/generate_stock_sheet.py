@@ -14,26 +14,21 @@ def generate_az_sheet():
 
     # 各証券会社の取扱い銘柄を取得
     print("各証券会社の取扱い情報を取得中...")
-    monex = market_data.get_monex_available_symbols()
-    rakuten = market_data.get_rakuten_available_symbols()
-    sbi = market_data.get_sbi_available_symbols()
-    mufg = market_data.get_mufg_available_symbols()
-    matsui = market_data.get_matsui_available_symbols()
-    dmm = market_data.get_dmm_available_symbols()
-    paypay = market_data.get_paypay_available_symbols()
-    iwaicosmo = market_data.get_iwaicosmo_available_symbols()
-
-    # 取扱いフラグを追加 (Symbolカラムで判定)
-    df = df.with_columns([
-        pl.col('Symbol').is_in(list(monex)).alias('Monex'),
-        pl.col('Symbol').is_in(list(rakuten)).alias('Rakuten'),
-        pl.col('Symbol').is_in(list(sbi)).alias('SBI'),
-        pl.col('Symbol').is_in(list(mufg)).alias('MUFG'),
-        pl.col('Symbol').is_in(list(matsui)).alias('Matsui'),
-        pl.col('Symbol').is_in(list(dmm)).alias('DMM'),
-        pl.col('Symbol').is_in(list(paypay)).alias('PayPay'),
-        pl.col('Symbol').is_in(list(iwaicosmo)).alias('IwaiCosmo'),
-    ])
+    # 取扱いフラグを追加 (Symbol / Symbol_YF の表記ゆれも含めて判定)
+    flag_columns = {
+        "is_available_monex": "Monex",
+        "is_available_rakuten": "Rakuten",
+        "is_available_sbi": "SBI",
+        "is_available_mufg": "MUFG",
+        "is_available_matsui": "Matsui",
+        "is_available_dmm": "DMM",
+        "is_available_paypay": "PayPay",
+        "is_available_iwaicosmo": "IwaiCosmo",
+    }
+    df = market_data.with_broker_availability(df)
+    df = df.rename(flag_columns).drop(
+        ["broker_mask"] + [c for c in df.columns if c.startswith("is_available_") and c not in flag_columns]
+    )
 
     # A-Z順にソート (Symbol基準)
     df_sorted = df.sort('Symbol')
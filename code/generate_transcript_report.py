@@ -6,8 +6,10 @@ import json
 import re
 import numpy as np
 import pandas as pd
+import statement_numeric
 from utils import get_gemini_client
-from defeatbeta_api.data.ticker import Ticker
+# utils 経由で import すると defeatbeta の update_time 正規化パッチが当たる
+from utils import DBTicker as Ticker
 
 # 翻訳・要約・センチメント分析に使うモデル（GEMINI.md 既定）。
 # gemma は応答が遅い代わりに quota が広い（1 日 1500 リクエスト）。
@@ -193,6 +195,8 @@ def fetch_quarter_financials(ticker, report_date):
             return None
         if "Breakdown" in df.columns:
             df = df.set_index("Breakdown")
+        # Decimal / '*' / None が混ざった object 列を float64 にそろえる
+        df = statement_numeric.coerce_statement_frame(df)
     except Exception as e:
         print(f"  quarterly_income_statement の取得に失敗: {e}")
         return None
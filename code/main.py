@@ -92,28 +92,19 @@ def upload_broker_availability_to_r2():
     全銘柄を「取扱なし」として出力する。
     1社の取得に失敗しても他社の結果は維持する (失敗した社は空リスト)。
     """
-    # name -> 取扱シンボルの集合を返す callable
-    brokers = {
-        "monex": lambda: market_data.get_monex_available_symbols().keys(),
-        "rakuten": market_data.get_rakuten_available_symbols,
-        "sbi": market_data.get_sbi_available_symbols,
-        "mufg": market_data.get_mufg_available_symbols,
-        "matsui": market_data.get_matsui_available_symbols,
-        "dmm": market_data.get_dmm_available_symbols,
-        "paypay": market_data.get_paypay_available_symbols,
-        "moomoo": market_data.get_moomoo_available_symbols,
-        "iwaicosmo": market_data.get_iwaicosmo_available_symbols,
-    }
+    # 全社を並列に取得する (パース結果は market_data 側でキャッシュされる)
+    try:
+        loaded = market_data.load_broker_availability()
+    except Exception as e:
+        loaded = {}
+        utils.log_event("ERROR", "SYSTEM", f"Failed to load broker lists: {e}")
 
     availability = {}
-    for name, fetch in brokers.items():
-        try:
-            symbols = sorted({s for s in fetch() if s})
-            availability[name] = symbols
-            utils.log_event("INFO", "SYSTEM", f"Broker '{name}': {len(symbols)} symbols")
-        except Exception as e:
-            availability[name] = []
-            utils.log_event("ERROR", "SYSTEM", f"Failed to fetch broker list '{name}': {e}")
+    for name in market_data.BROKER_SPECS:
+        # monex は {シンボル: 日本語名} の辞書なのでキーだけを使う
+        symbols = sorted({s for s in loaded.get(name, ()) if s})
+        availability[name] = symbols
+        utils.log_event("INFO", "SYSTEM", f"Broker '{name}': {len(symbols)} symbols")
 
     json_data = json.dumps(availability, ensure_ascii=False, indent=2)
 
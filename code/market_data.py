@@ -1,6 +1,9 @@
 # -*- coding: utf-8 -*-
 import os
-import yfinance as yf
+import datetime
+import hashlib
+import importlib.util
+import threading
 import polars as pl
 import pandas as pd
 import requests
@@ -10,10 +13,8 @@ from io import StringIO
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from tqdm import tqdm
 
-try:
-    from curl_cffi import requests as curl_requests
-except ImportError:
-    curl_requests = None
+# curl_cffi は utils 側で遅延 import される (初回の取得時まで読み込まない)
+curl_requests = utils.curl_requests if utils.HAS_CURL_CFFI else None
 
 # ==========================================
 #  Broker Lists Management
@@ -29,48 +30,27 @@ if not os.path.exists(BROKER_LISTS_DIR):
 #  Part C (前半): データ取得
 # ==========================================
 
-def get_monex_available_symbols():
-    """
-    マネックス証券の米国株取扱銘柄リストを取得し、{シンボル: 日本語名} の辞書を返します。
-    """
-    url = "https://mst.monex.co.jp/pc/pdfroot/public/50/99/Monex_US_LIST.csv"
-    csv_path = os.path.join(BROKER_LISTS_DIR, "Monex_US_LIST.csv")
-    # リポジトリにコミット済みのCSVをフォールバックとして使う
-    repo_root = os.path.dirname(BASE_DIR)
-    fallback_csv_path = os.path.join(repo_root, "stock-blog", "scripts", "data", "broker_lists", "Monex_US_LIST.csv")
-
-    def _read_csv(path):
-        try:
-            with open(path, "rb") as f:
-                return f.read().decode("cp932", errors="replace")
-        except Exception:
-            return None
-
-    # 1. キャッシュ済みファイルを優先
-    content = _read_csv(csv_path) if os.path.exists(csv_path) else None
-    # 2. リポジトリ内のコミット済みファイルにフォールバック
-    if not content:
-        content = _read_csv(fallback_csv_path)
-        if content:
-            print(f"Monex CSV: using committed fallback at {fallback_csv_path}")
-    # 3. ネットワークから取得
-    if not content:
-        if curl_requests:
-            try:
-                # TLSフィンガープリントをChromeに偽装して取得
-                resp = curl_requests.get(url, impersonate="chrome110")
-                resp.raise_for_status()
-                content = resp.content.decode("cp932", errors="replace")
-                # キャッシュ保存
-                with open(csv_path, "wb") as f:
-                    f.write(resp.content)
-            except Exception as e:
-                print(f"Error fetching Monex list: {e}")
-                return {}
-        else:
-            print("curl-cffi is not installed. Skipping Monex list fetch.")
-            return {}
-
+# ------------------------------------------
+#  証券会社の取扱銘柄レジストリ
+# ------------------------------------------
+# 各社のリストは「取得元 URL・文字コード・パーサ」の宣言 (BROKER_SPECS) で
+# 記述し、 取得・キャッシュ・パース結果の保存は共通ローダが担う。
+#   1. data/broker_lists/ に保存した取得元ファイルがあればそれを使い、
+#      無ければネットワークから取得して保存する (従来どおり)。
+#   2. パース結果は BROKER_ARTIFACT_PATH に 1 ファイルでまとめて保存する。
+#      取得元ファイルの mtime / サイズ (再取得時は ETag) が一致すれば
+#      再パースしない (SBI / 岩井コスモの BeautifulSoup パースが重いため)。
+#   3. プロセス内では一度読み込んだ結果をメモ化し、 2 回目以降の呼び出しは
+#      辞書参照だけで返す。 取得に失敗した社はメモ化せず次回に再試行する。
+BROKER_ARTIFACT_PATH = os.path.join(BROKER_LISTS_DIR, "parsed_availability.json")
+# パーサの出力形式を変えたときに上げる (保存済みのパース結果を無効化する)
+BROKER_ARTIFACT_VERSION = 1
+
+_broker_memo = {}
+_broker_lock = threading.Lock()
+
+
+def _parse_monex_list(content):
     mapping = {}
     lines = content.splitlines()
     for line in lines:
@@ -81,9 +61,511 @@ def get_monex_available_symbols():
             # シンボルが英数字（一部記号含む）であることを確認
             if symbol and any(c.isalnum() for c in symbol):
                 mapping[symbol] = ja_name
-    
     return mapping
 
+
+def _parse_rakuten_list(content):
+    symbols = set()
+    lines = content.splitlines()
+    for line in lines:
+        parts = line.split(",")
+        if len(parts) >= 6:
+            symbol = parts[0].strip()
+            available = parts[5].strip()
+            # 「○」または「現地コード」以外の行を処理
+            if symbol and symbol != "現地コード" and "○" in available:
+                symbols.add(symbol)
+    return symbols
+
+
+def _parse_sbi_list(html):
+    from bs4 import BeautifulSoup
+    symbols = set()
+    soup = BeautifulSoup(html, "html.parser")
+    # 構造: <tr><th class="vaM alC">SYMBOL</th>...</tr>
+    for th in soup.find_all("th", class_=lambda x: x and "vaM" in x and "alC" in x):
+        symbol = th.get_text(strip=True)
+        if symbol and symbol.isupper() and len(symbol) <= 5:
+            symbols.add(symbol)
+    return symbols
+
+
+def _parse_mufg_list(content):
+    import re
+    symbols = set()
+    # beikabu.js の構造: <td>SYMBOL</td>
+    matches = re.findall(r"<td>([A-Z\.]+?)</td>", content)
+    for symbol in matches:
+        if symbol and any(c.isalnum() for c in symbol):
+            symbols.add(symbol)
+    return symbols
+
+
+def _parse_first_column_list(header):
+    """1 列目がシンボルの CSV (松井・DMM) のパーサを返す。 header はヘッダ行の値。"""
+    def parse(content):
+        symbols = set()
+        for line in content.splitlines():
+            symbol = line.split(",")[0].strip()
+            if symbol and symbol != header and any(c.isalnum() for c in symbol):
+                symbols.add(symbol)
+        return symbols
+    return parse
+
+
+def _parse_paypay_list(content):
+    # 2 つの JSON から抽出済みのシンボルを 1 行 1 銘柄で保存している
+    return set(line.strip() for line in content.splitlines() if line.strip())
+
+
+def _parse_moomoo_list(content):
+    symbols = set()
+    try:
+        df = pl.read_csv(StringIO(content))
+        if "code" in df.columns:
+            for code in df["code"]:
+                if code and code.startswith("US."):
+                    symbol = code[3:]  # "US.AAPL" -> "AAPL"
+                    if symbol:
+                        symbols.add(symbol)
+    except Exception as e:
+        print(f"Error reading moomoo list with Polars: {e}, falling back to csv module")
+        import csv as _csv
+        reader = _csv.reader(StringIO(content))
+        header = next(reader, [])
+        if "code" in header:
+            code_idx = header.index("code")
+            for row in reader:
+                if len(row) > code_idx:
+                    code = row[code_idx].strip()
+                    if code.startswith("US."):
+                        symbol = code[3:]
+                        if symbol:
+                            symbols.add(symbol)
+    return symbols
+
+
+def _parse_iwaicosmo_list(html):
+    from bs4 import BeautifulSoup
+    symbols = set()
+    soup = BeautifulSoup(html, "html.parser")
+    # id="myTable" の tbody 内の 各 tr の 3番目の td がシンボル
+    table = soup.find("table", id="myTable")
+    if table:
+        tbody = table.find("tbody")
+        if tbody:
+            for tr in tbody.find_all("tr"):
+                tds = tr.find_all("td")
+                if len(tds) >= 3:
+                    symbol = tds[2].get_text(strip=True)
+                    if symbol and any(c.isalnum() for c in symbol):
+                        symbols.add(symbol)
+    return symbols
+
+
+def _download_broker_source(spec, path):
+    """spec["urls"][0] を取得して path に保存し、 レスポンスの ETag を返す。"""
+    if not curl_requests:
+        raise RuntimeError("curl-cffi is not installed")
+    # TLSフィンガープリントをChromeに偽装して取得
+    resp = curl_requests.get(spec["urls"][0], impersonate="chrome110")
+    resp.raise_for_status()
+    with open(path, "wb") as f:
+        f.write(resp.content)
+    return resp.headers.get("ETag")
+
+
+def _download_paypay_source(spec, path):
+    """株式・ETF の 2 つの JSON を取得し、 シンボル一覧を path に保存する。"""
+    if not curl_requests:
+        raise RuntimeError("curl-cffi is not installed")
+    symbols = set()
+    etags = []
+    for url in spec["urls"]:
+        try:
+            resp = curl_requests.get(url, impersonate="chrome110", timeout=15)
+            resp.raise_for_status()
+            for item in resp.json():
+                symbol = item.get("codenumber", "").strip()
+                if symbol and any(c.isalnum() for c in symbol):
+                    symbols.add(symbol)
+            etags.append(resp.headers.get("ETag") or "")
+        except Exception as e:
+            print(f"Error fetching PayPay list from {url}: {e}")
+    if not symbols:
+        raise RuntimeError("no symbols returned")
+    with open(path, "w", encoding="utf-8") as f:
+        for s in sorted(symbols):
+            f.write(f"{s}\n")
+    return "|".join(etags) if all(etags) and len(etags) == len(spec["urls"]) else None
+
+
+# name -> 取得・パースの宣言。
+#   label: ログ表示名 / file: data/broker_lists/ 内の保存ファイル名
+#   urls: 取得元 (無い場合はコミット済みファイルのみを使う)
+#   encoding: 保存ファイルの文字コード / parser: デコード済みテキスト -> 結果
+#   fallback_paths: 保存ファイルが無いときに参照するコミット済みファイル
+#   requires: パースに必要なオプション依存 / fetch: 取得処理の差し替え
+#   mapping: True なら結果は {シンボル: 日本語名}、 それ以外はシンボルの set
+BROKER_SPECS = {
+    "monex": {
+        "label": "Monex",
+        "file": "Monex_US_LIST.csv",
+        "urls": ["https://mst.monex.co.jp/pc/pdfroot/public/50/99/Monex_US_LIST.csv"],
+        "encoding": "cp932",
+        "parser": _parse_monex_list,
+        "fallback_paths": [
+            # リポジトリにコミット済みのCSVをフォールバックとして使う
+            os.path.join(os.path.dirname(BASE_DIR), "stock-blog", "scripts", "data", "broker_lists", "Monex_US_LIST.csv"),
+        ],
+        "mapping": True,
+    },
+    "rakuten": {
+        "label": "Rakuten",
+        "file": "Rakuten_US_LIST.csv",
+        "urls": ["https://www.trkd-asia.com/rakutensec/exportcsvus?all=on&vall=on&forwarding=na&target=0&theme=na&returns=na&head_office=na&name=&code=&sector=na&pageNo=&c=us&p=result&r1=on"],
+        # 楽天は UTF-8 with BOM (utf-8-sig)
+        "encoding": "utf-8-sig",
+        "parser": _parse_rakuten_list,
+    },
+    "sbi": {
+        "label": "SBI",
+        "file": "SBI_US_LIST.html",
+        "urls": ["https://search.sbisec.co.jp/v2/popwin/info/stock/pop6040_usequity_list.html"],
+        # SBIは Shift-JIS (cp932)
+        "encoding": "cp932",
+        "parser": _parse_sbi_list,
+        "requires": "bs4",
+    },
+    "mufg": {
+        "label": "MUFG",
+        "file": "Mufg_US_LIST.js",
+        "urls": ["https://kabu.com/process/beikabu.js"],
+        "encoding": "utf-8",
+        "parser": _parse_mufg_list,
+    },
+    "matsui": {
+        "label": "Matsui",
+        "file": "Matsui_US_LIST.csv",
+        "urls": ["https://www.matsui.co.jp/us-stock/domestic/list/symbollist/symbollist.csv"],
+        "encoding": "cp932",
+        # ヘッダー「コード」を除外
+        "parser": _parse_first_column_list("コード"),
+    },
+    "dmm": {
+        "label": "DMM",
+        "file": "Dmm_US_LIST.csv",
+        "urls": ["https://kabu.dmm.com/_data/us-stock.csv"],
+        "encoding": "utf-8",
+        # ヘッダー「code」を除外
+        "parser": _parse_first_column_list("code"),
+    },
+    "paypay": {
+        "label": "PayPay",
+        "file": "Paypay_US_LIST.txt",
+        "urls": [
+            "https://www.paypay-sec.co.jp/us-stock/list/data-us_stock.json",
+            "https://www.paypay-sec.co.jp/us-stock/list/data-us_etf.json",
+        ],
+        "encoding": "utf-8",
+        "parser": _parse_paypay_list,
+        "fetch": _download_paypay_source,
+    },
+    "moomoo": {
+        # moomoo はダウンロード元が無いため、 コミット済みの CSV のみを使う
+        "label": "moomoo",
+        "file": "moomoo_us_stocks.csv",
+        "urls": [],
+        "encoding": "utf-8",
+        "parser": _parse_moomoo_list,
+    },
+    "iwaicosmo": {
+        "label": "IwaiCosmo",
+        "file": "IwaiCosmo_US_LIST.html",
+        "urls": ["https://www.iwaicosmo.co.jp/investment/list/"],
+        "encoding": "utf-8",
+        "parser": _parse_iwaicosmo_list,
+        "requires": "bs4",
+    },
+}
+
+
+def _empty_broker_result(spec):
+    return {} if spec.get("mapping") else set()
+
+
+def _load_broker_artifact():
+    if os.path.exists(BROKER_ARTIFACT_PATH):
+        try:
+            with open(BROKER_ARTIFACT_PATH, "r", encoding="utf-8") as f:
+                artifact = json.load(f)
+            if artifact.get("version") == BROKER_ARTIFACT_VERSION:
+                return artifact.get("brokers") or {}
+        except Exception:
+            pass
+    return {}
+
+
+def _save_broker_artifact(brokers):
+    tmp = BROKER_ARTIFACT_PATH + ".tmp"
+    try:
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"version": BROKER_ARTIFACT_VERSION, "brokers": brokers},
+                      f, ensure_ascii=False, separators=(",", ":"), sort_keys=True)
+        os.replace(tmp, BROKER_ARTIFACT_PATH)
+    except Exception as e:
+        print(f"Failed to save broker artifact: {e}")
+
+
+def _source_fingerprint(path, etag=None):
+    st = os.stat(path)
+    return {"path": os.path.basename(path), "mtime_ns": st.st_mtime_ns,
+            "size": st.st_size, "etag": etag}
+
+
+def _same_source(entry, fingerprint):
+    src = (entry or {}).get("source") or {}
+    if fingerprint.get("etag") and src.get("etag") == fingerprint["etag"]:
+        return True  # 再取得したが内容は前回と同じ
+    return all(src.get(k) == fingerprint[k] for k in ("path", "mtime_ns", "size"))
+
+
+def _load_broker(name, cached_entry=None):
+    """1 社分の取扱リストを読み込み、 (結果, 保存用エントリ) を返す。
+
+    取得・パースに失敗した場合は (空の結果, None)。
+    """
+    spec = BROKER_SPECS[name]
+    label = spec["label"]
+    empty = _empty_broker_result(spec)
+    if spec.get("requires") and importlib.util.find_spec(spec["requires"]) is None:
+        print(f"{spec['requires']} is not installed. Skipping {label} list fetch.")
+        return empty, None
+
+    # 1. キャッシュ済みファイル → 2. コミット済みファイル → 3. ネットワーク
+    cache_path = os.path.join(BROKER_LISTS_DIR, spec["file"])
+    path = None
+    for candidate in [cache_path] + spec.get("fallback_paths", []):
+        if os.path.exists(candidate) and os.path.getsize(candidate) > 0:
+            path = candidate
+            break
+    if path and path != cache_path:
+        print(f"{label} list: using committed fallback at {path}")
+
+    etag = None
+    if path is None:
+        if not spec["urls"]:
+            print(f"Warning: {label} stock list not found at {cache_path}")
+            return empty, None
+        try:
+            etag = spec.get("fetch", _download_broker_source)(spec, cache_path)
+        except Exception as e:
+            print(f"Error fetching {label} list: {e}")
+            return empty, None
+        path = cache_path
+
+    fingerprint = _source_fingerprint(path, etag)
+    if cached_entry and _same_source(cached_entry, fingerprint):
+        symbols = cached_entry.get("symbols")
+        result = dict(symbols) if spec.get("mapping") else set(symbols)
+        return result, {"source": fingerprint, "symbols": symbols}
+
+    try:
+        with open(path, "rb") as f:
+            content = f.read().decode(spec["encoding"], errors="replace")
+        result = spec["parser"](content)
+    except Exception as e:
+        print(f"Error parsing {label} list: {e}")
+        return empty, None
+    symbols = result if spec.get("mapping") else sorted(result)
+    return result, {"source": fingerprint, "symbols": symbols}
+
+
+def load_broker_availability(names=None, refresh=False):
+    """証券会社ごとの取扱銘柄を {name: 結果} で返す。
+
+    未読み込みの社は並列に取得・パースし、 結果はプロセス内でメモ化する
+    (結果オブジェクトは共有されるため、 呼び出し側で変更しないこと)。
+    refresh=True ならメモと保存済みパース結果を使わずに読み直す。
+    """
+    names = list(names) if names is not None else list(BROKER_SPECS)
+    with _broker_lock:
+        pending = [n for n in names if refresh or n not in _broker_memo]
+        if pending:
+            artifact = _load_broker_artifact()
+            with ThreadPoolExecutor(max_workers=len(pending)) as executor:
+                loaded = dict(zip(pending, executor.map(
+                    lambda n: _load_broker(n, None if refresh else artifact.get(n)),
+                    pending,
+                )))
+            changed = False
+            for name, (result, entry) in loaded.items():
+                if entry is None:
+                    continue
+                _broker_memo[name] = result
+                if artifact.get(name) != entry:
+                    artifact[name] = entry
+                    changed = True
+            if changed:
+                _save_broker_artifact(artifact)
+        return {
+            n: _broker_memo.get(n, _empty_broker_result(BROKER_SPECS[n]))
+            for n in names
+        }
+
+
+def get_broker_symbols(name):
+    """1 社分の取扱銘柄 (load_broker_availability のメモ化結果) を返す。"""
+    return load_broker_availability([name])[name]
+
+
+# ------------------------------------------
+#  取扱判定用のシンボル索引
+# ------------------------------------------
+# 銘柄ごとに 9 社 × 表記ゆれを set で照合する代わりに、 ブローカーのリストに
+# 載っている表記 → 取扱社のビットマスク (BROKER_BITS の OR) の索引を一度だけ
+# 作り、 銘柄側の表記ゆれ候補のマスクを OR して判定する。
+BROKER_BITS = {name: 1 << i for i, name in enumerate(BROKER_SPECS)}
+
+_broker_index_memo = {}
+
+
+def symbol_forms(symbol):
+    """照合に使う表記の候補 (BRK-B ⇔ BRKB / BRK.B のような表記ゆれを吸収)。"""
+    return (symbol, symbol.replace("-", ""), symbol.replace("-", "."), symbol.replace(".", "-"))
+
+
+def build_broker_symbol_index(brokers=None):
+    """{表記: 取扱社のビットマスク} を返す。
+
+    brokers ({name: シンボルの集合 or 辞書}) を省略した場合はレジストリの
+    全社分を使い、 結果をメモ化する。
+    """
+    if brokers is None:
+        brokers = load_broker_availability()
+        key = tuple((name, id(brokers[name])) for name in BROKER_SPECS)
+        index = _broker_index_memo.get(key)
+        if index is None:
+            index = build_broker_symbol_index(brokers)
+            _broker_index_memo.clear()
+            _broker_index_memo[key] = index
+        return index
+    index = {}
+    for name, symbols in brokers.items():
+        bit = BROKER_BITS[name]
+        for sym in symbols or ():
+            if sym:
+                index[sym] = index.get(sym, 0) | bit
+    return index
+
+
+def broker_mask(index, *symbols):
+    """symbols (表示用・Symbol_YF など) のいずれかを取り扱う社のビットマスク。"""
+    mask = 0
+    for sym in symbols:
+        if not sym:
+            continue
+        for form in symbol_forms(sym):
+            mask |= index.get(form, 0)
+    return mask
+
+
+def with_broker_availability(df, symbol_cols=("Symbol", "Symbol_YF")):
+    """df に broker_mask と is_available_<name> 列を追加して返す。
+
+    symbol_cols の各表記ゆれ候補を索引と 1 回の join で突き合わせるため、
+    銘柄ごとのループを持たない。 行の順序は df のまま。
+    """
+    index = build_broker_symbol_index()
+    index_df = pl.DataFrame(
+        {"__form": list(index.keys()), "__mask": list(index.values())},
+        schema={"__form": pl.String, "__mask": pl.Int64},
+    )
+    base = df.with_row_index("__row")
+    forms = []
+    for col in symbol_cols:
+        if col not in df.columns:
+            continue
+        s = pl.col(col).cast(pl.String)
+        for expr in (
+            s,
+            s.str.replace_all("-", "", literal=True),
+            s.str.replace_all("-", ".", literal=True),
+            s.str.replace_all(".", "-", literal=True),
+        ):
+            forms.append(base.select("__row", expr.alias("__form")))
+    masks = (
+        pl.concat(forms)
+        .join(index_df, on="__form", how="inner")
+        .group_by("__row")
+        .agg(pl.col("__mask").bitwise_or().alias("broker_mask"))
+    ) if forms else pl.DataFrame(schema={"__row": pl.UInt32, "broker_mask": pl.Int64})
+    return (
+        base.join(masks, on="__row", how="left")
+        .sort("__row")
+        .drop("__row")
+        .with_columns(pl.col("broker_mask").fill_null(0))
+        .with_columns([
+            ((pl.col("broker_mask") & bit) != 0).alias(f"is_available_{name}")
+            for name, bit in BROKER_BITS.items()
+        ])
+    )
+
+
+def get_monex_available_symbols():
+    """
+    マネックス証券の米国株取扱銘柄リストを取得し、{シンボル: 日本語名} の辞書を返します。
+    """
+    return get_broker_symbols("monex")
+
+def get_rakuten_available_symbols():
+    """
+    楽天証券の米国株取扱銘柄リストを取得し、シンボルのセットを返します。
+    """
+    return get_broker_symbols("rakuten")
+
+def get_sbi_available_symbols():
+    """
+    SBI証券の米国株取扱銘柄リストをHTMLスクレイピングで取得し、シンボルのセットを返します。
+    """
+    return get_broker_symbols("sbi")
+
+def get_mufg_available_symbols():
+    """
+    三菱UFJ eスマート証券（auカブコム証券）の米国株取扱銘柄リストを取得し、シンボルのセットを返します。
+    """
+    return get_broker_symbols("mufg")
+
+def get_matsui_available_symbols():
+    """
+    松井証券の米国株取扱銘柄リストを取得し、シンボルのセットを返します。
+    """
+    return get_broker_symbols("matsui")
+
+def get_dmm_available_symbols():
+    """
+    DMM株の米国株取扱銘柄リストを取得し、シンボルのセットを返します。
+    """
+    return get_broker_symbols("dmm")
+
+def get_paypay_available_symbols():
+    """
+    PayPay証券の米国株取扱銘柄リストを取得し、シンボルのセットを返します。
+    """
+    return get_broker_symbols("paypay")
+
+def get_moomoo_available_symbols():
+    """
+    moomoo証券の米国株取扱銘柄リストをローカルCSVから取得し、シンボルのセットを返します。
+    """
+    return get_broker_symbols("moomoo")
+
+def get_iwaicosmo_available_symbols():
+    """
+    岩井コスモ証券の米国株取扱銘柄リストをHTMLスクレイピングで取得し、シンボルのセットを返します。
+    """
+    return get_broker_symbols("iwaicosmo")
+
 def get_manual_ja_name_map():
     return {
         # === S&P 500 REITs (マネックスでカバーされない大型 REIT) ===
@@ -363,383 +845,198 @@ def get_combined_ja_name_map():
     manual_mapping = get_manual_ja_name_map()
     return {**monex_mapping, **csv_mapping, **manual_mapping}
 
-def get_rakuten_available_symbols():
-    """
-    楽天証券の米国株取扱銘柄リストを取得し、シンボルのセットを返します。
-    """
-    url = "https://www.trkd-asia.com/rakutensec/exportcsvus?all=on&vall=on&forwarding=na&target=0&theme=na&returns=na&head_office=na&name=&code=&sector=na&pageNo=&c=us&p=result&r1=on"
-    csv_path = os.path.join(BROKER_LISTS_DIR, "Rakuten_US_LIST.csv")
-    
-    if os.path.exists(csv_path):
-        try:
-            # 楽天は UTF-8 with BOM (utf-8-sig)
-            with open(csv_path, "rb") as f:
-                content = f.read().decode("utf-8-sig", errors="replace")
-        except Exception:
-            content = None
-    else:
-        content = None
-
-    if not content:
-        if curl_requests:
-            try:
-                resp = curl_requests.get(url, impersonate="chrome110")
-                resp.raise_for_status()
-                content = resp.content.decode("utf-8-sig", errors="replace")
-                with open(csv_path, "wb") as f:
-                    f.write(resp.content)
-            except Exception as e:
-                print(f"Error fetching Rakuten list: {e}")
-                return set()
-        else:
-            return set()
-
-    symbols = set()
-    lines = content.splitlines()
-    for line in lines:
-        parts = line.split(",")
-        if len(parts) >= 6:
-            symbol = parts[0].strip()
-            available = parts[5].strip()
-            # 「○」または「現地コード」以外の行を処理
-            if symbol and symbol != "現地コード" and "○" in available:
-                symbols.add(symbol)
-    
-    return symbols
+# Yahoo の取引所コード → 表示用取引所名
+_EXCHANGE_NAME_MAP = {'NMS':'NASDAQ', 'NGM':'NASDAQ', 'NCM':'NASDAQ', 'NYQ':'NYSE', 'ASE':'AMEX', 'PCX':'NYSE', 'PNK':'OTC'}
 
-def get_sbi_available_symbols():
-    """
-    SBI証券の米国株取扱銘柄リストをHTMLスクレイピングで取得し、シンボルのセットを返します。
-    """
-    url = "https://search.sbisec.co.jp/v2/popwin/info/stock/pop6040_usequity_list.html"
-    cache_path = os.path.join(BROKER_LISTS_DIR, "SBI_US_LIST.html")
-    
-    # BeautifulSoup をインポート
+def get_market_info(symbol):
     try:
-        from bs4 import BeautifulSoup
-    except ImportError:
-        print("BeautifulSoup4 is not installed. Skipping SBI list fetch.")
-        return set()
-
-    if os.path.exists(cache_path):
-        try:
-            with open(cache_path, "r", encoding="cp932", errors="replace") as f:
-                html = f.read()
-        except Exception:
-            html = None
-    else:
-        html = None
-
-    if not html:
-        if curl_requests:
-            try:
-                resp = curl_requests.get(url, impersonate="chrome110")
-                resp.raise_for_status()
-                # SBIは Shift-JIS (cp932)
-                resp.encoding = "cp932"
-                html = resp.text
-                with open(cache_path, "w", encoding="cp932", errors="replace") as f:
-                    f.write(html)
-            except Exception as e:
-                print(f"Error fetching SBI list: {e}")
-                return set()
-        else:
-            return set()
-
-    symbols = set()
-    soup = BeautifulSoup(html, "html.parser")
-    
-    # 構造: <tr><th class="vaM alC">SYMBOL</th>...</tr>
-    for th in soup.find_all("th", class_=lambda x: x and "vaM" in x and "alC" in x):
-        symbol = th.get_text(strip=True)
-        if symbol and symbol.isupper() and len(symbol) <= 5:
-            symbols.add(symbol)
+        t = utils.get_ticker(symbol)
+        info = t.info
+        ex = info.get('exchange', 'Unknown')
+        
+        # 株価変化率の取得
+        prev_close = info.get('previousClose')
+        curr_price = info.get('currentPrice') or info.get('regularMarketPrice')
+        daily_change = None
+        if prev_close and curr_price:
+            daily_change = (curr_price - prev_close) / prev_close
             
-    return symbols
-
-def get_mufg_available_symbols():
-    """
-    三菱UFJ eスマート証券（auカブコム証券）の米国株取扱銘柄リストを取得し、シンボルのセットを返します。
-    """
-    url = "https://kabu.com/process/beikabu.js"
-    csv_path = os.path.join(BROKER_LISTS_DIR, "Mufg_US_LIST.js")
-    
-    if os.path.exists(csv_path):
-        try:
-            with open(csv_path, "r", encoding="utf-8", errors="replace") as f:
-                content = f.read()
-        except Exception:
-            content = None
-    else:
-        content = None
-
-    if not content:
-        if curl_requests:
-            try:
-                resp = curl_requests.get(url, impersonate="chrome110")
-                resp.raise_for_status()
-                # Content is usually UTF-8
-                content = resp.content.decode("utf-8", errors="replace")
-                with open(csv_path, "w", encoding="utf-8", errors="replace") as f:
-                    f.write(content)
-            except Exception as e:
-                print(f"Error fetching MUFG list: {e}")
-                return set()
-        else:
-            return set()
-
-    import re
-    symbols = set()
-    # <td>A</td> のような形式を抽出
-    # beikabu.js の構造: <td>SYMBOL</td>
-    matches = re.findall(r"<td>([A-Z\.]+?)</td>", content)
-    for symbol in matches:
-        if symbol and any(c.isalnum() for c in symbol):
-            symbols.add(symbol)
-    
-    return symbols
-
-def get_matsui_available_symbols():
-    """
-    松井証券の米国株取扱銘柄リストを取得し、シンボルのセットを返します。
-    """
-    url = "https://www.matsui.co.jp/us-stock/domestic/list/symbollist/symbollist.csv"
-    csv_path = os.path.join(BROKER_LISTS_DIR, "Matsui_US_LIST.csv")
-    
-    if os.path.exists(csv_path):
-        try:
-            with open(csv_path, "rb") as f:
-                content = f.read().decode("cp932", errors="replace")
-        except Exception:
-            content = None
-    else:
-        content = None
-
-    if not content:
-        if curl_requests:
-            try:
-                resp = curl_requests.get(url, impersonate="chrome110")
-                resp.raise_for_status()
-                content = resp.content.decode("cp932", errors="replace")
-                with open(csv_path, "wb") as f:
-                    f.write(resp.content)
-            except Exception as e:
-                print(f"Error fetching Matsui list: {e}")
-                return set()
-        else:
-            return set()
-
-    symbols = set()
-    lines = content.splitlines()
-    for line in lines:
-        parts = line.split(",")
-        if len(parts) >= 1:
-            symbol = parts[0].strip()
-            # ヘッダー「コード」を除外
-            if symbol and symbol != "コード" and any(c.isalnum() for c in symbol):
-                symbols.add(symbol)
-    
-    return symbols
+        return symbol, _EXCHANGE_NAME_MAP.get(ex, ex), daily_change
+    except Exception as e:
+        # print(f"Error fetching info for {symbol}: {e}") # Debug output
+        return symbol, "NYSE", None
 
-def get_dmm_available_symbols():
-    """
-    DMM株の米国株取扱銘柄リストを取得し、シンボルのセットを返します。
-    """
-    url = "https://kabu.dmm.com/_data/us-stock.csv"
-    csv_path = os.path.join(BROKER_LISTS_DIR, "Dmm_US_LIST.csv")
-    
-    if os.path.exists(csv_path):
+# ==========================================
+#  市場情報の一括取得 (前日比 / 取引所)
+# ==========================================
+# 1,500 銘柄それぞれの info を取りに行くと数千リクエストになるため、
+#   - 前日比: yf.download をチャンク単位で一括取得した日足終値から計算
+#   - 取引所: 銘柄 → 取引所のキャッシュ (data/exchange_cache.json) を引き、
+#             未登録・期限切れの銘柄だけ v7 quote API でまとめて取得
+# とし、 リクエスト数を数件〜十数件に抑える。
+EXCHANGE_CACHE_PATH = os.path.join(BASE_DIR, "data", "exchange_cache.json")
+# 上場市場の変更 (例: FI の NYSE → NASDAQ) を拾うため、 一定期間で再取得する
+EXCHANGE_CACHE_MAX_AGE_DAYS = 30
+QUOTE_CHUNK_SIZE = int(os.getenv("QUOTE_CHUNK_SIZE", 200))
+# v7 quote API は 1 リクエストあたりのシンボル数を控えめにする
+EXCHANGE_QUOTE_CHUNK_SIZE = 100
+
+
+def _chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _load_exchange_cache():
+    if os.path.exists(EXCHANGE_CACHE_PATH):
         try:
-            with open(csv_path, "r", encoding="utf-8", errors="replace") as f:
-                content = f.read()
+            with open(EXCHANGE_CACHE_PATH, "r", encoding="utf-8") as f:
+                return json.load(f)
         except Exception:
-            content = None
-    else:
-        content = None
+            pass
+    return {}
 
-    if not content:
-        if curl_requests:
-            try:
-                resp = curl_requests.get(url, impersonate="chrome110")
-                resp.raise_for_status()
-                content = resp.text
-                with open(csv_path, "w", encoding="utf-8", errors="replace") as f:
-                    f.write(content)
-            except Exception as e:
-                print(f"Error fetching DMM list: {e}")
-                return set()
-        else:
-            return set()
 
-    symbols = set()
-    lines = content.splitlines()
-    for line in lines:
-        parts = line.split(",")
-        if len(parts) >= 1:
-            symbol = parts[0].strip()
-            # ヘッダー「code」を除外
-            if symbol and symbol != "code" and any(c.isalnum() for c in symbol):
-                symbols.add(symbol)
-    
-    return symbols
-
-def get_paypay_available_symbols():
-    """
-    PayPay証券の米国株取扱銘柄リストを取得し、シンボルのセットを返します。
-    """
-    urls = [
-        "https://www.paypay-sec.co.jp/us-stock/list/data-us_stock.json",
-        "https://www.paypay-sec.co.jp/us-stock/list/data-us_etf.json"
-    ]
-    cache_path = os.path.join(BROKER_LISTS_DIR, "Paypay_US_LIST.txt")
-    
-    if os.path.exists(cache_path):
-        try:
-            with open(cache_path, "r", encoding="utf-8") as f:
-                return set(line.strip() for line in f if line.strip())
-        except Exception:
-            pass
+def _save_exchange_cache(cache):
+    os.makedirs(os.path.dirname(EXCHANGE_CACHE_PATH), exist_ok=True)
+    tmp = EXCHANGE_CACHE_PATH + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(cache, f, ensure_ascii=False, sort_keys=True)
+    os.replace(tmp, EXCHANGE_CACHE_PATH)
 
-    if not curl_requests:
-        return set()
 
-    symbols = set()
-    
-    for url in urls:
+def _fetch_exchanges_bulk(symbols):
+    """v7 quote API で複数銘柄の取引所コードをまとめて取得する ({symbol: 取引所名})。"""
+    from yfinance.data import YfData
+    result = {}
+    data = YfData(session=utils.get_session())
+    for chunk in _chunks(symbols, EXCHANGE_QUOTE_CHUNK_SIZE):
         try:
-            resp = curl_requests.get(url, impersonate="chrome110", timeout=15)
-            resp.raise_for_status()
-            data = resp.json()
-            for item in data:
-                symbol = item.get("codenumber", "").strip()
-                if symbol and any(c.isalnum() for c in symbol):
-                    symbols.add(symbol)
+            resp = data.get_raw_json(
+                "https://query1.finance.yahoo.com/v7/finance/quote",
+                params={"symbols": ",".join(chunk), "fields": "exchange", "formatted": "false"},
+            )
+            for q in (resp.get("quoteResponse") or {}).get("result") or []:
+                sym, ex = q.get("symbol"), q.get("exchange")
+                if sym and ex:
+                    result[sym] = _EXCHANGE_NAME_MAP.get(ex, ex)
         except Exception as e:
-            print(f"Error fetching PayPay list from {url}: {e}")
-
-    if symbols:
+            print(f"取引所情報の一括取得に失敗 ({len(chunk)} 銘柄): {e}")
+    return result
+
+
+def get_exchanges(symbols):
+    """銘柄 → 取引所名の辞書を返す。 キャッシュ済みで期限内の銘柄はリクエストしない。"""
+    cache = _load_exchange_cache()
+    today = datetime.date.today()
+    cutoff = (today - datetime.timedelta(days=EXCHANGE_CACHE_MAX_AGE_DAYS)).isoformat()
+    stale = [s for s in symbols
+             if s not in cache or cache[s].get("updated", "") < cutoff]
+
+    if stale:
+        print(f"取引所情報を取得中: {len(stale)} 銘柄 (キャッシュ済み {len(symbols) - len(stale)} 銘柄)")
+        fetched = _fetch_exchanges_bulk(stale)
+        for s, e in fetched.items():
+            cache[s] = {"exchange": e, "updated": today.isoformat()}
+        _save_exchange_cache(cache)
+
+    result = {s: cache[s]["exchange"] for s in symbols if s in cache}
+    # 一括取得で取れなかった銘柄だけ従来の個別取得にフォールバックする。
+    # get_market_info は失敗時に既定値 "NYSE" を返すため、 ここで得た値は
+    # キャッシュせず次回ランで再取得させる。
+    missing = [s for s in symbols if s not in result]
+    if missing:
+        print(f"  {len(missing)} 銘柄は個別取得にフォールバックします")
+        max_workers = int(os.getenv("MAX_WORKERS", 1))
+        with ThreadPoolExecutor(max_workers=max_workers) as ex:
+            for s, e, _ in tqdm(ex.map(get_market_info, missing), total=len(missing)):
+                result[s] = e
+    return result
+
+
+def get_daily_changes(symbols):
+    """直近 2 営業日の終値から前日比を一括計算する ({symbol: 変化率})。
+
+    yf.download を QUOTE_CHUNK_SIZE 銘柄ずつ呼ぶ。 取得できなかった銘柄は含めない。"""
+    changes = {}
+    session = utils.get_session()
+    for chunk in _chunks(symbols, QUOTE_CHUNK_SIZE):
         try:
-            with open(cache_path, "w", encoding="utf-8") as f:
-                for s in sorted(list(symbols)):
-                    f.write(f"{s}\n")
-        except Exception:
-            pass
-
-    return symbols
-
-def get_moomoo_available_symbols():
-    """
-    moomoo証券の米国株取扱銘柄リストをローカルCSVから取得し、シンボルのセットを返します。
-    """
-    csv_path = os.path.join(BROKER_LISTS_DIR, "moomoo_us_stocks.csv")
-    symbols = set()
-    
-    if not os.path.exists(csv_path):
-        print(f"Warning: moomoo stock list not found at {csv_path}")
-        return symbols
-
+            data = utils.yf.download(
+                chunk, period="5d", interval="1d", auto_adjust=False,
+                progress=False, session=session,
+            )
+        except Exception as e:
+            print(f"前日比の一括取得に失敗 ({len(chunk)} 銘柄): {e}")
+            continue
+        if data is None or data.empty or 'Close' not in data.columns.get_level_values(0):
+            continue
+        closes = data['Close']
+        if isinstance(closes, pd.Series):
+            closes = closes.to_frame(chunk[0])
+        for s in closes.columns:
+            c = closes[s].dropna()
+            if len(c) >= 2 and c.iloc[-2]:
+                changes[s] = float((c.iloc[-1] - c.iloc[-2]) / c.iloc[-2])
+    return changes
+
+# Wikipedia の構成銘柄表のスナップショット。 前回取得時の ETag / Last-Modified を
+# 保存しておき、 条件付きリクエストで 304 (変更なし) が返れば HTML を取得・パース
+# せずにスナップショットの Parquet を使う。
+WIKI_SNAPSHOT_DIR = os.path.join(BASE_DIR, "data", "wiki_constituents")
+# 抽出・整形処理を変えたときに上げる (古いスナップショットを使わない)
+WIKI_SNAPSHOT_VERSION = 1
+
+
+def _wiki_snapshot_paths(index_label):
+    slug = index_label.lower().replace("&", "").replace(" ", "")  # "S&P 500" -> "sp500"
+    base = os.path.join(WIKI_SNAPSHOT_DIR, slug)
+    return base + ".parquet", base + ".meta.json"
+
+
+def _load_wiki_snapshot(index_label):
+    """(スナップショットの DataFrame または None, メタ情報) を返す。"""
+    parquet_path, meta_path = _wiki_snapshot_paths(index_label)
     try:
-        df = pl.read_csv(csv_path)
-        if "code" in df.columns:
-            for code in df["code"]:
-                if code and code.startswith("US."):
-                    symbol = code[3:]  # "US.AAPL" -> "AAPL"
-                    if symbol:
-                        symbols.add(symbol)
-    except Exception as e:
-        print(f"Error reading moomoo list with Polars: {e}, falling back to csv module")
-        try:
-            import csv as _csv
-            with open(csv_path, newline="", encoding="utf-8") as f:
-                reader = _csv.reader(f)
-                header = next(reader, [])
-                if "code" in header:
-                    code_idx = header.index("code")
-                    for row in reader:
-                        if len(row) > code_idx:
-                            code = row[code_idx].strip()
-                            if code.startswith("US."):
-                                symbol = code[3:]
-                                if symbol:
-                                    symbols.add(symbol)
-        except Exception as e2:
-            print(f"Error reading moomoo list with csv module: {e2}")
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("version") == WIKI_SNAPSHOT_VERSION and os.path.exists(parquet_path):
+            return pl.read_parquet(parquet_path), meta
+    except Exception:
+        pass
+    return None, {}
 
-    return symbols
 
-def get_iwaicosmo_available_symbols():
-    """
-    岩井コスモ証券の米国株取扱銘柄リストをHTMLスクレイピングで取得し、シンボルのセットを返します。
-    """
-    url = "https://www.iwaicosmo.co.jp/investment/list/"
-    cache_path = os.path.join(BROKER_LISTS_DIR, "IwaiCosmo_US_LIST.html")
-    
-    # BeautifulSoup をインポート
+def _save_wiki_snapshot(index_label, df, meta):
+    parquet_path, meta_path = _wiki_snapshot_paths(index_label)
     try:
-        from bs4 import BeautifulSoup
-    except ImportError:
-        print("BeautifulSoup4 is not installed. Skipping IwaiCosmo list fetch.")
-        return set()
+        os.makedirs(WIKI_SNAPSHOT_DIR, exist_ok=True)
+        df.write_parquet(parquet_path + ".tmp")
+        os.replace(parquet_path + ".tmp", parquet_path)
+        with open(meta_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({**meta, "version": WIKI_SNAPSHOT_VERSION}, f, ensure_ascii=False)
+        os.replace(meta_path + ".tmp", meta_path)
+    except Exception as e:
+        print(f"  → {index_label}: スナップショットの保存に失敗 ({e})")
 
-    if os.path.exists(cache_path):
-        try:
-            with open(cache_path, "r", encoding="utf-8", errors="replace") as f:
-                html = f.read()
-        except Exception:
-            html = None
-    else:
-        html = None
 
-    if not html:
-        if curl_requests:
-            try:
-                # TLSフィンガープリントをChromeに偽装して取得
-                resp = curl_requests.get(url, impersonate="chrome110")
-                resp.raise_for_status()
-                html = resp.text
-                with open(cache_path, "w", encoding="utf-8", errors="replace") as f:
-                    f.write(html)
-            except Exception as e:
-                print(f"Error fetching IwaiCosmo list: {e}")
-                return set()
-        else:
-            return set()
+def _extract_constituents_table(html):
+    """lxml で id="constituents" の table だけを取り出し、 pandas DataFrame にする。
 
-    symbols = set()
-    soup = BeautifulSoup(html, "html.parser")
-    
-    # id="myTable" の tbody 内の 各 tr の 3番目の td がシンボル
-    table = soup.find("table", id="myTable")
-    if table:
-        tbody = table.find("tbody")
-        if tbody:
-            for tr in tbody.find_all("tr"):
-                tds = tr.find_all("td")
-                if len(tds) >= 3:
-                    symbol = tds[2].get_text(strip=True)
-                    if symbol and any(c.isalnum() for c in symbol):
-                        symbols.add(symbol)
-            
-    return symbols
-
-def get_market_info(symbol):
+    ページ全体を pd.read_html に渡すと全テーブルをパースするため、 対象の
+    table 要素だけを切り出してから渡す。 見つからなければ None。
+    """
     try:
-        t = utils.get_ticker(symbol)
-        info = t.info
-        ex = info.get('exchange', 'Unknown')
-        m_map = {'NMS':'NASDAQ', 'NGM':'NASDAQ', 'NCM':'NASDAQ', 'NYQ':'NYSE', 'ASE':'AMEX', 'PCX':'NYSE', 'PNK':'OTC'}
-        
-        # 株価変化率の取得
-        prev_close = info.get('previousClose')
-        curr_price = info.get('currentPrice') or info.get('regularMarketPrice')
-        daily_change = None
-        if prev_close and curr_price:
-            daily_change = (curr_price - prev_close) / prev_close
-            
-        return symbol, m_map.get(ex, ex), daily_change
+        import lxml.html
+        nodes = lxml.html.fromstring(html).xpath('//table[@id="constituents"]')
+        if nodes:
+            tables = pd.read_html(StringIO(lxml.html.tostring(nodes[0], encoding="unicode")))
+            if tables:
+                return tables[0]
     except Exception as e:
-        # print(f"Error fetching info for {symbol}: {e}") # Debug output
-        return symbol, "NYSE", None
+        print(f"  → id=constituents の抽出に失敗 ({e})")
+    return None
+
 
 def _fetch_index_constituents(index_label: str, url: str):
     """Wikipedia から指定された指数 (S&P 500/400/600) の銘柄リストを取得し、
@@ -764,14 +1061,29 @@ def _fetch_index_constituents(index_label: str, url: str):
         ),
         "Accept": "text/html,application/xhtml+xml",
     }
+    # 前回のスナップショットがあれば条件付きリクエストにする
+    snapshot, snapshot_meta = _load_wiki_snapshot(index_label)
+    if snapshot is not None:
+        if snapshot_meta.get("etag"):
+            wiki_headers["If-None-Match"] = snapshot_meta["etag"]
+        if snapshot_meta.get("last_modified"):
+            wiki_headers["If-Modified-Since"] = snapshot_meta["last_modified"]
     try:
         # 一時的な 429/5xx に備えて指数バックオフでリトライする (合計 3 回)。
         html = None
+        page_meta = {}
         for attempt in range(3):
             try:
                 resp = requests.get(url, headers=wiki_headers, timeout=30)
+                if resp.status_code == 304 and snapshot is not None:
+                    print(f"  ✓ {index_label}: 変更なし (304)、スナップショットを使用 ({len(snapshot)} 銘柄)")
+                    return snapshot
                 if resp.status_code == 200:
                     html = resp.text
+                    page_meta = {
+                        "etag": resp.headers.get("ETag"),
+                        "last_modified": resp.headers.get("Last-Modified"),
+                    }
                     break
                 print(f"  → HTTP {resp.status_code} (attempt {attempt + 1}/3)")
                 if resp.status_code in (403, 451):
@@ -783,19 +1095,19 @@ def _fetch_index_constituents(index_label: str, url: str):
                 import time as _time
                 _time.sleep(2 ** attempt)
         if html is None:
+            if snapshot is not None:
+                print(f"  ✗ {index_label}: Wikipedia へのリクエストが全試行失敗、前回のスナップショットを使用 ({len(snapshot)} 銘柄)")
+                return snapshot
             print(f"  ✗ {index_label}: Wikipedia へのリクエストが全試行失敗")
             return pl.DataFrame()
 
         # Wikipedia の銘柄リストページは通常 id="constituents" の table を持つ。
         # それを優先して取得し、見つからない場合は最初のテーブルにフォールバック。
-        wiki_df = None
-        try:
-            tables = pd.read_html(StringIO(html), attrs={"id": "constituents"})
-            if tables:
-                wiki_df = tables[0]
-                print(f"  → constituents テーブルを検出 ({len(wiki_df)} 行)")
-        except Exception as e_inner:
-            print(f"  → id=constituents で取得不可 ({e_inner})、最初のテーブルにフォールバック")
+        wiki_df = _extract_constituents_table(html)
+        if wiki_df is not None:
+            print(f"  → constituents テーブルを検出 ({len(wiki_df)} 行)")
+        else:
+            print("  → id=constituents で取得不可、最初のテーブルにフォールバック")
 
         if wiki_df is None:
             tables = pd.read_html(StringIO(html))
@@ -839,11 +1151,87 @@ def _fetch_index_constituents(index_label: str, url: str):
             pl.lit(index_label).alias('Index'),
         ])
         print(f"  ✓ {index_label}: {len(df)} 銘柄を取得")
+        _save_wiki_snapshot(index_label, df, page_meta)
         return df
     except Exception as e:
         print(f"  ✗ Failed to fetch {index_label} list: {e}")
         return pl.DataFrame()
 
+def _lookup_frame(mapping, value_name, dtype):
+    """{Symbol_YF: 値} の辞書を join 用の 2 列 DataFrame にする。"""
+    return pl.DataFrame(
+        {"Symbol_YF": list(mapping.keys()), value_name: list(mapping.values())},
+        schema={"Symbol_YF": pl.Utf8, value_name: dtype},
+    )
+
+
+def _with_ja_names(df, ja_name_combined_mapping, alias='Security_JA'):
+    """日本語名の列 (alias) を付与して返す。
+
+    Yahoo Finance 用シンボル (BRK-B) を表示用 (BRK.B) に直した表記で引き、
+    見つからない (または空文字の) 場合は Symbol_YF そのままで引いた値を
+    coalesce する。 銘柄ごとの Python 呼び出しを持たない。
+    """
+    names = pl.DataFrame(
+        {"__key": list(ja_name_combined_mapping.keys()), "__ja": list(ja_name_combined_mapping.values())},
+        schema={"__key": pl.Utf8, "__ja": pl.Utf8},
+    )
+    return (
+        df.with_columns(pl.col('Symbol_YF').str.replace_all("-", ".", literal=True).alias('__display'))
+        .join(names.rename({"__key": "__display", "__ja": "__ja_display"}),
+              on='__display', how='left', maintain_order='left')
+        .join(names.rename({"__key": "Symbol_YF", "__ja": "__ja_yf"}),
+              on='Symbol_YF', how='left', maintain_order='left')
+        .with_columns(
+            pl.coalesce(
+                pl.when(pl.col('__ja_display') != "").then(pl.col('__ja_display')),
+                pl.col('__ja_yf'),
+            ).alias(alias)
+        )
+        .drop('__display', '__ja_display', '__ja_yf')
+    )
+
+
+def _warn_untranslated(df):
+    """Security_JA が空の銘柄を警告ログに出す（CI 出力で網羅性を確認できるようにする）。"""
+    untranslated = df.filter(pl.col('Security_JA').is_null() | (pl.col('Security_JA') == ""))
+    if untranslated.is_empty():
+        return
+    # 英語名と Index も合わせて出して CSV 追加作業を楽にする
+    idx_map = dict(zip(df['Symbol_YF'].to_list(), df['Index'].to_list() if 'Index' in df.columns else [''] * len(df)))
+    sec_map = dict(zip(df['Symbol_YF'].to_list(), df['Security'].to_list() if 'Security' in df.columns else [''] * len(df)))
+    print(f"\n[WARN] {len(untranslated)} 銘柄に Security_JA が設定されていません。")
+    print("  これらは code/data/ja_translations.csv に追記してください:")
+    for s in sorted(untranslated['Symbol_YF'].to_list()):
+        print(f"    {s},{s},{sec_map.get(s, '')},,{idx_map.get(s, '')},todo")
+
+
+def _with_market_values(df):
+    """Exchange, Daily_Change を付与した DataFrame を返す。
+
+    取引所は get_exchanges (キャッシュ済みで期限内の銘柄はリクエストしない)、
+    前日比は get_daily_changes で毎回一括取得する。
+    """
+    symbols = df['Symbol_YF'].to_list()
+
+    print(f"{len(symbols)} 銘柄の市場情報を取得中... (一括取得)")
+    ex_map = get_exchanges(symbols)
+    change_map = get_daily_changes(symbols)
+
+    return (
+        df.drop([c for c in ('Exchange', 'Daily_Change') if c in df.columns])
+        .join(_lookup_frame(ex_map, 'Exchange', pl.Utf8), on='Symbol_YF', how='left', maintain_order='left')
+        .join(_lookup_frame(change_map, 'Daily_Change', pl.Float64), on='Symbol_YF', how='left', maintain_order='left')
+        .with_columns(pl.col('Exchange').fill_null("NYSE"))
+    )
+
+
+def _fetch_market_columns(df, ja_name_combined_mapping):
+    """Exchange, Daily_Change, Security_JA を付与した DataFrame を返す (警告ログなし)。"""
+    enriched = _with_market_values(df.drop([c for c in _ENRICHED_COLUMNS if c in df.columns]))
+    return _with_ja_names(enriched, ja_name_combined_mapping)
+
+
 def _enrich_with_market_info(df):
     """与えられた銘柄リストに Yahoo Finance の市場情報を付与する。
 
@@ -854,49 +1242,9 @@ def _enrich_with_market_info(df):
         return df
 
     # マネックスの日本語名マッピングを取得 (手動補完分を含む)
-    ja_name_combined_mapping = get_combined_ja_name_map()
-
-    symbols = df['Symbol_YF'].to_list()
-    ex_map = {}
-    change_map = {}
-    ja_name_map = {}
-
-    print(f"{len(symbols)} 銘柄の市場情報を取得中... (並列処理)")
-    # Rate limit回避のため並列数を抑える
-    # GitHub Actions では 1、ローカルでも 1 をデフォルトにする
-    default_max_workers = 1 if os.getenv("GITHUB_ACTIONS") == "true" else 1
-    current_max_workers = int(os.getenv("MAX_WORKERS", default_max_workers))
-
-    with ThreadPoolExecutor(max_workers=current_max_workers) as ex:
-        f_map = {ex.submit(get_market_info, s): s for s in symbols}
-        for f in tqdm(as_completed(f_map), total=len(symbols)):
-            s, e, c = f.result()
-            ex_map[s] = e
-            change_map[s] = c
-
-            # 日本語名の紐付け (Yahoo Finance 用シンボル A -> A, BRK-B -> BRK.B など考慮)
-            display_symbol = s.replace("-", ".")
-            ja_name = ja_name_combined_mapping.get(display_symbol)
-            if not ja_name:
-                ja_name = ja_name_combined_mapping.get(s)
-            ja_name_map[s] = ja_name
-
-    # 未翻訳銘柄の警告ログ（CI 出力で網羅性を確認できるようにする）
-    untranslated = [s for s, ja in ja_name_map.items() if not ja]
-    if untranslated:
-        # 英語名と Index も合わせて出して CSV 追加作業を楽にする
-        idx_map = dict(zip(df['Symbol_YF'].to_list(), df['Index'].to_list() if 'Index' in df.columns else [''] * len(df)))
-        sec_map = dict(zip(df['Symbol_YF'].to_list(), df['Security'].to_list() if 'Security' in df.columns else [''] * len(df)))
-        print(f"\n[WARN] {len(untranslated)} 銘柄に Security_JA が設定されていません。")
-        print("  これらは code/data/ja_translations.csv に追記してください:")
-        for s in sorted(untranslated):
-            print(f"    {s},{s},{sec_map.get(s, '')},,{idx_map.get(s, '')},todo")
-
-    return df.with_columns([
-        pl.col('Symbol_YF').map_elements(lambda s: ex_map.get(s, "NYSE"), return_dtype=pl.Utf8).alias('Exchange'),
-        pl.col('Symbol_YF').map_elements(lambda s: change_map.get(s), return_dtype=pl.Float64).alias('Daily_Change'),
-        pl.col('Symbol_YF').map_elements(lambda s: ja_name_map.get(s), return_dtype=pl.Utf8).alias('Security_JA'),
-    ])
+    enriched = _fetch_market_columns(df, get_combined_ja_name_map())
+    _warn_untranslated(enriched)
+    return enriched
 
 
 # Wikipedia URL 定義 (S&P 500 / 400 / 600)
@@ -918,6 +1266,201 @@ TICKER_OVERRIDES = {
 }
 
 
+# ==========================================
+#  ユニバースのスナップショットと差分
+# ==========================================
+# 指数の入れ替えは月に数回程度なので、 前回の付与済みユニバースを保存しておき、
+# 今回の構成銘柄との差分 (追加・除外・ティッカー変更) を記録する。
+# 付与する列のうち前回から引き継ぐのは Security_JA だけで、 Exchange と
+# Daily_Change は設計上、 毎回ユニバース全体について解決する (取引所は
+# キャッシュ経由なので、 実際のリクエストは未登録・期限切れの銘柄だけ)。
+# スナップショットの主な役割は変更履歴と日本語名の引き継ぎである。
+#   - 継続銘柄: Security_JA を前回から引き継ぐ
+#     (未翻訳の銘柄と、 日本語名ソースが更新された場合は名前だけ引き直す)
+#   - Exchange は前回の値を引き継がず、 取引所キャッシュ (取得に成功した値だけを
+#     EXCHANGE_CACHE_MAX_AGE_DAYS の間保持) から引く。 get_market_info の
+#     既定値 "NYSE" がスナップショット経由で残り続けないようにするため
+#   - Daily_Change は日次の値なので、 毎回全銘柄分を一括取得
+#   - 差分は data/universe_changelog.json に追記し、 後段の処理から参照できる
+UNIVERSE_SNAPSHOT_PATH = os.path.join(BASE_DIR, "data", "universe_snapshot.parquet")
+UNIVERSE_SNAPSHOT_META_PATH = os.path.join(BASE_DIR, "data", "universe_snapshot.meta.json")
+UNIVERSE_CHANGELOG_PATH = os.path.join(BASE_DIR, "data", "universe_changelog.json")
+UNIVERSE_CHANGELOG_MAX_ENTRIES = 200
+_ENRICHED_COLUMNS = ["Exchange", "Daily_Change", "Security_JA"]
+
+
+def _ja_sources_fingerprint():
+    """日本語名ソース (マネックス CSV・ja_translations.csv・手動 dict) の識別子。"""
+    parts = []
+    for path in (
+        os.path.join(BROKER_LISTS_DIR, BROKER_SPECS["monex"]["file"]),
+        os.path.join(BASE_DIR, "data", "ja_translations.csv"),
+    ):
+        try:
+            st = os.stat(path)
+            parts.append(f"{st.st_mtime_ns}:{st.st_size}")
+        except OSError:
+            parts.append("-")
+    manual = json.dumps(sorted(get_manual_ja_name_map().items()), ensure_ascii=False)
+    parts.append(hashlib.sha1(manual.encode("utf-8")).hexdigest()[:12])
+    return "|".join(parts)
+
+
+def _load_universe_snapshot():
+    """(前回の付与済みユニバース または None, メタ情報) を返す。"""
+    try:
+        with open(UNIVERSE_SNAPSHOT_META_PATH, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        prev = pl.read_parquet(UNIVERSE_SNAPSHOT_PATH)
+        if set(_ENRICHED_COLUMNS + ["Symbol_YF"]).issubset(prev.columns):
+            return prev, meta
+    except Exception:
+        pass
+    return None, {}
+
+
+def _save_universe_snapshot(df, meta):
+    try:
+        df.write_parquet(UNIVERSE_SNAPSHOT_PATH + ".tmp")
+        os.replace(UNIVERSE_SNAPSHOT_PATH + ".tmp", UNIVERSE_SNAPSHOT_PATH)
+        with open(UNIVERSE_SNAPSHOT_META_PATH + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(UNIVERSE_SNAPSHOT_META_PATH + ".tmp", UNIVERSE_SNAPSHOT_META_PATH)
+    except Exception as e:
+        print(f"ユニバースのスナップショット保存に失敗: {e}")
+
+
+def load_universe_changelog():
+    """構成銘柄の変更履歴 (古い順のリスト) を返す。"""
+    try:
+        with open(UNIVERSE_CHANGELOG_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return []
+
+
+def _append_universe_changelog(entry):
+    log = load_universe_changelog()
+    log.append(entry)
+    log = log[-UNIVERSE_CHANGELOG_MAX_ENTRIES:]
+    try:
+        with open(UNIVERSE_CHANGELOG_PATH + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(log, f, ensure_ascii=False, indent=2)
+        os.replace(UNIVERSE_CHANGELOG_PATH + ".tmp", UNIVERSE_CHANGELOG_PATH)
+    except Exception as e:
+        print(f"ユニバース変更履歴の保存に失敗: {e}")
+
+
+def apply_ticker_overrides(df):
+    """既知のティッカー変更 (TICKER_OVERRIDES) を Symbol / Symbol_YF に上書きする。
+
+    Wikipedia の反映遅延対策。 Exchange は後段の付与処理が Yahoo から再取得するため不要。
+    """
+    if not TICKER_OVERRIDES or df.is_empty():
+        return df
+    return df.with_columns([
+        pl.col('Symbol_YF').replace(TICKER_OVERRIDES),
+        pl.col('Symbol').replace(TICKER_OVERRIDES),
+    ]).unique(subset=['Symbol_YF'], keep='first', maintain_order=True)
+
+
+def diff_universe(prev, curr):
+    """Symbol_YF 単位で前回 (prev) と今回 (curr) の構成銘柄を比較する。
+
+    戻り値: {"added": [...], "removed": [...], "renamed": [{"from", "to"}, ...]}
+    ティッカー変更は TICKER_OVERRIDES の既知の変更、 または同じ Security 名の
+    除外・追加の組で判定する (追加・除外には含めない)。
+    """
+    prev_syms = set(prev['Symbol_YF'].to_list())
+    curr_syms = set(curr['Symbol_YF'].to_list())
+    added = curr_syms - prev_syms
+    removed = prev_syms - curr_syms
+
+    renamed = []
+    for old, new in TICKER_OVERRIDES.items():
+        if old in removed and new in added:
+            renamed.append((old, new))
+            removed.discard(old)
+            added.discard(new)
+    if 'Security' in prev.columns and 'Security' in curr.columns:
+        removed_by_name = {}
+        for sym, name in zip(prev['Symbol_YF'].to_list(), prev['Security'].to_list()):
+            if sym in removed and name:
+                removed_by_name.setdefault(name, []).append(sym)
+        for sym, name in zip(curr['Symbol_YF'].to_list(), curr['Security'].to_list()):
+            olds = removed_by_name.get(name)
+            if sym in added and olds and len(olds) == 1:
+                renamed.append((olds[0], sym))
+                removed.discard(olds[0])
+                added.discard(sym)
+                del removed_by_name[name]
+
+    return {
+        "added": sorted(added),
+        "removed": sorted(removed),
+        "renamed": [{"from": o, "to": n} for o, n in sorted(renamed)],
+    }
+
+
+def _enrich_incremental(df):
+    """前回のスナップショットとの差分だけを取得して市場情報を付与する。"""
+    today = datetime.date.today().isoformat()
+    ja_fingerprint = _ja_sources_fingerprint()
+    prev, meta = _load_universe_snapshot()
+
+    if prev is None:
+        print("ユニバースのスナップショットが無いため全銘柄を取得します")
+        enriched = _enrich_with_market_info(df)
+        changes = None
+    else:
+        changes = diff_universe(prev, df)
+        print(f"ユニバース差分 (前回 {meta.get('date')}): 追加 {len(changes['added'])} / "
+              f"除外 {len(changes['removed'])} / ティッカー変更 {len(changes['renamed'])}")
+        fresh_syms = set(changes["added"]) | {r["to"] for r in changes["renamed"]}
+
+        # 継続銘柄は前回の日本語名を引き継ぐ (Wikipedia 側の列は今回の値)
+        stable = df.filter(~pl.col('Symbol_YF').is_in(list(fresh_syms))).join(
+            prev.select(['Symbol_YF', 'Security_JA']).unique(subset=['Symbol_YF'], keep='first'),
+            on='Symbol_YF', how='left',
+        )
+        stable_syms = stable['Symbol_YF'].to_list()
+        ja_changed = meta.get("ja_sources") != ja_fingerprint
+        missing_ja = stable.filter(pl.col('Security_JA').is_null() | (pl.col('Security_JA') == ""))
+        ja_mapping = None
+        if fresh_syms or ja_changed or not missing_ja.is_empty():
+            ja_mapping = get_combined_ja_name_map()
+        if ja_mapping is not None and (ja_changed or not missing_ja.is_empty()):
+            targets = stable_syms if ja_changed else missing_ja['Symbol_YF'].to_list()
+            stable = _with_ja_names(stable, ja_mapping, alias='__ja').with_columns(
+                pl.when(pl.col('Symbol_YF').is_in(targets))
+                .then(pl.col('__ja'))
+                .otherwise(pl.col('Security_JA'))
+                .alias('Security_JA')
+            ).drop('__ja')
+
+        parts = [stable]
+        fresh = df.filter(pl.col('Symbol_YF').is_in(list(fresh_syms)))
+        if not fresh.is_empty():
+            parts.append(_with_ja_names(fresh, ja_mapping))
+        # 元の並び順に戻してから、 全銘柄の Exchange / Daily_Change をまとめて付与する
+        order = df.select('Symbol_YF').with_row_index('__row')
+        enriched = _with_market_values(
+            pl.concat(parts, how='diagonal_relaxed')
+            .join(order, on='Symbol_YF', how='left')
+            .sort('__row')
+            .drop('__row')
+        ).select(df.columns + _ENRICHED_COLUMNS)
+        _warn_untranslated(enriched)
+
+    _save_universe_snapshot(enriched, {"date": today, "ja_sources": ja_fingerprint})
+    if changes and (changes["added"] or changes["removed"] or changes["renamed"]):
+        _append_universe_changelog({"date": today, **changes})
+        utils.log_event("INFO", "SYSTEM",
+                        f"Universe changed: +{len(changes['added'])} -{len(changes['removed'])} "
+                        f"renamed {len(changes['renamed'])}")
+    return enriched
+
+
 def fetch_sp_indices_companies(indices=None):
     """S&P 500 / 400 / 600 の銘柄リストを Wikipedia から取得して結合し、
     Yahoo Finance の市場情報を付与した DataFrame を返す。
@@ -928,14 +1471,11 @@ def fetch_sp_indices_companies(indices=None):
     if indices is None:
         indices = list(SP_INDEX_URLS.keys())
 
-    frames = []
-    for label in indices:
-        url = SP_INDEX_URLS.get(label)
-        if not url:
-            continue
-        df_part = _fetch_index_constituents(label, url)
-        if not df_part.is_empty():
-            frames.append(df_part)
+    # 3 指数のページは独立しているので並列に取得する (結合順は indices の順)
+    targets = [(label, SP_INDEX_URLS[label]) for label in indices if SP_INDEX_URLS.get(label)]
+    with ThreadPoolExecutor(max_workers=max(1, len(targets))) as executor:
+        parts = list(executor.map(lambda t: _fetch_index_constituents(*t), targets))
+    frames = [df_part for df_part in parts if not df_part.is_empty()]
 
     if not frames:
         return pl.DataFrame()
@@ -943,18 +1483,13 @@ def fetch_sp_indices_companies(indices=None):
     # 縦結合 + 重複除去（先勝ち：S&P 500 に含まれていれば 400/600 側は捨てる）
     combined = pl.concat(frames, how='vertical_relaxed').unique(subset=['Symbol_YF'], keep='first')
 
-    # 既知のティッカー変更を上書き（Wikipedia の反映遅延対策）。
-    # Exchange は後段の _enrich_with_market_info が Yahoo から再取得するため不要。
-    if TICKER_OVERRIDES:
-        combined = combined.with_columns([
-            pl.col('Symbol_YF').map_elements(
-                lambda s: TICKER_OVERRIDES.get(s, s), return_dtype=pl.Utf8),
-            pl.col('Symbol').map_elements(
-                lambda s: TICKER_OVERRIDES.get(s, s), return_dtype=pl.Utf8),
-        ])
-        combined = combined.unique(subset=['Symbol_YF'], keep='first')
+    combined = apply_ticker_overrides(combined)
 
-    return _enrich_with_market_info(combined)
+    # 一部の指数だけを取得した (または取得に失敗した) 場合はスナップショットと
+    # 比較できないので全件取得する
+    if set(indices) != set(SP_INDEX_URLS) or len(frames) != len(targets):
+        return _enrich_with_market_info(combined)
+    return _enrich_incremental(combined)
 
 
 def fetch_sp500_companies_optimized():
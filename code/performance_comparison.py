@@ -1,10 +1,14 @@
 # -*- coding: utf-8 -*-
-import yfinance as yf
+import os
 import polars as pl
 import numpy as np
-import plotly.graph_objects as go
 from datetime import datetime
 import utils
+import chart_downsample
+import chart_spec
+
+# 共有ベンチマーク系列 (build_benchmark_dataset) の形式のバージョン
+BENCHMARK_DATASET_VERSION = 1
 
 PERIOD_CONFIGS = [
     {"key": "1M", "label": "1ヶ月", "days": 30},
@@ -25,17 +29,12 @@ def generate_performance_chart_html(target_symbol, sector_etf_symbol):
     if fig is None:
         return "<p>データ取得に失敗しました。</p>"
     return fig.to_html(full_html=False, include_plotlyjs=False, config={'displayModeBar': False, 'responsive': True})
-import threading
 
-_history_cache = {}
-_cache_lock = threading.Lock()
+# 10 年分の日足 (Date / Close) は 1 銘柄あたり数十 KB。 上限を超えたら古い銘柄から追い出す
+PERF_HISTORY_CACHE_MB = float(os.getenv("PERF_HISTORY_CACHE_MB", 256))
+_history_cache = utils.get_cache("performance_history", max_bytes=int(PERF_HISTORY_CACHE_MB * 1024 * 1024))
 
-def get_cached_history(symbol):
-    with _cache_lock:
-        if symbol in _history_cache:
-            return _history_cache[symbol]
-    
-    # ロックの外で取得を試みる (重い処理)
+def _load_history(symbol):
     try:
         ticker = utils.get_ticker(symbol)
         # 取得に失敗した場合に備えてリトライ回数を増やす
@@ -44,8 +43,6 @@ def get_cached_history(symbol):
             df = pl.from_pandas(hist.reset_index()).select(['Date', 'Close'])
             # 時刻を切り捨てて日付のみにする
             df = df.with_columns(pl.col("Date").dt.replace_time_zone(None).dt.date())
-            with _cache_lock:
-                _history_cache[symbol] = df
             return df
         else:
             return None
@@ -53,6 +50,10 @@ def get_cached_history(symbol):
         print(f"Error fetching data for {symbol}: {e}")
         return None
 
+def get_cached_history(symbol):
+    # 同じ銘柄を複数スレッドが同時に要求しても取得は 1 回 (失敗 = None は覚えない)
+    return _history_cache.get_or_load(symbol, lambda: _load_history(symbol))
+
 def prefetch_common_data(symbols):
     """
     主要なETFや指数のデータを事前に一括取得してキャッシュする。
@@ -61,9 +62,78 @@ def prefetch_common_data(symbols):
     for sym in symbols:
         get_cached_history(sym)
 
-def generate_performance_chart_fig(target_symbol, sector_etf_symbol):
+def _history_arrays(df):
+    """Date / Close の DataFrame を (日付 datetime64[D] の昇順, 終値 float64) にする。
+
+    欠損 (null) の終値は NaN になる。
+    """
+    if not df['Date'].is_sorted():
+        df = df.sort('Date')
+    dates = df['Date'].to_numpy().astype('datetime64[D]')
+    closes = df['Close'].cast(pl.Float64).to_numpy()
+    return dates, closes
+
+def _nan_to_none(values):
+    """numpy 配列をリストにする (NaN は従来の polars の null と同じく None)。"""
+    values = values.tolist()
+    return [None if v != v else v for v in values]
+
+def _period_start_day(last_day, p):
+    """期間 p の開始日 (datetime64[D])。 期間の指定が無ければ None (全期間)。"""
+    if p['days'] == "YTD":
+        return last_day.astype('datetime64[Y]').astype('datetime64[D]')
+    elif p['days'] is not None:
+        return last_day - np.timedelta64(p['days'], 'D')
+    return None
+
+def _cumulative_series(dates, closes, start):
+    """start 以降の累積リターン (最初の値を 0% とする) を (日付のリスト, 値のリスト) で返す。"""
+    i = np.searchsorted(dates, start)
+    if i >= len(dates):
+        return None
+    # polars の「列 / スカラー」と同じく逆数を掛ける (従来の出力とビット単位で一致させる)
+    cumulative = closes[i:] * (1 / closes[i]) - 1
+    # 5 年・10 年などの長い期間は形を保ったまま CHART_MAX_POINTS 点まで間引く
+    x, y = chart_downsample.downsample(dates[i:], cumulative)
+    return x.tolist(), _nan_to_none(y)
+
+def build_benchmark_dataset(symbols):
+    """セクター ETF・指数の期間ごとの累積リターン系列を 1 つにまとめる。
+
+    各レポートに同じ XLK / ^GSPC の系列を埋め込まず、 実行ごとに 1 回だけ
+    共有 JSON として書き出すためのもの。 期間の開始日は全ベンチマークの最終日から
+    求め、 start (系列の先頭の日付) が一致するレポートだけが参照する。
+    戻り値: {version, last_date, symbols: {symbol: {期間キー: {start, x, y}}}}
+    """
+    arrays = {}
+    for sym in symbols:
+        df = get_cached_history(sym)
+        if df is not None and not df.is_empty():
+            arrays[sym] = _history_arrays(df)
+    dataset = {'version': BENCHMARK_DATASET_VERSION, 'last_date': None, 'symbols': {}}
+    if not arrays:
+        return dataset
+    last_day = max(dates[-1] for dates, _ in arrays.values())
+    dataset['last_date'] = str(last_day)
+    for sym, (dates, closes) in arrays.items():
+        periods = {}
+        for p in PERIOD_CONFIGS:
+            start_day = _period_start_day(last_day, p)
+            i = np.searchsorted(dates, start_day) if start_day is not None else 0
+            if i >= len(dates):
+                continue
+            x, y = _cumulative_series(dates, closes, dates[i])
+            periods[p['key']] = {'start': str(dates[i]), 'x': x, 'y': y}
+        dataset['symbols'][sym] = periods
+    return dataset
+
+def generate_performance_chart_fig(target_symbol, sector_etf_symbol, dataset=None, dataset_path=None):
     """
     対象銘柄、セクターETF、S&P 500の累積リターン比較チャートの Plotly Figure を生成。
+
+    dataset (build_benchmark_dataset の結果) と dataset_path を渡すと、 セクター ETF・
+    S&P 500 の系列のうち開始日が共有データセットと一致するものは埋め込まずに
+    参照 (trace の meta) だけを書き、 フロントエンドが表示時に補う。
     """
     symbols = [target_symbol, sector_etf_symbol, "^GSPC"]
     labels = {target_symbol: target_symbol, sector_etf_symbol: sector_etf_symbol, "^GSPC": "S&P 500"}
@@ -96,53 +166,51 @@ def generate_performance_chart_fig(target_symbol, sector_etf_symbol):
     if not all_data or last_date is None:
         return None
 
-    fig = go.Figure()
+    # 日付 (datetime64[D]) と終値を銘柄ごとに 1 回だけ numpy 配列にし、 期間の
+    # 開始位置は二分探索で求める (期間ごとの filter / コピーをしない)
+    arrays = {sym: _history_arrays(all_data[sym]) for sym in symbols if sym in all_data}
+    last_day = np.datetime64(last_date, 'D')
+
+    fig = chart_spec.Figure()
     buttons = []
     total_trace_count = 0
     period_traces = []
 
     for p_idx, p in enumerate(PERIOD_CONFIGS):
         key = p['key']
-        start_date = None
-        if p['days'] == "YTD":
-            start_date = datetime(last_date.year, 1, 1)
-        elif p['days'] is not None:
-            start_date = last_date - np.timedelta64(p['days'], 'D')
-        
+        start_day = _period_start_day(last_day, p)
+
         current_period_traces = []
-        valid_symbols_for_period = []
-        
-        # Determine the latest common start date for this period across all symbols
+
+        # 全銘柄で期間内のデータがある最も遅い開始日に揃える
         period_start_dates = []
-        for sym in symbols:
-            if sym not in all_data: continue
-            df = all_data[sym]
-            if start_date:
-                df_p = df.filter(pl.col("Date") >= start_date)
-            else:
-                df_p = df
-            if not df_p.is_empty():
-                period_start_dates.append(df_p['Date'][0])
-                valid_symbols_for_period.append((sym, df_p))
-        
+        for sym, (dates, _) in arrays.items():
+            i = np.searchsorted(dates, start_day) if start_day is not None else 0
+            if i < len(dates):
+                period_start_dates.append(dates[i])
+
         if not period_start_dates: continue
         common_start_date = max(period_start_dates)
-        
-        for sym, df_p in valid_symbols_for_period:
-            # Sync all to the common start date
-            df_p = df_p.filter(pl.col("Date") >= common_start_date)
-            if df_p.is_empty(): continue
-
-            # 累積リターン計算 (最初の値を 0% とする)
-            base_price = df_p['Close'][0]
-            df_p = df_p.with_columns([
-                ((pl.col("Close") / base_price) - 1).alias("Cumulative_Return")
-            ])
+
+        for sym, (dates, closes) in arrays.items():
+            shared = None
+            if dataset and dataset_path and sym != target_symbol:
+                shared = dataset['symbols'].get(sym, {}).get(key)
+                if shared is not None and shared['start'] != str(common_start_date):
+                    shared = None
+            if shared is not None:
+                # 系列は共有データセットから補う
+                x, y, meta = [], [], {'dataset': dataset_path, 'symbol': sym, 'period': key}
+            else:
+                series = _cumulative_series(dates, closes, common_start_date)
+                if series is None: continue
+                (x, y), meta = series, None
 
             visible = (key == "1Y") # 1年をデフォルト
-            trace = go.Scatter(
-                x=df_p['Date'].to_list(),
-                y=df_p['Cumulative_Return'].to_list(),
+            trace = chart_spec.Scatter(
+                x=x,
+                y=y,
+                meta=meta,
                 name=f"{labels[sym]} ({p['label']})",
                 line=dict(color=colors[sym], width=2),
                 visible=visible,
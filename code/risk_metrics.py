@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+"""拡張リスク指標 (ベータ・シャープ / ソルティノ・最大ドローダウン・下方偏差)。
+
+risk_return が取得した全銘柄の日足終値を日付で揃えた 1 つのリターン行列
+(行 = 取引日の昇順、 列 = 銘柄) にまとめ、 期間ごとに全銘柄を一括で計算する。
+
+  - ベータ: 欠損を 0 埋めした行列と指数 / セクター ETF のリターンの行列積
+    (BLAS) で共分散を求める。 欠損のある日は銘柄ごとに除外する
+  - 最大ドローダウン: 累積リターンの累積最大 (np.maximum.accumulate) との比
+  - 期間の有効判定は risk_return と同じ (5 日以上かつ期間の 80% 以上)
+"""
+import os
+
+import numpy as np
+
+import rolling_stats
+
+TRADING_DAYS = rolling_stats.TRADING_DAYS
+MARKET_SYMBOL = "^GSPC"
+# 年率の無リスク金利 (シャープ / ソルティノの基準)
+RISK_FREE_RATE = float(os.getenv("RISK_FREE_RATE", 0.0))
+
+METRIC_PREFIXES = ("Beta", "Beta_Sector", "Sharpe", "Sortino", "MaxDD", "MaxDD_Days", "DownDev")
+
+
+def build_return_matrix(series):
+    """[(symbol, dates, closes), ...] を日付で揃えたリターン行列にする。
+
+    戻り値: (days, symbols, returns)。 days は全銘柄の取引日 (datetime64[D]) の和集合、
+    returns は前取引日比の単純リターン (行数 × 銘柄数、 欠損は NaN)。
+    ある銘柄の取引が無い日を挟む場合は、 直前の取引日の終値からのリターンとする。
+    終値 0 の翌日など非有限のリターンは欠損 (NaN) にする。
+    """
+    series = [(sym, d, c) for sym, d, c in series if len(c) > 0]
+    symbols = [sym for sym, _, _ in series]
+    day_list = [np.asarray(d, dtype="datetime64[ns]").astype("datetime64[D]") for _, d, _ in series]
+    if not series:
+        return np.array([], dtype="datetime64[D]"), symbols, np.empty((0, 0))
+    days = np.unique(np.concatenate(day_list))
+
+    returns = np.full((len(days), len(series)), np.nan)
+    for j, ((_, _, c), d) in enumerate(zip(series, day_list)):
+        c = np.asarray(c, dtype=np.float64)
+        ok = ~np.isnan(c)
+        c, d = c[ok], d[ok]
+        if len(c) < 2:
+            continue
+        with np.errstate(divide="ignore", invalid="ignore"):
+            r = c[1:] / c[:-1] - 1
+        r[~np.isfinite(r)] = np.nan
+        # 同じ日付が重複している場合は後の行を採る
+        returns[np.searchsorted(days, d[1:]), j] = r
+    return days, symbols, returns
+
+
+def _masked_moments(r, b):
+    """各列 r[:, i] と各ベンチマーク b[:, e] の、 両方が有効な日だけの共分散 / 分散。
+
+    戻り値: (cov, var_b) いずれも 銘柄数 × ベンチマーク数。
+    """
+    mr = ~np.isnan(r)
+    mb = ~np.isnan(b)
+    r0 = np.where(mr, r, 0.0)
+    b0 = np.where(mb, b, 0.0)
+    fr = mr.astype(np.float64)
+    fb = mb.astype(np.float64)
+    n = fr.T @ fb
+    sum_r = r0.T @ fb
+    sum_b = fr.T @ b0
+    sum_rb = r0.T @ b0
+    sum_bb = fr.T @ (b0 * b0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        cov = (sum_rb - sum_r * sum_b / n) / (n - 1)
+        var_b = (sum_bb - sum_b * sum_b / n) / (n - 1)
+    return np.where(n > 2, cov, np.nan), np.where(n > 2, var_b, np.nan)
+
+
+def _drawdowns(r):
+    """期間内の最大ドローダウン (負値) と、 その高値から回復 (または期末) までの営業日数。"""
+    n_rows = r.shape[0]
+    wealth = np.cumprod(1.0 + np.where(np.isnan(r), 0.0, r), axis=0)
+    # 期初 (= 1.0) も高値の候補に含める
+    wealth = np.vstack([np.ones((1, r.shape[1])), wealth])
+    peak = np.maximum.accumulate(wealth, axis=0)
+    dd = wealth / peak - 1.0
+    trough = dd.argmin(axis=0)
+    cols = np.arange(r.shape[1])
+    max_dd = dd[trough, cols]
+
+    rows = np.arange(n_rows + 1)[:, None]
+    # 各時点の直近の高値の位置
+    peak_row = np.maximum.accumulate(np.where(wealth >= peak, rows, 0), axis=0)
+    start = peak_row[trough, cols]
+    # 底の後に高値を回復した最初の位置 (未回復なら期末)
+    recovered = (rows > trough) & (wealth >= peak[trough, cols])
+    end = np.where(recovered.any(axis=0), recovered.argmax(axis=0), n_rows)
+    duration = np.where(max_dd < 0, end - start, 0)
+    return max_dd, duration
+
+
+def compute_extended_metrics(series, periods, sector_benchmarks=None, risk_free_rate=None):
+    """全銘柄 × 期間の拡張リスク指標を計算する。
+
+    series: [(symbol, dates, closes), ...] (risk_return.fetch_price_series の結果)
+    periods: risk_return.PERIOD_CONFIGS 形式の期間定義
+    sector_benchmarks: {symbol: セクター ETF} (無い銘柄の Beta_Sector は None)
+    戻り値: {symbol: {f"{指標}_{期間}": 値}}。 指標は METRIC_PREFIXES、 いずれも
+      日次の単純リターンから求め、 シャープ / ソルティノ / 下方偏差は年率換算。
+      期間のデータが足りない銘柄・ベンチマークが無い場合は None。
+    """
+    sector_benchmarks = sector_benchmarks or {}
+    rf = RISK_FREE_RATE if risk_free_rate is None else risk_free_rate
+    days, symbols, returns = build_return_matrix(series)
+    if not symbols:
+        return {}
+    col_of = {sym: j for j, sym in enumerate(symbols)}
+    n_rows, n_syms = returns.shape
+
+    # ベンチマーク列: 0 = 指数、 1.. = セクター ETF
+    etfs = sorted({e for s, e in sector_benchmarks.items() if e in col_of and s in col_of})
+    bench = [MARKET_SYMBOL] + etfs
+    bench_cols = [col_of.get(b) for b in bench]
+    sector_idx = np.array([1 + etfs.index(sector_benchmarks[s]) if sector_benchmarks.get(s) in etfs else -1
+                           for s in symbols])
+
+    observed = ~np.isnan(returns)
+    # 平均・標準偏差は累積モーメントから各期間の窓の差分で求める
+    moments = rolling_stats.CumulativeMoments(returns)
+    last_day = days[-1]
+    year_start = last_day.astype("datetime64[Y]").astype("datetime64[D]")
+    rf_daily = (1 + rf) ** (1 / TRADING_DAYS) - 1
+
+    out = {sym: {} for sym in symbols}
+    for p in periods:
+        key = p['key']
+        if p['days'] == "YTD":
+            window = int((days >= year_start).sum())
+            if window < 5:
+                window = min(21, n_rows)
+            required = 5
+        else:
+            window = min(p['days'], n_rows)
+            required = max(5, p['days'] * 0.8)
+        start = n_rows - window
+        r = returns[start:]
+        n = observed[start:].sum(axis=0)
+        # 期間の 80% 以上 (risk_return と同じ基準) 取引のある銘柄だけを有効とする
+        valid = n >= required
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = moments.window_mean(start, n_rows)
+            std = moments.window_std(start, n_rows)
+            excess = r - rf_daily
+            downside = np.sqrt(np.nansum(np.minimum(excess, 0.0) ** 2, axis=0) / n)
+            ann_excess = (mean - rf_daily) * TRADING_DAYS
+            sharpe = ann_excess / rolling_stats.annualized_hv(std)
+            down_dev = rolling_stats.annualized_hv(downside)
+            sortino = ann_excess / down_dev
+
+        beta = np.full((n_syms, len(bench)), np.nan)
+        present = [i for i, c in enumerate(bench_cols) if c is not None]
+        if present:
+            cov, var_b = _masked_moments(r, r[:, [bench_cols[i] for i in present]])
+            with np.errstate(invalid="ignore", divide="ignore"):
+                beta[:, present] = cov / var_b
+        beta_sector = np.where(sector_idx >= 0, beta[np.arange(n_syms), np.maximum(sector_idx, 0)], np.nan)
+        max_dd, dd_days = _drawdowns(r)
+
+        values = {
+            "Beta": beta[:, 0], "Beta_Sector": beta_sector, "Sharpe": sharpe, "Sortino": sortino,
+            "MaxDD": max_dd, "MaxDD_Days": dd_days, "DownDev": down_dev,
+        }
+        for name, arr in values.items():
+            arr = np.where(valid, arr, np.nan).astype(np.float64)
+            for j, sym in enumerate(symbols):
+                v = arr[j]
+                if not np.isfinite(v):
+                    out[sym][f"{name}_{key}"] = None
+                elif name == "MaxDD_Days":
+                    out[sym][f"{name}_{key}"] = int(v)
+                else:
+                    out[sym][f"{name}_{key}"] = float(v)
+    return out
@@ -4,36 +4,23 @@ import warnings
 warnings.filterwarnings("ignore", category=FutureWarning, message=".*scattermapbox.*")
 
 import os
-import yfinance as yf
 import polars as pl
 import numpy as np
-import plotly.graph_objects as go
-import plotly.io as pio
 import pytz
 import time
 import utils
-from yfinance.exceptions import YFRateLimitError
+import chart_spec
+import rolling_stats
+import risk_metrics
+import correlation
+import earnings_calendar
 from datetime import datetime
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from tqdm import tqdm
 
-# Plotly 6.0.0+ template migration
-def fix_plotly_templates():
-    with warnings.catch_warnings():
-        warnings.simplefilter("ignore")
-        for name in pio.templates:
-            template = pio.templates[name]
-            try:
-                data = template.layout.template.data
-                if hasattr(data, 'scattermapbox'):
-                    smb = data.scattermapbox
-                    if smb:
-                        data.scattermap = smb
-                    data.scattermapbox = None
-            except:
-                pass
-
-fix_plotly_templates()
+def _new_figure():
+    """空のチャート (chart_spec.Figure、 go.Figure と同じ書き方で Plotly 形式の dict を作る) を返す。"""
+    return chart_spec.Figure()
 
 PERIOD_CONFIGS = [
     {"key": "1M", "label": "1ヶ月", "days": 21},
@@ -46,120 +33,364 @@ PERIOD_CONFIGS = [
     {"key": "10Y", "label": "10年", "days": 2520},
 ]
 
-def process_single_stock(symbol):
-    """1銘柄の各期間のリスク(HV)とリターンを計算"""
+# GICS セクター -> SPDR セクター ETF (該当なしは SPY)
+SECTOR_ETF_MAP = {
+    "Communication Services": "XLC", "Consumer Discretionary": "XLY",
+    "Consumer Staples": "XLP", "Energy": "XLE", "Financials": "XLF",
+    "Health Care": "XLV", "Industrials": "XLI", "Information Technology": "XLK",
+    "Materials": "XLB", "Real Estate": "XLRE", "Utilities": "XLU"
+}
+
+def fetch_price_series(symbol):
+    """1銘柄の日足終値 (最大10年) を取得する。
+
+    戻り値: (dates, closes) / 取得できなければ None。
+    dates はタイムゾーンを外した取引所現地時刻の datetime64[ns]、
+    closes は float64 (欠損は NaN)。
+    """
     try:
         ticker = utils.get_ticker(symbol)
         # 5年以上のデータを取得
         hist_pd = utils.safe_call(ticker, "history", period="10y")
         if hist_pd is None or hist_pd.empty: return None
 
-        hist = pl.from_pandas(hist_pd.reset_index()).select(['Date', 'Close'])
-        hist = hist.with_columns(pl.col("Date").dt.replace_time_zone(None))
-        hist = hist.with_columns([(pl.col("Close") / pl.col("Close").shift(1)).log().alias("Log_Return")])
-        
-        results = {'Symbol': symbol}
+        index = hist_pd.index
+        if getattr(index, "tz", None) is not None:
+            index = index.tz_localize(None)
+        dates = index.values.astype("datetime64[ns]")
+        closes = hist_pd["Close"].to_numpy(dtype=np.float64, na_value=np.nan)
+        return dates, closes
+    except Exception:
+        return None
+
+
+_NS_PER_DAY = 86_400 * 10**9
+
+
+def compute_panel_metrics(series):
+    """複数銘柄の各期間のリスク(HV)とリターンをまとめて計算する。
+
+    series: [(symbol, dates, closes), ...] (fetch_price_series の戻り値の形式)
+    戻り値: {symbol: {'Daily_Change', 'HV_<key>', 'Ret_<key>', ...}}
+            (計算できない銘柄は含まない)
 
-        # 前日比
-        if len(hist) >= 2:
-            results['Daily_Change'] = float((hist['Close'][-1] - hist['Close'][-2]) / hist['Close'][-2])
+    各銘柄の終値を「末尾 (最新日) 揃え」で 行=最新日からの位置 × 列=銘柄 の
+    行列に並べ、 期間ごとの窓 (末尾 N 行) を全銘柄まとめて計算する。 HV は
+    対数リターンの累積モーメント (rolling_stats) の差分から求める。
+    1 銘柄ずつ計算していたとき (tail(N) / 年初来フィルタ / 80% ルール) と
+    同じ窓を使う。
+    """
+    series = [(sym, d, c) for sym, d, c in series if len(c) > 0]
+    if not series:
+        return {}
+    symbols = [sym for sym, _, _ in series]
+    n_obs = np.array([len(c) for _, _, c in series])
+    n_rows, n_syms = int(n_obs.max()), len(series)
+
+    closes = np.full((n_rows, n_syms), np.nan)
+    # 埋め草の行は年初来の判定に掛からないよう最小値にしておく
+    dates = np.full((n_rows, n_syms), np.iinfo(np.int64).min, dtype=np.int64)
+    for j, (_, d, c) in enumerate(series):
+        closes[n_rows - len(c):, j] = c
+        dates[n_rows - len(c):, j] = np.asarray(d, dtype="datetime64[ns]").view(np.int64)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        log_ret = np.full_like(closes, np.nan)
+        log_ret[1:] = np.log(closes[1:] / closes[:-1])
+    # 対数リターンの累積モーメント (各期間の HV は差分から O(1) で求まる)
+    moments = rolling_stats.CumulativeMoments(log_ret)
+    cols = np.arange(n_syms)
+
+    last_close = closes[-1]
+    last_date = dates[-1]
+    failed = np.zeros(n_syms, dtype=bool)
+
+    # 前日比
+    if n_rows >= 2:
+        with np.errstate(invalid="ignore"):
+            daily = np.where(n_obs >= 2, (closes[-1] - closes[-2]) / closes[-2], 0.0)
+        failed |= (n_obs >= 2) & (np.isnan(closes[-1]) | np.isnan(closes[-2]))
+    else:
+        daily = np.zeros(n_syms)
+
+    # 年初来の起点 (各銘柄の最新日の年の 1 月 1 日)
+    year_start = (
+        last_date.astype("datetime64[ns]").astype("datetime64[Y]").astype("datetime64[ns]").view(np.int64)
+    )
+
+    hv, ret = {}, {}
+    for p in PERIOD_CONFIGS:
+        key = p['key']
+        if p['days'] == "YTD":
+            # 年初来: その年の1月1日以降 (5 行未満なら直近 21 行)
+            n_ytd = (dates >= year_start[None, :]).sum(axis=0)
+            window = np.where(n_ytd < 5, np.minimum(21, n_obs), n_ytd)
+            valid = window >= 5
         else:
-            results['Daily_Change'] = 0.0
+            window = np.minimum(p['days'], n_obs)
+            # 要求期間の80%以上のデータが存在しない場合は無効とする（上場直後の銘柄を長期グラフから除外）
+            valid = (window >= 5) & (window >= p['days'] * 0.8)
 
-        # 最新の日付を取得
-        last_date = hist['Date'][-1]
-        
-        # 決算日の取得 (直近の過去の決算日を探す)
-        try:
-            # yfinance 1.1.0+ では earnings_dates が取得可能
-            earnings_df = utils.safe_get(ticker, 'earnings_dates')
-            if earnings_df is not None and not earnings_df.empty:
-                # タイムゾーンの有無を確認
-                now = datetime.now()
-                if earnings_df.index.tzinfo is not None:
-                    # インデックスがタイムゾーン付きの場合、now もタイムゾーン付きにする（UTCベース）
-                    now = datetime.now(pytz.timezone('UTC'))
-                    # インデックスも比較のためにタイムゾーンを調整
-                    earnings_df.index = earnings_df.index.tz_convert('UTC')
-                
-                # インデックスを日付として扱い、現在時刻より前の最新のものを探す
-                past_earnings = earnings_df[earnings_df.index <= now]
-                if not past_earnings.empty:
-                    recent_earnings_date = past_earnings.index.max()
-                    results['Earnings_Date'] = recent_earnings_date.strftime('%Y-%m-%d')
-                else:
-                    results['Earnings_Date'] = None
-            else:
-                results['Earnings_Date'] = None
-        except YFRateLimitError:
-            # print(f"Rate limited for {symbol}")
-            results['Earnings_Date'] = None
-            time.sleep(1)
-        except Exception as e:
-            # print(f"Earnings Date Fetch Error for {symbol}: {e}")
-            results['Earnings_Date'] = None
-        
+        # 年率換算リスク (標準偏差が計算できない場合は 0)
+        std = moments.window_std(*moments.trailing(window))
+        hv_p = np.where(np.isnan(std), 0.0, rolling_stats.annualized_hv(std))
+
+        # 年率換算リターン
+        first_row = n_rows - np.maximum(window, 1)
+        first_close = closes[first_row, cols]
+        with np.errstate(invalid="ignore"):
+            total_ret = last_close / first_close - 1
+        days_diff = (last_date - dates[first_row, cols]) // _NS_PER_DAY
+        ret_p = rolling_stats.annualized_return(total_ret, days_diff)
+
+        failed |= valid & (np.isnan(first_close) | np.isnan(last_close))
+        hv[key] = np.where(valid, hv_p, np.nan)
+        ret[key] = np.where(valid, ret_p, np.nan)
+
+    results = {}
+    for j, symbol in enumerate(symbols):
+        if failed[j]:
+            continue
+        row = {'Daily_Change': float(daily[j])}
         for p in PERIOD_CONFIGS:
             key = p['key']
-            is_valid_period = True
-            if p['days'] == "YTD":
-                # 年初来: その年の1月1日以降
-                sub = hist.filter(pl.col("Date") >= datetime(last_date.year, 1, 1))
-                if len(sub) < 5: sub = hist.tail(21)
-            else:
-                sub = hist.tail(p['days'])
-                # 要求期間の80%以上のデータが存在しない場合は無効とする（上場直後の銘柄を長期グラフから除外）
-                if len(sub) < p['days'] * 0.8:
-                    is_valid_period = False
-            
-            if len(sub) < 5 or not is_valid_period:
-                results[f'HV_{key}'] = None
-                results[f'Ret_{key}'] = None
-            else:
-                # 年率換算リスク
-                std_val = sub['Log_Return'].std()
-                results[f'HV_{key}'] = float(std_val * np.sqrt(252)) if std_val is not None else 0.0
-                
-                # 年率換算リターン
-                total_ret = (hist['Close'][-1] / sub['Close'][0]) - 1
-                days_diff = (last_date - sub['Date'][0]).days
-                if days_diff > 5:
-                    ann_ret = (1 + total_ret) ** (365.0 / days_diff) - 1
-                    results[f'Ret_{key}'] = float(ann_ret) if np.isfinite(ann_ret) else 0.0
-                else:
-                    results[f'Ret_{key}'] = float(total_ret)
-            
-        return results
-    except Exception:
+            h, r = hv[key][j], ret[key][j]
+            row[f'HV_{key}'] = None if np.isnan(h) else float(h)
+            row[f'Ret_{key}'] = None if np.isnan(r) else float(r)
+        results[symbol] = row
+    return results
+
+
+def _metrics_row(symbol, metrics, earnings_date):
+    """calculate_market_metrics_parallel の 1 行 (従来の列順) を組み立てる。"""
+    row = {'Symbol': symbol, 'Daily_Change': metrics['Daily_Change'], 'Earnings_Date': earnings_date}
+    for p in PERIOD_CONFIGS:
+        row[f'HV_{p["key"]}'] = metrics[f'HV_{p["key"]}']
+        row[f'Ret_{p["key"]}'] = metrics[f'Ret_{p["key"]}']
+    return row
+
+
+def process_single_stock(symbol):
+    """1銘柄の各期間のリスク(HV)とリターンを計算"""
+    fetched = fetch_price_series(symbol)
+    if fetched is None:
         return None
+    dates, closes = fetched
+    metrics = compute_panel_metrics([(symbol, dates, closes)]).get(symbol)
+    return _metrics_row(symbol, metrics, earnings_calendar.latest_earnings_date(symbol)) if metrics else None
 
-def calculate_market_metrics_parallel(symbols):
-    """全銘柄 + ETF + 指数の指標を計算"""
+def calculate_market_metrics_parallel(symbols, sectors=None):
+    """全銘柄 + ETF + 指数の指標を計算
+
+    HV / リターンに加え、 同じ価格データから拡張リスク指標 (risk_metrics:
+    ^GSPC / セクター ETF に対するベータ、 シャープ / ソルティノ、 最大ドローダウンと
+    その日数、 下方偏差) を期間ごとに列として付ける。 sectors ({symbol: GICS セクター})
+    を渡すとセクター ETF に対するベータも求める。
+    """
     # SPDR Sector ETFs + S&P 500 ETF (SPY)
-    sector_etfs = ["XLC", "XLY", "XLP", "XLE", "XLF", "XLV", "XLI", "XLK", "XLB", "XLRE", "XLU", "SPY"]
+    sector_etfs = list(SECTOR_ETF_MAP.values()) + ["SPY"]
     target_symbols = list(set(symbols + ['^GSPC'] + sector_etfs))
 
     print(f"\n{len(target_symbols)} 銘柄のリスク・リターンを計算中...")
-    results = []
+    fetched = {}
     default_max_workers = 10 if os.getenv("GITHUB_ACTIONS") == "true" else 1
     current_max_workers = int(os.getenv("MAX_WORKERS", default_max_workers))
 
+    # 取得 (ネットワーク) は銘柄ごとに並列、 指標の計算は全銘柄まとめて行う
     with ThreadPoolExecutor(max_workers=current_max_workers) as executor:
-        future_to_symbol = {executor.submit(process_single_stock, sym): sym for sym in target_symbols}
+        future_to_symbol = {executor.submit(fetch_price_series, sym): sym for sym in target_symbols}
         for future in tqdm(as_completed(future_to_symbol), total=len(target_symbols)):
             res = future.result()
-            if res: results.append(res)
+            if res: fetched[future_to_symbol[future]] = res
+
+    # 決算日は決算日カレンダー (1 日 1 回まとめて取得・キャッシュ) から引く
+    earnings_calendar.prefetch(target_symbols)
+    series = [(sym, d, c) for sym, (d, c) in fetched.items()]
+    panel = compute_panel_metrics(series)
+    sector_benchmarks = {sym: SECTOR_ETF_MAP.get(sec, "SPY") for sym, sec in (sectors or {}).items()}
+    extended = risk_metrics.compute_extended_metrics(series, PERIOD_CONFIGS, sector_benchmarks)
+    # 値動きの近い銘柄の索引 (相関上位 k 銘柄) も同じ価格データから作り直す。
+    # 指数・ETF はほぼ全銘柄と相関が高く上位を占めてしまうため、 個別銘柄だけで作る
+    stock_symbols = set(symbols) - set(sector_etfs) - {'^GSPC'}
+    try:
+        correlation.update_correlation_peers([s for s in series if s[0] in stock_symbols])
+    except Exception as e:
+        print(f"相関索引の更新に失敗: {e}")
+    results = [
+        {**_metrics_row(sym, panel[sym], earnings_calendar.latest_earnings_date(sym)), **extended.get(sym, {})}
+        for sym in fetched if sym in panel
+    ]
     return pl.DataFrame(results) if results else pl.DataFrame({'Symbol': []})
 
 def generate_scatter_html(df_metrics, target_symbol, sector_etf_symbol, target_index=None):
     fig = generate_scatter_fig(df_metrics, target_symbol, sector_etf_symbol, target_index)
     return fig.to_html(full_html=False, include_plotlyjs=False, config={'displayModeBar': False, 'scrollZoom': False, 'responsive': True})
 
-def generate_scatter_fig(df_metrics, target_symbol, sector_etf_symbol, target_index=None):
-    """リスク・リターン散布図生成 (多期間切り替え)"""
-    fig = go.Figure()
-    trace_counts = []
-    period_ranges = []
+SCATTER_DATASET_VERSION = 1
+
+
+def scatter_axis_table(df_metrics):
+    """散布図の期間ごとの素の軸範囲 (5-95% 分位点 ± 1.5 IQR) を 1 回の select で求める。
+
+    戻り値: {期間キー: bounds}。 bounds は raw_max_x / raw_max_y / raw_min_y と、
+    対象銘柄等で範囲を広げない場合の最終的な軸範囲 range を持つ。 有効な銘柄が
+    10 以下の期間は None、 HV / リターンが 1 件も無い期間はキー自体が無い。
+    対象銘柄によらないため、 指数ごとに 1 回だけ作って全レポートで使い回す。
+    """
+    exprs = []
+    keys = []
+    for p in PERIOD_CONFIGS:
+        key = p['key']
+        hv_col = f'HV_{key}'
+        ret_col = f'Ret_{key}'
+        if hv_col not in df_metrics.columns:
+            continue
+        valid = pl.col(hv_col).is_not_null() & pl.col(ret_col).is_not_null()
+        hv = pl.col(hv_col).filter(valid)
+        ret = pl.col(ret_col).filter(valid)
+        exprs += [
+            hv.len().alias(f'{key}_n'),
+            hv.quantile(0.05).alias(f'{key}_q1_x'), hv.quantile(0.95).alias(f'{key}_q3_x'),
+            ret.quantile(0.05).alias(f'{key}_q1_y'), ret.quantile(0.95).alias(f'{key}_q3_y'),
+        ]
+        keys.append(key)
+    if not exprs:
+        return {}
+    stats = df_metrics.select(exprs).row(0, named=True)
+
+    table = {}
+    for key in keys:
+        n = stats[f'{key}_n']
+        if not n:
+            continue
+        if n <= 10:
+            table[key] = None
+            continue
+        # None フォールバック
+        q1_x = stats[f'{key}_q1_x'] if stats[f'{key}_q1_x'] is not None else 0.0
+        q3_x = stats[f'{key}_q3_x'] if stats[f'{key}_q3_x'] is not None else 1.0
+        q1_y = stats[f'{key}_q1_y'] if stats[f'{key}_q1_y'] is not None else -1.0
+        q3_y = stats[f'{key}_q3_y'] if stats[f'{key}_q3_y'] is not None else 1.0
+
+        iqr_x = q3_x - q1_x
+        iqr_y = q3_y - q1_y
+
+        # IQRが0の場合は少し余裕を持たせる
+        if iqr_x == 0: iqr_x = 0.1
+        if iqr_y == 0: iqr_y = 0.1
+
+        bounds = {
+            'raw_max_x': q3_x + iqr_x * 1.5,
+            'raw_max_y': q3_y + iqr_y * 1.5,
+            'raw_min_y': q1_y - iqr_y * 1.5,
+        }
+        bounds['range'] = _round_scatter_range(key, bounds['raw_max_x'], bounds['raw_min_y'], bounds['raw_max_y'])
+        table[key] = bounds
+    return table
+
+
+def _scatter_range(key, bounds, special_returns):
+    """共有の素の範囲に対象銘柄等のリターンを加味した軸範囲を返す。
+
+    対象銘柄等が素の範囲に収まっていれば scatter_axis_table で丸め済みの範囲をそのまま使う。
+    """
+    if bounds is None:
+        return {'min_x': 0.0, 'max_x': 2.0, 'min_y': -1.0, 'max_y': 2.0}
+    raw_max_y = bounds['raw_max_y']
+    raw_min_y = bounds['raw_min_y']
+
+    # ターゲット銘柄とセクターETF、指数の値も考慮に入れる（これらが外枠を広げるように）
+    if special_returns:
+        raw_max_y = max(raw_max_y, max(special_returns) * 1.1)
+        raw_min_y = min(raw_min_y, min(special_returns) * 1.1)
+    if raw_max_y == bounds['raw_max_y'] and raw_min_y == bounds['raw_min_y']:
+        return dict(bounds['range'])
+    return _round_scatter_range(key, bounds['raw_max_x'], raw_min_y, raw_max_y)
+
+
+def _round_scatter_range(key, raw_max_x, raw_min_y, raw_max_y):
+    """素の範囲をキリの良いステップに丸め、 極端な値をキャップする。"""
+    import math
+    # X軸 (下限0.0固定)
+    # ステップを算出して綺麗な倍数に切り上げ (5分割を想定)
+    step_x = 0.1 # 10%
+    if raw_max_x > 1.0: step_x = 0.2
+    if raw_max_x > 2.0: step_x = 0.5
+    if raw_max_x > 5.0: step_x = 1.0
+    max_x = math.ceil(raw_max_x / step_x) * step_x
+    min_x = 0.0
+
+    # Y軸
+    # 下限は-1.0(-100%)までとする。綺麗なステップ幅を算出
+    min_y = max(-1.0, math.floor(raw_min_y * 10) / 10.0)
+
+    range_y = raw_max_y - min_y
+    step_y = 0.2
+    if range_y > 1.5: step_y = 0.5
+    if range_y > 3.0: step_y = 1.0
+    if range_y > 10.0: step_y = 2.0
+    if range_y > 20.0: step_y = 5.0
+
+    # 最大値を step_y の倍数になるように設定
+    ticks = math.ceil(range_y / step_y)
+    # 最小5目盛りは確保する
+    ticks = max(5, ticks)
+    max_y = min_y + ticks * step_y
+
+    # グラフが潰れないようにキャップする
+    # 1ヶ月(1M)の場合は最大2000%(20.0)まで動的に許容し、それ以外は500%(5.0)でキャップする
+    cap_y = 20.0 if key == "1M" else 5.0
+    if max_y > cap_y:
+        max_y = cap_y
+
+    # X軸も同様に極端な値をキャップ (最大でも300% (3.0)程度で十分)
+    if max_x > 3.0:
+        max_x = 3.0
+    return {'min_x': min_x, 'max_x': max_x, 'min_y': min_y, 'max_y': max_y}
+
+
+def build_scatter_dataset(df_metrics, index_name=None):
+    """散布図の「その他」の点 (全銘柄の HV / リターン) と素の軸範囲を期間ごとにまとめる。
+
+    指数ごとに 1 回だけ作り、 JSON として全レポートで共有する。 各レポートには
+    generate_scatter_fig(..., dataset=, dataset_path=) で対象銘柄・セクター ETF・
+    S&P 500 の点だけを持たせる。
+    """
+    axis_table = scatter_axis_table(df_metrics)
+    periods = {}
+    for p in PERIOD_CONFIGS:
+        key = p['key']
+        hv_col = f'HV_{key}'
+        ret_col = f'Ret_{key}'
+        if key not in axis_table:
+            continue
+        df_p = df_metrics.filter(pl.col(hv_col).is_not_null() & pl.col(ret_col).is_not_null())
+        symbols = df_p['Symbol'].to_list()
+        periods[key] = {
+            'label': p['label'],
+            'bounds': axis_table[key],
+            'symbols': symbols,
+            'names': df_p['Security'].to_list() if 'Security' in df_p.columns else [""] * len(symbols),
+            'hv': df_p[hv_col].to_list(),
+            'ret': df_p[ret_col].to_list(),
+        }
+    return {'version': SCATTER_DATASET_VERSION, 'index': index_name, 'periods': periods}
+
+
+def generate_scatter_fig(df_metrics, target_symbol, sector_etf_symbol, target_index=None, dataset=None, dataset_path=None):
+    """リスク・リターン散布図生成 (多期間切り替え)
+
+    dataset (build_scatter_dataset の結果) を渡すと、 その他の銘柄の点と素の軸範囲を
+    そこから取る (df_metrics は対象銘柄・セクター ETF・^GSPC の値にだけ使う)。
+    さらに dataset_path を渡すと、 その他の点は埋め込まずに共有データセットへの
+    参照 (trace の meta) だけを書き、 フロントエンドが表示時に補う。
+    """
+    if dataset is None:
+        dataset = build_scatter_dataset(df_metrics)
+    fig = _new_figure()
+    period_ranges = {}
+    special_symbols = [target_symbol, sector_etf_symbol, '^GSPC']
+    df_special_all = df_metrics.filter(pl.col('Symbol').is_in(special_symbols))
 
     # 「その他」マーカーの系列名は対象銘柄が属する指数に合わせる
     # 例: "S&P 500" -> "S&P500銘柄", "S&P 400" -> "S&P400銘柄", "S&P 600" -> "S&P600銘柄"
@@ -170,102 +401,29 @@ def generate_scatter_fig(df_metrics, target_symbol, sector_etf_symbol, target_in
         hv_col = f'HV_{key}'
         ret_col = f'Ret_{key}'
         visible = (key == "1Y") # 1年をデフォルト表示
-        
-        if hv_col not in df_metrics.columns:
-            trace_counts.append(0)
-            period_ranges.append({'min_x': 0, 'max_x': 2, 'min_y': -2, 'max_y': 2})
-            continue
-
-        df_p = df_metrics.filter(pl.col(hv_col).is_not_null() & pl.col(ret_col).is_not_null())
-        if df_p.is_empty():
-            trace_counts.append(0)
-            period_ranges.append({'min_x': 0, 'max_x': 2, 'min_y': -2, 'max_y': 2})
+        entry = dataset['periods'].get(key)
+        if entry is None:
             continue
 
-        # 外れ値対策のためのクリップ範囲を計算
-        if len(df_p) > 10:
-            import math
-            q1_x = df_p[hv_col].quantile(0.05)
-            q3_x = df_p[hv_col].quantile(0.95)
-            q1_y = df_p[ret_col].quantile(0.05)
-            q3_y = df_p[ret_col].quantile(0.95)
-            
-            # None フォールバック
-            q1_x = q1_x if q1_x is not None else 0.0
-            q3_x = q3_x if q3_x is not None else 1.0
-            q1_y = q1_y if q1_y is not None else -1.0
-            q3_y = q3_y if q3_y is not None else 1.0
-            
-            iqr_x = q3_x - q1_x
-            iqr_y = q3_y - q1_y
-            
-            # IQRが0の場合は少し余裕を持たせる
-            if iqr_x == 0: iqr_x = 0.1
-            if iqr_y == 0: iqr_y = 0.1
-            
-            raw_max_x = q3_x + iqr_x * 1.5
-            raw_max_y = q3_y + iqr_y * 1.5
-            raw_min_y = q1_y - iqr_y * 1.5
-            
-            # ターゲット銘柄とセクターETF、指数の値も考慮に入れる（これらが外枠を広げるように）
-            special_symbols = [target_symbol, sector_etf_symbol, '^GSPC']
-            df_special = df_p.filter(pl.col('Symbol').is_in(special_symbols))
-            if not df_special.is_empty():
-                target_max_y = df_special[ret_col].max()
-                target_min_y = df_special[ret_col].min()
-                if target_max_y is not None: raw_max_y = max(raw_max_y, target_max_y * 1.1)
-                if target_min_y is not None: raw_min_y = min(raw_min_y, target_min_y * 1.1)
-
-            # X軸 (下限0.0固定)
-            # ステップを算出して綺麗な倍数に切り上げ (5分割を想定)
-            step_x = 0.1 # 10%
-            if raw_max_x > 1.0: step_x = 0.2
-            if raw_max_x > 2.0: step_x = 0.5
-            if raw_max_x > 5.0: step_x = 1.0
-            max_x = math.ceil(raw_max_x / step_x) * step_x
-            min_x = 0.0
-            
-            # Y軸
-            # 下限は-1.0(-100%)までとする。綺麗なステップ幅を算出
-            min_y = max(-1.0, math.floor(raw_min_y * 10) / 10.0)
-            
-            range_y = raw_max_y - min_y
-            step_y = 0.2
-            if range_y > 1.5: step_y = 0.5
-            if range_y > 3.0: step_y = 1.0
-            if range_y > 10.0: step_y = 2.0
-            if range_y > 20.0: step_y = 5.0
-            
-            # 最大値を step_y の倍数になるように設定
-            ticks = math.ceil(range_y / step_y)
-            # 最小5目盛りは確保する
-            ticks = max(5, ticks)
-            max_y = min_y + ticks * step_y
-            
-            # グラフが潰れないようにキャップする
-            # 1ヶ月(1M)の場合は最大2000%(20.0)まで動的に許容し、それ以外は500%(5.0)でキャップする
-            cap_y = 20.0 if key == "1M" else 5.0
-            if max_y > cap_y:
-                max_y = cap_y
-                
-            # X軸も同様に極端な値をキャップ (最大でも300% (3.0)程度で十分)
-            if max_x > 3.0:
-                max_x = 3.0
+        if hv_col in df_special_all.columns:
+            df_p = df_special_all.filter(pl.col(hv_col).is_not_null() & pl.col(ret_col).is_not_null())
         else:
-            max_x, min_x = 2.0, 0.0
-            max_y, min_y = 2.0, -1.0
-
-        period_ranges.append({'min_x': min_x, 'max_x': max_x, 'min_y': min_y, 'max_y': max_y})
+            df_p = df_special_all.clear()
+        pr = _scatter_range(key, entry['bounds'], df_p[ret_col].to_list() if not df_p.is_empty() else [])
+        period_ranges[key] = pr
+        min_x, max_x, min_y, max_y = pr['min_x'], pr['max_x'], pr['min_y'], pr['max_y']
 
         # プロット用データ抽出 (クリップ処理とオリジナルデータの保持)
+        def clip(orig_x, orig_y):
+            clipped_x = [min(max_x, max(min_x, val)) if val is not None else None for val in orig_x]
+            clipped_y = [min(max_y, max(min_y, val)) if val is not None else None for val in orig_y]
+            return clipped_x, clipped_y
+
         def get_data(df):
             orig_x = df[hv_col].to_list()
             orig_y = df[ret_col].to_list()
             txt = df['Symbol'].to_list()
-            
-            clipped_x = [min(max_x, max(min_x, val)) if val is not None else None for val in orig_x]
-            clipped_y = [min(max_y, max(min_y, val)) if val is not None else None for val in orig_y]
-            
+            clipped_x, clipped_y = clip(orig_x, orig_y)
             sec = df["Security"].to_list() if "Security" in df.columns else [""] * len(txt)
             cdata = [[ox, oy, t, s] for ox, oy, t, s in zip(orig_x, orig_y, txt, sec)]
             return clipped_x, clipped_y, cdata, txt
@@ -276,21 +434,21 @@ def generate_scatter_fig(df_metrics, target_symbol, sector_etf_symbol, target_in
         df_target = df_p.filter(pl.col('Symbol') == target_symbol)
         if not df_target.is_empty():
             x, y, cdata, txt = get_data(df_target)
-            fig.add_trace(go.Scatter(x=x, y=y, customdata=cdata, text=txt, mode='markers+text', textposition="bottom center", name=f'{target_symbol} ({p["label"]})',
+            fig.add_trace(chart_spec.Scatter(x=x, y=y, customdata=cdata, text=txt, mode='markers+text', textposition="bottom center", name=f'{target_symbol} ({p["label"]})',
                                     hovertemplate=hovertemplate_str,
                                     marker=dict(size=16, color='red', line=dict(width=2, color='white')), visible=visible))
         else:
-            fig.add_trace(go.Scatter(x=[None], y=[None], name=f'{target_symbol} ({p["label"]})', visible=visible))
+            fig.add_trace(chart_spec.Scatter(x=[None], y=[None], name=f'{target_symbol} ({p["label"]})', visible=visible))
 
         # 2. セクター
         df_sector = df_p.filter(pl.col('Symbol') == sector_etf_symbol)
         if not df_sector.is_empty():
             x, y, cdata, txt = get_data(df_sector)
-            fig.add_trace(go.Scatter(x=x, y=y, customdata=cdata, text=txt, mode='markers+text', textposition="top center", name=f'{sector_etf_symbol} ({p["label"]})',
+            fig.add_trace(chart_spec.Scatter(x=x, y=y, customdata=cdata, text=txt, mode='markers+text', textposition="top center", name=f'{sector_etf_symbol} ({p["label"]})',
                                     hovertemplate=hovertemplate_str,
                                     marker=dict(size=12, color='blue'), visible=visible))
         else:
-            fig.add_trace(go.Scatter(x=[None], y=[None], name=f'{sector_etf_symbol} ({p["label"]})', visible=visible))
+            fig.add_trace(chart_spec.Scatter(x=[None], y=[None], name=f'{sector_etf_symbol} ({p["label"]})', visible=visible))
         
         # 3. 市場 (S&P 500 Index)
         df_sp500_idx = df_p.filter(pl.col('Symbol') == '^GSPC')
@@ -299,28 +457,39 @@ def generate_scatter_fig(df_metrics, target_symbol, sector_etf_symbol, target_in
             for cd in cdata:
                 cd[2] = 'S&P 500'
                 cd[3] = 'S&P 500 Index'
-            fig.add_trace(go.Scatter(x=x, y=y, customdata=cdata, text=['S&P 500'], mode='markers+text', textposition="top center", name=f'S&P 500 ({p["label"]})',
+            fig.add_trace(chart_spec.Scatter(x=x, y=y, customdata=cdata, text=['S&P 500'], mode='markers+text', textposition="top center", name=f'S&P 500 ({p["label"]})',
                                     hovertemplate=hovertemplate_str,
                                     marker=dict(size=12, color='black'), visible=visible))
         else:
-            fig.add_trace(go.Scatter(x=[None], y=[None], name=f'S&P 500 ({p["label"]})', visible=visible))
+            fig.add_trace(chart_spec.Scatter(x=[None], y=[None], name=f'S&P 500 ({p["label"]})', visible=visible))
 
         # 4. その他 (対象銘柄が属する指数の銘柄)
-        df_others = df_p.filter(~pl.col('Symbol').is_in([target_symbol, '^GSPC', sector_etf_symbol]))
-        x, y, cdata, txt = get_data(df_others)
-        fig.add_trace(go.Scatter(x=x, y=y, customdata=cdata, text=txt, mode='markers', name=f'{others_name} ({p["label"]})',
-                                hovertemplate=hovertemplate_str,
-                                marker=dict(size=6, color='#72777B', opacity=0.4), visible=visible))
-        
-        trace_counts.append(4)
+        others_style = dict(mode='markers', name=f'{others_name} ({p["label"]})',
+                            hovertemplate=hovertemplate_str,
+                            marker=dict(size=6, color='#72777B', opacity=0.4), visible=visible)
+        if dataset_path:
+            # 点は共有データセットから補う (対象銘柄等を除き、 この範囲でクリップする)
+            fig.add_trace(chart_spec.Scatter(x=[], y=[], meta={
+                'dataset': dataset_path, 'period': key, 'exclude': special_symbols,
+                'range': [min_x, max_x, min_y, max_y],
+            }, **others_style))
+        else:
+            keep = [i for i, s in enumerate(entry['symbols']) if s not in special_symbols]
+            orig_x = [entry['hv'][i] for i in keep]
+            orig_y = [entry['ret'][i] for i in keep]
+            txt = [entry['symbols'][i] for i in keep]
+            sec = [entry['names'][i] for i in keep]
+            x, y = clip(orig_x, orig_y)
+            cdata = [[ox, oy, t, s] for ox, oy, t, s in zip(orig_x, orig_y, txt, sec)]
+            fig.add_trace(chart_spec.Scatter(x=x, y=y, customdata=cdata, text=txt, **others_style))
 
     # 初期レイアウト設定
     default_xaxis_range = None
     default_yaxis_range = None
     
-    for i, p in enumerate(PERIOD_CONFIGS):
+    for p in PERIOD_CONFIGS:
         if p['key'] == "1Y":
-            pr = period_ranges[i] if i < len(period_ranges) else {'min_x': 0, 'max_x': 2, 'min_y': -2, 'max_y': 2}
+            pr = period_ranges.get(p['key'], {'min_x': 0, 'max_x': 2, 'min_y': -2, 'max_y': 2})
             default_xaxis_range = [pr['min_x'], pr['max_x']]
             default_yaxis_range = [pr['min_y'], pr['max_y']]
 
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+"""累積和による移動統計 (平均・標準偏差・年率換算 HV / リターン)。
+
+系列 (行 = 日付の昇順、 列 = 銘柄) ごとに件数・和・二乗和の累積和を一度だけ
+作っておけば、 任意の窓 [start, stop) の平均・標準偏差は累積和の差分から
+O(1) で求まる。 期間を増やしても、 全日付の移動 HV (例: 毎日の 1 年 HV) を
+出しても計算量はほぼ増えない。
+
+NaN は欠損として件数に含めない (polars の std と同じ扱い)。 ±inf (終値 0 からの
+対数リターンなど) も欠損として扱う。 累積和に入れると inf - inf で以降のすべての
+窓が NaN になるため。 二乗和の差分で
+分散を出すと桁落ちしやすいため、 累積前に系列ごとの平均を引いておく。
+"""
+import numpy as np
+
+TRADING_DAYS = 252
+
+
+class CumulativeMoments:
+    """values の累積モーメント。 窓の統計を O(1) で返す。
+
+    values は 1 次元 (1 系列) または 2 次元 (行 = 時系列, 列 = 系列)。
+    窓の start / stop には行番号 (スカラー、 または列ごとの配列) を渡す。
+    """
+
+    def __init__(self, values):
+        v = np.asarray(values, dtype=np.float64)
+        self._squeeze = v.ndim == 1
+        if self._squeeze:
+            v = v[:, None]
+        valid = np.isfinite(v)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            shift = np.where(valid, v, 0.0).sum(axis=0) / valid.sum(axis=0)
+        self.shift = np.where(np.isfinite(shift), shift, 0.0)
+        x = np.where(valid, v - self.shift, 0.0)
+
+        n_rows, n_cols = v.shape
+        self.n_rows = n_rows
+        self._cols = np.arange(n_cols)
+        self.count = np.zeros((n_rows + 1, n_cols), dtype=np.int64)
+        self.sum1 = np.zeros((n_rows + 1, n_cols))
+        self.sum2 = np.zeros((n_rows + 1, n_cols))
+        np.cumsum(valid, axis=0, out=self.count[1:])
+        np.cumsum(x, axis=0, out=self.sum1[1:])
+        np.cumsum(x * x, axis=0, out=self.sum2[1:])
+
+    def _diff(self, cum, start, stop):
+        start = np.broadcast_to(np.asarray(start), self._cols.shape)
+        stop = np.broadcast_to(np.asarray(stop), self._cols.shape)
+        return cum[stop, self._cols] - cum[start, self._cols]
+
+    def _out(self, arr):
+        return arr[0] if self._squeeze else arr
+
+    def window_count(self, start, stop):
+        """窓 [start, stop) 内の有効な値の数。"""
+        return self._out(self._diff(self.count, start, stop))
+
+    def window_mean(self, start, stop):
+        n = self._diff(self.count, start, stop)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = self._diff(self.sum1, start, stop) / n + self.shift
+        return self._out(np.where(n > 0, mean, np.nan))
+
+    def window_std(self, start, stop, ddof=1):
+        """窓 [start, stop) の標準偏差。 有効な値が ddof 以下なら NaN。"""
+        n = self._diff(self.count, start, stop)
+        s1 = self._diff(self.sum1, start, stop)
+        s2 = self._diff(self.sum2, start, stop)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            var = (s2 - s1 * s1 / n) / (n - ddof)
+        return self._out(np.where(n > ddof, np.sqrt(np.maximum(var, 0.0)), np.nan))
+
+    def trailing(self, window, stop=None):
+        """末尾 window 行 (stop の手前まで) の (start, stop) を返す。"""
+        stop = self.n_rows if stop is None else stop
+        return np.maximum(np.asarray(stop) - np.asarray(window), 0), stop
+
+    def rolling_std(self, window, min_periods=2, ddof=1):
+        """各行を終端とする直近 window 行の標準偏差 (行数 × 系列数)。
+
+        窓内の有効な値が min_periods 未満の行は NaN。
+        """
+        ends = np.arange(1, self.n_rows + 1)
+        starts = np.maximum(ends - window, 0)
+        n = self.count[ends] - self.count[starts]
+        s1 = self.sum1[ends] - self.sum1[starts]
+        s2 = self.sum2[ends] - self.sum2[starts]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            var = (s2 - s1 * s1 / n) / (n - ddof)
+        std = np.where((n >= max(min_periods, ddof + 1)), np.sqrt(np.maximum(var, 0.0)), np.nan)
+        return std[:, 0] if self._squeeze else std
+
+
+def annualized_hv(std, trading_days=TRADING_DAYS):
+    """日次対数リターンの標準偏差を年率換算する。"""
+    return np.asarray(std) * np.sqrt(trading_days)
+
+
+def rolling_annualized_hv(log_returns, window=TRADING_DAYS, min_periods=None):
+    """日次対数リターンから、 各日を終端とする移動 HV (年率) を返す。
+
+    min_periods の既定は窓の 80% (risk_return の期間の有効判定と同じ基準)。
+    """
+    if min_periods is None:
+        min_periods = max(2, int(np.ceil(window * 0.8)))
+    return annualized_hv(CumulativeMoments(log_returns).rolling_std(window, min_periods=min_periods))
+
+
+def annualized_return(total_return, days):
+    """期間リターン (total_return) を暦日数 days で年率換算する。
+
+    risk_return と同じく、 5 日以下の期間や非有限の結果は換算しない / 0 とする。
+    """
+    total_return = np.asarray(total_return, dtype=np.float64)
+    days = np.asarray(days)
+    with np.errstate(invalid="ignore", divide="ignore", over="ignore"):
+        ann = np.power(1 + total_return, 365.0 / np.where(days > 5, days, 1)) - 1
+    ann = np.where(np.isfinite(ann), ann, 0.0)
+    return np.where(days > 5, ann, total_return)
@@ -37,7 +37,8 @@ import json
 import time
 import random
 
-from defeatbeta_api.data.ticker import Ticker
+# utils 経由で import すると defeatbeta の update_time 正規化パッチが当たる
+from utils import DBTicker as Ticker
 from generate_transcript_report import (
     generate_transcript_report,
     load_transcript_index,
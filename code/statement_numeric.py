@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+"""財務諸表 (行 = 項目、 列 = 期末日) の値を float64 にそろえる共通処理。
+
+yfinance の財務諸表は float だが、 defeatbeta の statement は Decimal・数値文字列・
+'*' (開示なし)・None が混ざった object 列で返る。 セルごとに文字列へ変換して
+判定するのではなく、 値の型ごとにまとめて変換する:
+  - 欠損 (None / NaN / pd.NA)       : NaN
+  - '*' (センチネル)                : NaN
+  - 数値 (int / float / Decimal 等) : numpy の astype で一括変換
+  - その他の文字列                  : pd.to_numeric (数値として読めなければ NaN)
+
+pandas / numpy だけに依存する (thematic/metrics からも import する)。
+"""
+import numpy as np
+import pandas as pd
+
+# 値が開示されていないことを表すセンチネル
+MISSING_SENTINELS = ("*",)
+
+_type_of = np.frompyfunc(type, 1, 1)
+
+
+def coerce_statement_values(values):
+    """配列 / Series の値を float64 の numpy 配列に変換する (変換できない値は NaN)。"""
+    if isinstance(values, pd.Series) and not isinstance(values.dtype, np.dtype):
+        # 拡張型 (Float64 等) は pd.NA を含むため object として扱う
+        values = values.to_numpy(dtype=object)
+    arr = np.asarray(values)
+    if arr.dtype.kind in "fiub":
+        return arr.astype(np.float64)
+    arr = arr.astype(object, copy=False)
+    out = np.full(arr.shape, np.nan)
+    if arr.size == 0:
+        return out
+
+    missing = np.asarray(pd.isna(arr), dtype=bool)
+    is_str = _type_of(arr) == str
+    sentinel = np.zeros(arr.shape, dtype=bool)
+    sentinel[is_str] = np.isin(arr[is_str].astype(str), MISSING_SENTINELS)
+    parse = is_str & ~sentinel
+    numeric = ~(missing | is_str)
+
+    if numeric.any():
+        try:
+            out[numeric] = arr[numeric].astype(np.float64)
+        except (TypeError, ValueError):
+            # 数値以外のオブジェクトが混ざっている場合だけ 1 件ずつ判定する
+            out[numeric] = pd.to_numeric(pd.Series(arr[numeric]), errors="coerce").to_numpy(np.float64)
+    if parse.any():
+        out[parse] = pd.to_numeric(pd.Series(arr[parse]), errors="coerce").to_numpy(np.float64)
+    return out
+
+
+def coerce_statement_frame(df):
+    """財務諸表の DataFrame の全列を float64 にした新しい DataFrame を返す (index / 列名は保つ)。"""
+    if df is None:
+        return df
+    if all(isinstance(dtype, np.dtype) and dtype.kind in "fiub" for dtype in df.dtypes):
+        return df.astype(np.float64)
+    values = coerce_statement_values(df.to_numpy(dtype=object).ravel()).reshape(df.shape)
+    return pd.DataFrame(values, index=df.index, columns=df.columns)
@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+"""fundamentals._resolve_alias_names (財務諸表の項目名の標準化) の回帰テスト。
+
+ネットワーク不要。 従来の extract_with_aliases が行っていた逐次リネーム
+(標準名ごとに DataFrame の Item 列を書き換える) を素の Python に縮めた版と、
+行番号の上で一括に決める現在の実装の結果が一致することを確認する。
+大文字小文字違いの標準名、 無効な標準名の OLD_<標準名> への退避、 後の標準名と
+衝突するエイリアス、 同名の行の重複を含む。
+
+実行:
+    uv run python test_alias_names.py
+    (または pytest があれば: uv run pytest test_alias_names.py -q)
+"""
+from __future__ import annotations
+
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import fundamentals  # noqa: E402
+
+
+def _sequential(item_list, valid, alias_dict):
+    """従来の逐次リネーム。 名前の検索は元の項目名、 有効判定はその時点の名前で最初の行。"""
+    names = list(item_list)
+    lower = [str(x).lower() for x in item_list]
+
+    def is_valid(name):
+        rows = [i for i, n in enumerate(names) if n == name]
+        return bool(rows) and bool(valid[rows[0]])
+
+    for standard_name, aliases in alias_dict.items():
+        if standard_name.lower() in lower:
+            actual = item_list[lower.index(standard_name.lower())]
+            if is_valid(actual):
+                if actual != standard_name:
+                    names = [standard_name if n == actual else n for n in names]
+                continue
+        for alias in aliases:
+            if alias.lower() not in lower:
+                continue
+            actual = item_list[lower.index(alias.lower())]
+            if not is_valid(actual):
+                continue
+            if actual != standard_name:
+                # when(Item == alias) -> 標準名、 when(Item == 標準名) -> OLD_標準名
+                names = [standard_name if n == actual else f"OLD_{standard_name}" if n == standard_name else n
+                         for n in names]
+            break
+    return names
+
+
+ALIASES = {
+    "Total Revenue": ["Operating Revenue", "Revenue"],
+    "Operating Revenue": ["Revenue", "Sales"],
+    "Net Income": ["Net Income Common Stockholders", "NetIncome"],
+    "Free Cash Flow": ["FreeCashFlow"],
+}
+
+
+def _check(items, valid, alias_dict=ALIASES):
+    got = fundamentals._resolve_alias_names(items, valid, alias_dict)
+    want = _sequential(items, valid, alias_dict)
+    assert got == want, (items, valid, got, want)
+    return got
+
+
+def test_case_variant_standard():
+    got = _check(["total revenue", "NET INCOME", "Free Cash Flow"], [True, True, True])
+    assert got == ["Total Revenue", "Net Income", "Free Cash Flow"], got
+    # 無効な大文字小文字違いの標準名は残し、 有効なエイリアスを採用する
+    got = _check(["total revenue", "Operating Revenue"], [False, True])
+    assert got == ["total revenue", "Total Revenue"], got
+    print("  ok: case_variant_standard")
+
+
+def test_invalid_standard_displaced():
+    got = _check(["Total Revenue", "Operating Revenue", "Net Income"], [False, True, True])
+    assert got == ["OLD_Total Revenue", "Total Revenue", "Net Income"], got
+    # 有効なエイリアスが無ければ何もしない
+    got = _check(["Total Revenue", "Operating Revenue"], [False, False])
+    assert got == ["Total Revenue", "Operating Revenue"], got
+    print("  ok: invalid_standard_displaced")
+
+
+def test_alias_collides_with_later_standard():
+    # "Operating Revenue" は先の標準名のエイリアスとして使われ、 後の標準名
+    # "Operating Revenue" では (元の名前の行がもう無いので) 無効扱いになり、
+    # さらに後ろのエイリアス "Revenue" が採用される
+    items = ["Total Revenue", "Operating Revenue", "Revenue", "Sales"]
+    got = _check(items, [False, True, True, True])
+    assert got == ["OLD_Total Revenue", "Total Revenue", "Operating Revenue", "Sales"], got
+    # 同名の行が重複している場合も最初の行で判定し、 同名の行はまとめてリネームされる
+    items = ["Operating Revenue", "Total Revenue", "Operating Revenue", "Revenue"]
+    _check(items, [True, False, False, True])
+    _check(items, [False, False, True, True])
+    print("  ok: alias_collides_with_later_standard")
+
+
+def test_random_matches_sequential():
+    vocab = ["Total Revenue", "total revenue", "Operating Revenue", "OPERATING REVENUE", "Revenue",
+             "Sales", "Net Income", "net income", "Net Income Common Stockholders", "NetIncome",
+             "Free Cash Flow", "FreeCashFlow", "OLD_Total Revenue", "Gross Profit"]
+    rng = random.Random(0)
+    for _ in range(3000):
+        items = [rng.choice(vocab) for _ in range(rng.randint(0, 8))]
+        valid = [rng.random() < 0.6 for _ in items]
+        keys = rng.sample(list(ALIASES), rng.randint(1, len(ALIASES)))
+        alias_dict = {k: rng.sample(ALIASES[k], len(ALIASES[k])) for k in keys}
+        _check(items, valid, alias_dict)
+    print("  ok: random_matches_sequential")
+
+
+def main() -> int:
+    tests = [
+        test_case_variant_standard,
+        test_invalid_standard_displaced,
+        test_alias_collides_with_later_standard,
+        test_random_matches_sequential,
+    ]
+    failed = 0
+    for t in tests:
+        try:
+            t()
+        except AssertionError as e:
+            failed += 1
+            print(f"  FAIL: {t.__name__}: {e}")
+        except Exception as e:  # noqa: BLE001
+            failed += 1
+            print(f"  ERROR: {t.__name__}: {type(e).__name__}: {e}")
+    if failed:
+        print(f"\n{failed} 件失敗")
+        return 1
+    print(f"\n{len(tests)} 件すべて成功")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
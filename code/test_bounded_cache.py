@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+"""utils.BoundedCache (LRU + バイト数上限 + TTL のキャッシュ) の単体テスト。
+
+ネットワーク不要。 同時要求の集約 (single-flight)、 例外の共有、 LRU の
+追い出し、 TTL、 None の扱いを確認する。
+
+実行:
+    uv run python test_bounded_cache.py
+    (または pytest があれば: uv run pytest test_bounded_cache.py -q)
+"""
+from __future__ import annotations
+
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import utils  # noqa: E402
+
+N_THREADS = 8
+
+
+def _run_concurrent(cache, loader):
+    """N_THREADS 個のスレッドから同じキーを get_or_load し、 結果 (値 or 例外) を返す。
+
+    loader は release が set されるまで待つ。 先頭以外のスレッドがすべて
+    待機 (coalesced) に入ってから解放する。
+    """
+    release = threading.Event()
+    calls = []
+
+    def blocking_loader():
+        calls.append(threading.get_ident())
+        release.wait(5)
+        return loader()
+
+    results = [None] * N_THREADS
+
+    def worker(i):
+        try:
+            results[i] = cache.get_or_load("key", blocking_loader)
+        except Exception as e:  # noqa: BLE001
+            results[i] = e
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(N_THREADS)]
+    for t in threads:
+        t.start()
+    deadline = time.monotonic() + 5
+    while cache.stats()["coalesced"] < N_THREADS - 1 and time.monotonic() < deadline:
+        time.sleep(0.001)
+    release.set()
+    for t in threads:
+        t.join(5)
+    return calls, results
+
+
+def test_concurrent_loads_coalesce():
+    cache = utils.BoundedCache("test")
+    value = object()
+    calls, results = _run_concurrent(cache, lambda: value)
+    assert len(calls) == 1, calls
+    assert all(r is value for r in results), results
+    stats = cache.stats()
+    assert stats["coalesced"] == N_THREADS - 1 and stats["misses"] == N_THREADS, stats
+    assert cache.get("key") is value and not cache._inflight
+    print("  ok: concurrent_loads_coalesce")
+
+
+def test_loader_exception_is_shared():
+    cache = utils.BoundedCache("test")
+
+    def failing():
+        raise ValueError("boom")
+
+    calls, results = _run_concurrent(cache, failing)
+    assert len(calls) == 1, calls
+    assert all(isinstance(r, ValueError) and str(r) == "boom" for r in results), results
+    assert not cache._inflight and "key" not in cache
+    # 失敗は保存されず、 次の呼び出しで再度 loader が呼ばれる
+    assert cache.get_or_load("key", lambda: 42) == 42
+    print("  ok: loader_exception_is_shared")
+
+
+def test_lru_eviction():
+    cache = utils.BoundedCache("test", max_bytes=30, sizeof=len)
+    cache.put("a", "x" * 10)
+    cache.put("b", "x" * 10)
+    cache.put("c", "x" * 10)
+    assert cache.get("a") is not None  # a を最近使ったものにする
+    cache.put("d", "x" * 10)           # 一番古い b が追い出される
+    assert "b" not in cache and all(k in cache for k in ("a", "c", "d"))
+    assert cache.bytes == 30 and cache.stats()["evictions"] == 1, cache.stats()
+    cache.put("e", "x" * 25)           # 収まるまで古い順 (c, a, d) に追い出す
+    assert list(cache._entries) == ["e"] and cache.bytes == 25, list(cache._entries)
+    # 上限より大きい値は保存しない (既存の値も残す)
+    cache.put("big", "x" * 31)
+    assert "big" not in cache and "e" in cache and cache.bytes == 25
+    # 上限より大きい値で置き換えた場合は古い値も消える
+    cache.put("e", "x" * 31)
+    assert "e" not in cache and cache.bytes == 0
+    print("  ok: lru_eviction")
+
+
+def test_ttl_expiry():
+    cache = utils.BoundedCache("test", ttl_seconds=0.05, sizeof=len)
+    cache.put("a", "value")
+    assert cache.get("a") == "value"
+    time.sleep(0.1)
+    assert cache.get("a") is None
+    stats = cache.stats()
+    assert stats["expirations"] == 1 and stats["entries"] == 0 and stats["bytes"] == 0, stats
+    # 期限切れのキーは get_or_load で読み直す
+    assert cache.get_or_load("a", lambda: "fresh") == "fresh"
+    print("  ok: ttl_expiry")
+
+
+def test_none_not_cached_by_default():
+    cache = utils.BoundedCache("test")
+    calls = []
+
+    def loader():
+        calls.append(1)
+        return None
+
+    assert cache.get_or_load("a", loader) is None
+    assert cache.get_or_load("a", loader) is None
+    assert len(calls) == 2 and "a" not in cache
+    assert cache.get_or_load("b", loader, cache_none=True) is None
+    assert cache.get_or_load("b", loader, cache_none=True) is None
+    assert len(calls) == 3 and "b" in cache
+    print("  ok: none_not_cached_by_default")
+
+
+def main() -> int:
+    tests = [
+        test_concurrent_loads_coalesce,
+        test_loader_exception_is_shared,
+        test_lru_eviction,
+        test_ttl_expiry,
+        test_none_not_cached_by_default,
+    ]
+    failed = 0
+    for t in tests:
+        try:
+            t()
+        except AssertionError as e:
+            failed += 1
+            print(f"  FAIL: {t.__name__}: {e}")
+        except Exception as e:  # noqa: BLE001
+            failed += 1
+            print(f"  ERROR: {t.__name__}: {type(e).__name__}: {e}")
+    if failed:
+        print(f"\n{failed} 件失敗")
+        return 1
+    print(f"\n{len(tests)} 件すべて成功")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
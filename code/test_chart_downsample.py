@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+"""chart_downsample (LTTB による時系列の間引き) の単体テスト (合成データ)。
+
+ネットワーク不要。 先頭・末尾の点が残ること、 点数が上限に収まること、
+上限以下なら何もしないこと、 欠損 (NaN) の切れ目が残ること (その分だけ上限を
+超えうる)、 鋭い山・谷が間引かれないことを確認する。
+
+実行:
+    uv run python test_chart_downsample.py
+    (または pytest があれば: uv run pytest test_chart_downsample.py -q)
+"""
+from __future__ import annotations
+
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import chart_downsample  # noqa: E402
+
+
+def _walk(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return np.arange(n, dtype=np.float64), np.cumsum(rng.normal(0, 1, n))
+
+
+def test_keeps_endpoints_within_budget():
+    for n, max_points in [(2520, 500), (1000, 3), (501, 500), (10_000, 97)]:
+        x, y = _walk(n)
+        keep = chart_downsample.lttb_indices(x, y, max_points)
+        assert keep[0] == 0 and keep[-1] == n - 1, (n, max_points)
+        assert len(keep) <= max_points, (n, max_points, len(keep))
+        assert np.all(np.diff(keep) > 0), (n, max_points)
+        # バケツごとに 1 点選ぶので、 欠損が無ければちょうど上限の点数
+        assert len(keep) == max_points, (n, max_points, len(keep))
+    print("  ok: keeps_endpoints_within_budget")
+
+
+def test_noop_when_within_budget():
+    x, y = _walk(500)
+    assert np.array_equal(chart_downsample.lttb_indices(x, y, 500), np.arange(500))
+    # max_points が 0 以下・3 未満なら間引かない
+    assert len(chart_downsample.lttb_indices(x, y, 0)) == 500
+    assert len(chart_downsample.lttb_indices(x, y, 2)) == 500
+    dates = np.arange("2024-01-01", 300, dtype="datetime64[D]")
+    xs, ys = chart_downsample.downsample(dates, y[:300], 300)
+    assert xs is not None and np.array_equal(xs, dates) and np.array_equal(ys, y[:300])
+    print("  ok: noop_when_within_budget")
+
+
+def test_nan_gaps_are_kept():
+    x, y = _walk(2520, seed=1)
+    y[:40] = np.nan          # 上場前
+    y[1000:1005] = np.nan    # 取引の無い日
+    y[2000] = np.nan
+    nan_idx = np.flatnonzero(np.isnan(y))
+    keep = chart_downsample.lttb_indices(x, y, 200)
+    assert np.isin(nan_idx, keep).all(), "欠損の点が落ちた"
+    assert keep[0] == 0 and keep[-1] == len(y) - 1
+    # 欠損を残す分だけ上限を超えうる (上限 + 欠損の点数まで)
+    assert 200 < len(keep) <= 200 + len(nan_idx), len(keep)
+    # 欠損の前後の有効な点も残り、 線の切れ目の位置が変わらない
+    xs, ys = chart_downsample.downsample(x, y, 200)
+    gaps = np.flatnonzero(np.isnan(ys))
+    assert np.array_equal(xs[gaps], x[nan_idx])
+    print("  ok: nan_gaps_are_kept")
+
+
+def test_peaks_survive():
+    x, y = _walk(2520, seed=2)
+    y = y * 0.1
+    y[777] += 50.0    # 急騰
+    y[1900] -= 50.0   # 急落
+    keep = chart_downsample.lttb_indices(x, y, 100)
+    assert 777 in keep and 1900 in keep, keep
+    # 平坦な系列の中の 1 点の山も残る
+    flat = np.zeros(5000)
+    flat[3210] = 1.0
+    assert 3210 in chart_downsample.lttb_indices(np.arange(5000), flat, 50)
+    # 日付の x でも同じ点が選ばれる
+    dates = np.datetime64("2015-01-01") + np.arange(2520).astype("timedelta64[D]")
+    xs, ys = chart_downsample.downsample(dates, y, 100)
+    assert len(xs) == 100 and xs.dtype == dates.dtype
+    assert ys.max() == y.max() and ys.min() == y.min()
+    print("  ok: peaks_survive")
+
+
+def main() -> int:
+    tests = [
+        test_keeps_endpoints_within_budget,
+        test_noop_when_within_budget,
+        test_nan_gaps_are_kept,
+        test_peaks_survive,
+    ]
+    failed = 0
+    for t in tests:
+        try:
+            t()
+        except AssertionError as e:
+            failed += 1
+            print(f"  FAIL: {t.__name__}: {e}")
+        except Exception as e:  # noqa: BLE001
+            failed += 1
+            print(f"  ERROR: {t.__name__}: {type(e).__name__}: {e}")
+    if failed:
+        print(f"\n{failed} 件失敗")
+        return 1
+    print(f"\n{len(tests)} 件すべて成功")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
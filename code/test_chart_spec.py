@@ -0,0 +1,250 @@
+# -*- coding: utf-8 -*-
+"""chart_spec (Plotly 形式のチャート dict を直接組み立てるビルダー) の単体テスト。
+
+ネットワーク不要 (合成データ)。 実際のチャート生成関数 (fundamentals の
+get_*_chart_data、 risk_return.generate_scatter_fig、
+performance_comparison.generate_performance_chart_fig) を chart_spec と
+plotly.graph_objects のそれぞれで組み立て、 fig_to_dict (go.Figure は
+normalize_chart_data を通る) の結果が一致することを確認する。 layout.template は
+chart_spec では名前のまま (展開しない) なので比較から除く。
+
+実行:
+    uv run python test_chart_spec.py
+    (または pytest があれば: uv run pytest test_chart_spec.py -q)
+"""
+from __future__ import annotations
+
+import contextlib
+import datetime
+import json
+import os
+import sys
+import types
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+import polars as pl
+from plotly.utils import PlotlyJSONEncoder
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import chart_spec  # noqa: E402
+import fundamentals  # noqa: E402
+import generate_json_reports as gjr  # noqa: E402
+import performance_comparison  # noqa: E402
+import risk_return  # noqa: E402
+import utils  # noqa: E402
+
+# 各モジュールの chart_spec の代わりに差し込む plotly.graph_objects
+_PLOTLY = types.SimpleNamespace(Figure=go.Figure, Scatter=go.Scatter, Bar=go.Bar)
+_BUILDER_MODULES = (fundamentals, risk_return, performance_comparison)
+
+
+@contextlib.contextmanager
+def _with_plotly():
+    saved = [m.chart_spec for m in _BUILDER_MODULES]
+    for m in _BUILDER_MODULES:
+        m.chart_spec = _PLOTLY
+    try:
+        yield
+    finally:
+        for m, spec in zip(_BUILDER_MODULES, saved):
+            m.chart_spec = spec
+
+
+def _as_json(fig):
+    # normalize_chart_data は object 配列の中の datetime をそのまま残すため、 go 側は
+    # Plotly 自身の JSON エンコーダ (datetime -> ISO 文字列) で書き出して比べる
+    d = json.loads(json.dumps(gjr.fig_to_dict(fig), cls=PlotlyJSONEncoder, ensure_ascii=False))
+    d.get("layout", {}).pop("template", None)
+    return d
+
+
+def _assert_same(name, build):
+    """build() を chart_spec と go で実行し、 出力 (JSON) が一致することを確認する。"""
+    spec_fig = build()
+    assert isinstance(spec_fig, chart_spec.Figure), (name, type(spec_fig))
+    with _with_plotly():
+        go_fig = build()
+    assert isinstance(go_fig, go.Figure), (name, type(go_fig))
+    spec, ref = _as_json(spec_fig), _as_json(go_fig)
+    assert spec == ref, f"{name}: {json.dumps(spec)[:400]} != {json.dumps(ref)[:400]}"
+    return spec
+
+
+def test_primitives_match_plotly():
+    dates = pd.date_range("2024-01-31", periods=4, freq="ME")
+
+    def build():
+        fig = fundamentals._new_figure()
+        spec = fundamentals.chart_spec
+        # 日付 (pandas / numpy / polars / datetime)、 NaN / Inf、 magic underscore
+        fig.add_trace(spec.Scatter(
+            x=dates, y=np.array([1.0, np.nan, np.inf, -np.inf]), mode="lines+markers",
+            marker_color="#ff0000", marker_size=8, line_dash="dot", name="pandas"))
+        fig.add_trace(spec.Scatter(
+            x=pl.Series([datetime.date(2024, 1, 1), None, datetime.date(2024, 3, 1)]),
+            y=pl.Series([1.5, None, float("nan")]), customdata=[[1, "a"], [np.float64(2.5), None]],
+            hovertemplate="%{y}<extra></extra>", name="polars"))
+        fig.add_trace(spec.Scatter(
+            x=np.array(["2024-01-01T12:30", "NaT"], dtype="datetime64[m]"), y=[np.int64(3), None]))
+        # offsetgroup は数値でも文字列になる
+        fig.add_trace(spec.Bar(x=["A", "B"], y=pd.Series([1, 2]), offsetgroup=1,
+                                            marker=dict(color=["#111", "#222"]), textfont_size=10))
+        fig.add_trace(spec.Bar(x=["A", "B"], y=[3.0, None], offsetgroup="2", yaxis="y2",
+                                            error_y=dict(type="data", array=[0.1, 0.2])))
+        # 軸・凡例のタイトル (文字列 -> {"text": ...})、 "_" を含むプロパティ名
+        fig.update_layout(title="タイトル", xaxis_title="日付", yaxis=dict(title="値", tickformat=".0%"),
+                          yaxis2=dict(title="値2", overlaying="y", side="right"),
+                          legend=dict(title="凡例", orientation="h"), barmode="group",
+                          paper_bgcolor="white", plot_bgcolor="white", template="plotly_white")
+        fig.update_xaxes(showgrid=False, title_font_size=12)
+        fig.update_yaxes(gridcolor="#E5E7EB")
+        fig.update_traces(hoverinfo="all")
+        return fig
+
+    out = _assert_same("primitives", build)
+    assert out["data"][0]["y"] == [1.0, None, None, None], out["data"][0]
+    assert out["data"][3]["offsetgroup"] == "1"
+    assert out["layout"]["xaxis"]["title"]["text"] == "日付"
+    print("  ok: primitives_match_plotly")
+
+
+def _statement(items, n, freq, rng):
+    cols = pd.date_range("2020-12-31", periods=n, freq=freq)[::-1]
+    vals = rng.normal(5e9, 3e9, (len(items), n))
+    vals[rng.random(vals.shape) < 0.1] = np.nan
+    return pd.DataFrame(vals, index=items, columns=cols)
+
+
+class _FakeTicker:
+    """get_financial_data が読む属性だけを持つ合成の Ticker。"""
+
+    def __init__(self, seed=1):
+        rng = self.rng = np.random.default_rng(seed)
+        bs = ["Total Assets", "Total Equity Gross Minority Interest", "Stockholders Equity",
+              "Total Liabilities Net Minority Interest", "Current Assets", "Total Non Current Assets",
+              "Current Liabilities", "Total Non Current Liabilities Net Minority Interest",
+              "Long Term Debt And Capital Lease Obligation", "Other Non Current Liabilities"]
+        is_ = ["Total Revenue", "Gross Profit", "Operating Income", "Net Income", "Basic EPS"]
+        cf = ["Operating Cash Flow", "Investing Cash Flow", "Financing Cash Flow", "Free Cash Flow",
+              "Net Income From Continuing Operations", "Repurchase Of Capital Stock", "Cash Dividends Paid"]
+        self.ticker = "AAA"
+        self.balance_sheet, self.quarterly_balance_sheet = _statement(bs, 4, "YE", rng), _statement(bs, 6, "QE", rng)
+        self.income_stmt, self.quarterly_income_stmt = _statement(is_, 4, "YE", rng), _statement(is_, 6, "QE", rng)
+        self.cashflow, self.quarterly_cashflow = _statement(cf, 4, "YE", rng), _statement(cf, 6, "QE", rng)
+        self.dividends = pd.Series(rng.uniform(0.1, 0.5, 16), name="Dividends", index=pd.DatetimeIndex(
+            pd.date_range("2021-01-15", periods=16, freq="QS"), name="Date"))
+
+    def history(self, start=None, end=None, **kwargs):
+        idx = pd.date_range(start, end, freq="D", name="Date")
+        return pd.DataFrame({"Close": self.rng.uniform(50, 60, len(idx))}, index=idx)
+
+    def _breakdown(self, cols):
+        dates = pd.date_range("2021-03-31", periods=8, freq="QE").strftime("%Y-%m-%d")
+        return pd.DataFrame({"symbol": "AAA", "report_date": dates,
+                             **{c: self.rng.uniform(1e9, 2e9, 8) for c in cols}})
+
+    def revenue_by_segment(self):
+        return self._breakdown(["Cloud", "Ads"])
+
+    def revenue_by_geography(self):
+        return self._breakdown(["US", "EU"])
+
+
+def test_fundamentals_builders_match_plotly():
+    fd = fundamentals.get_financial_data(_FakeTicker())
+    builders = {
+        "bs": lambda: fundamentals.get_bs_chart_data(fd["bs"]),
+        "is": lambda: fundamentals.get_is_chart_data(fd["is"]),
+        "cf": lambda: fundamentals.get_cf_chart_data(fd["cf"]),
+        "tp": lambda: fundamentals.get_tp_chart_data(fd["tp"]),
+        "dps_eps": lambda: fundamentals.get_dps_eps_chart_data(fd["dps"], fd["is"]),
+        "dps_history": lambda: fundamentals.get_dps_history_chart_data(fd["dps"]),
+        "segment": lambda: fundamentals.get_segment_chart_data(fd.get("segment", pl.DataFrame())),
+        "geography": lambda: fundamentals.get_geo_chart_data(fd.get("geography", pl.DataFrame())),
+        "valuation": lambda: fundamentals.get_valuation_chart_data({"min": 10, "median": 20, "max": 30, "current": 25}),
+    }
+    compared = 0
+    for name, build in builders.items():
+        if isinstance(build(), str):
+            continue  # データ不足のメッセージ (図なし)
+        out = _assert_same(name, build)
+        assert out["data"], name
+        compared += 1
+    assert compared >= 6, compared
+    print("  ok: fundamentals_builders_match_plotly")
+
+
+def test_scatter_fig_matches_plotly():
+    rng = np.random.default_rng(2)
+    n = 60
+    df = {"Symbol": [f"S{i}" for i in range(n)] + ["XLK", "^GSPC"],
+          "Security": [f"Company {i}" for i in range(n)] + [None, None]}
+    for p in risk_return.PERIOD_CONFIGS:
+        hv = np.abs(rng.normal(0.3, 0.2, n + 2)).tolist()
+        ret = rng.normal(0.1, 0.5, n + 2).tolist()
+        hv[4] = None
+        df[f"HV_{p['key']}"], df[f"Ret_{p['key']}"] = hv, ret
+    df = pl.DataFrame(df)
+    dataset = risk_return.build_scatter_dataset(df)
+    for kwargs in ({}, {"dataset": dataset, "dataset_path": "risk_return/all.json"}):
+        _assert_same("scatter", lambda: risk_return.generate_scatter_fig(df, "S3", "XLK", "S&P 400", **kwargs))
+    print("  ok: scatter_fig_matches_plotly")
+
+
+def test_performance_fig_matches_plotly():
+    rng = np.random.default_rng(3)
+
+    def history(start):
+        dates = pd.bdate_range(start, "2025-06-30", tz="America/New_York", name="Date")
+        close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, len(dates))))
+        close[len(close) // 3] = np.nan
+        return pd.DataFrame({"Close": close}, index=dates)
+
+    histories = {"AAA": history("2019-05-01"), "XLK": history("2015-01-02"), "^GSPC": history("2015-01-02")}
+
+    def cached(symbol):
+        df = pl.from_pandas(histories[symbol].reset_index()).select(["Date", "Close"])
+        return df.with_columns(pl.col("Date").dt.replace_time_zone(None).dt.date())
+
+    saved = utils.get_ticker, utils.safe_call, performance_comparison.get_cached_history
+    utils.get_ticker = lambda symbol: symbol
+    utils.safe_call = lambda symbol, attr, **kwargs: histories[symbol]
+    performance_comparison.get_cached_history = cached
+    try:
+        out = _assert_same("performance", lambda: performance_comparison.generate_performance_chart_fig("AAA", "XLK"))
+    finally:
+        utils.get_ticker, utils.safe_call, performance_comparison.get_cached_history = saved
+    assert out["data"][0]["x"][0][:4] in {str(y) for y in range(2015, 2026)}, out["data"][0]["x"][:2]
+    assert out["layout"]["yaxis"]["title"]["text"] == "累積リターン"
+    print("  ok: performance_fig_matches_plotly")
+
+
+def main() -> int:
+    tests = [
+        test_primitives_match_plotly,
+        test_fundamentals_builders_match_plotly,
+        test_scatter_fig_matches_plotly,
+        test_performance_fig_matches_plotly,
+    ]
+    failed = 0
+    for t in tests:
+        try:
+            t()
+        except AssertionError as e:
+            failed += 1
+            print(f"  FAIL: {t.__name__}: {e}")
+        except Exception as e:  # noqa: BLE001
+            failed += 1
+            print(f"  ERROR: {t.__name__}: {type(e).__name__}: {e}")
+    if failed:
+        print(f"\n{failed} 件失敗")
+        return 1
+    print(f"\n{len(tests)} 件すべて成功")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
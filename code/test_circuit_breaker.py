@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+"""utils.CircuitBreaker (上流ごとのサーキットブレーカー) の単体テスト。
+
+ネットワーク不要。 時刻は差し替え可能な clock (FakeClock) で進め、
+closed → open → half_open → closed / open の遷移と、 例外の分類
+(rate limit・タイムアウト・5xx は失敗、 404 等は応答ありの成功) を確認する。
+
+実行:
+    uv run python test_circuit_breaker.py
+    (または pytest があれば: uv run pytest test_circuit_breaker.py -q)
+"""
+from __future__ import annotations
+
+import os
+import sys
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import utils  # noqa: E402
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class ReadTimeout(Exception):
+    """curl_cffi / requests の ReadTimeout と同じ名前の例外。"""
+
+
+class _Response:
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+
+class HTTPError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP Error {status_code}")
+        self.response = _Response(status_code)
+
+
+def _breaker(clock, **kwargs):
+    kwargs = {"failure_threshold": 3, "window_seconds": 60, "cooldown_seconds": 300, **kwargs}
+    return utils.CircuitBreaker("test/endpoint", clock=clock, **kwargs)
+
+
+def _in_thread(func):
+    result = []
+    t = threading.Thread(target=lambda: result.append(func()))
+    t.start()
+    t.join(5)
+    return result[0] if result else None
+
+
+def test_opens_after_threshold_within_window():
+    clock = FakeClock()
+    b = _breaker(clock)
+    b.record_failure()
+    clock.now += 61  # 窓の外に出た失敗は数えない
+    b.record_failure()
+    b.record_failure()
+    assert b.state == b.CLOSED and b.allow()
+    b.record_failure()
+    assert b.state == b.OPEN, b.state
+    assert not b.allow() and b.rejected == 1
+    print("  ok: opens_after_threshold_within_window")
+
+
+def test_half_open_probe_success_closes():
+    clock = FakeClock()
+    b = _breaker(clock, failure_threshold=1)
+    b.record_failure()
+    clock.now += 299
+    assert not b.allow() and b.state == b.OPEN
+    clock.now += 1
+    assert b.allow() and b.state == b.HALF_OPEN
+    # probe は同時に 1 つだけ
+    assert _in_thread(b.allow) is False
+    b.record_success()
+    assert b.state == b.CLOSED and b.allow()
+    print("  ok: half_open_probe_success_closes")
+
+
+def test_half_open_probe_failure_reopens():
+    clock = FakeClock()
+    b = _breaker(clock, failure_threshold=1)
+    b.record_failure()
+    clock.now += 300
+    assert b.allow() and b.state == b.HALF_OPEN
+    b.record_failure()
+    assert b.state == b.OPEN
+    # cooldown は probe の失敗時刻から数え直す
+    clock.now += 299
+    assert not b.allow()
+    clock.now += 1
+    assert b.allow() and b.state == b.HALF_OPEN
+    print("  ok: half_open_probe_failure_reopens")
+
+
+def test_only_probe_thread_transitions_half_open():
+    clock = FakeClock()
+    b = _breaker(clock, failure_threshold=1)
+    b.record_failure()
+    clock.now += 300
+    assert b.allow() and b.state == b.HALF_OPEN
+    # closed の間に送られて遅れて返ってきたリクエストの結果では遷移しない
+    _in_thread(b.record_success)
+    assert b.state == b.HALF_OPEN
+    _in_thread(b.record_failure)
+    assert b.state == b.HALF_OPEN
+    b.record_success()
+    assert b.state == b.CLOSED
+    print("  ok: only_probe_thread_transitions_half_open")
+
+
+def test_record_error_classification():
+    failures = [
+        Exception("429 Client Error: Too Many Requests"),
+        TimeoutError("timed out"),
+        ConnectionResetError("Connection reset by peer"),
+        ReadTimeout("Operation timed out after 30000 milliseconds"),
+        HTTPError(503),
+        Exception("502 Server Error: Bad Gateway for url"),
+    ]
+    responses = [
+        HTTPError(404),
+        Exception("404 Client Error: Not Found"),
+        KeyError("quoteSummary"),
+        ValueError("No tables found"),
+    ]
+    for e in failures:
+        assert utils.is_upstream_failure(e), repr(e)
+    for e in responses:
+        assert not utils.is_upstream_failure(e), repr(e)
+
+    clock = FakeClock()
+    b = _breaker(clock, failure_threshold=len(failures))
+    for e in responses + failures:
+        b.record_error(e)
+    assert b.state == b.OPEN, b.state
+    # half_open の probe がタイムアウトしたら再び open
+    clock.now += 300
+    assert b.allow()
+    b.record_error(TimeoutError("timed out"))
+    assert b.state == b.OPEN
+    print("  ok: record_error_classification")
+
+
+def test_safe_get_records_transport_failures():
+    clock = FakeClock()
+    b = _breaker(clock, failure_threshold=2)
+
+    class FakeTicker:
+        ticker = "TEST"
+        calls = 0
+
+        @property
+        def info(self):
+            FakeTicker.calls += 1
+            raise TimeoutError("timed out")
+
+    key = "yahoo/quote_summary"
+    saved = utils._circuit_breakers.get(key)
+    utils._circuit_breakers[key] = b
+    try:
+        assert utils.safe_get(FakeTicker(), "info", default="d") == "d"
+        assert utils.safe_get(FakeTicker(), "info", default="d") == "d"
+        assert b.state == b.OPEN, b.state
+        # open の間はリクエストしない
+        assert utils.safe_get(FakeTicker(), "info", default="d") == "d"
+        assert FakeTicker.calls == 2, FakeTicker.calls
+    finally:
+        if saved is None:
+            utils._circuit_breakers.pop(key, None)
+        else:
+            utils._circuit_breakers[key] = saved
+    print("  ok: safe_get_records_transport_failures")
+
+
+def main() -> int:
+    tests = [
+        test_opens_after_threshold_within_window,
+        test_half_open_probe_success_closes,
+        test_half_open_probe_failure_reopens,
+        test_only_probe_thread_transitions_half_open,
+        test_record_error_classification,
+        test_safe_get_records_transport_failures,
+    ]
+    failed = 0
+    for t in tests:
+        try:
+            t()
+        except AssertionError as e:
+            failed += 1
+            print(f"  FAIL: {t.__name__}: {e}")
+        except Exception as e:  # noqa: BLE001
+            failed += 1
+            print(f"  ERROR: {t.__name__}: {type(e).__name__}: {e}")
+    if failed:
+        print(f"\n{failed} 件失敗")
+        return 1
+    print(f"\n{len(tests)} 件すべて成功")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+"""correlation (ブロック単位のリターン相関と相関上位 k 銘柄) の単体テスト (合成データ)。
+
+ネットワーク不要。 欠損 (NaN) を含む小さなリターン行列で、 correlation_blocks /
+top_k_peers の結果がペアごとに両方の値がある日だけで np.corrcoef を計算した値と
+一致すること、 索引の読み込みが失敗も含めて 1 回だけであることを確認する。
+
+実行:
+    uv run python test_correlation.py
+    (または pytest があれば: uv run pytest test_correlation.py -q)
+"""
+from __future__ import annotations
+
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import correlation  # noqa: E402
+
+
+def _returns(seed=0, n_days=60, n_syms=7):
+    """共通因子を持つリターン行列 (日 × 銘柄) に上場前・取引の無い日の欠損を入れる。"""
+    rng = np.random.default_rng(seed)
+    market = rng.normal(0, 0.01, (n_days, 1))
+    r = market * rng.uniform(0.2, 2.0, n_syms) + rng.normal(0, 0.01, (n_days, n_syms))
+    r[:15, 1] = np.nan      # 上場が新しい銘柄
+    r[30:33, 2] = np.nan    # 取引の無い日
+    r[::4, 3] = np.nan      # 欠損の多い銘柄 (窓の 80% 未満 -> 相関なし)
+    r[:, 5] = r[:, 0] * 2   # 完全相関
+    return r
+
+
+def _expected(returns, window, min_overlap):
+    """窓の中でペアごとに両方の値がある日だけを np.corrcoef に渡した相関行列。"""
+    r = returns[-window:]
+    n_syms = r.shape[1]
+    out = np.full((n_syms, n_syms), np.nan)
+    # 有効な日が min_overlap 未満の銘柄はどのペアも NaN
+    enough = (~np.isnan(r)).sum(axis=0) >= min_overlap
+    for i in range(n_syms):
+        for j in range(n_syms):
+            both = ~np.isnan(r[:, i]) & ~np.isnan(r[:, j])
+            if enough[i] and enough[j] and both.sum() >= min_overlap:
+                out[i, j] = np.corrcoef(r[both, i], r[both, j])[0, 1]
+    return out
+
+
+def test_blocks_match_corrcoef():
+    r = _returns()
+    window, min_overlap = 40, 32
+    expected = _expected(r, window, min_overlap)
+    # 欠損の無い銘柄どうしは行列全体の np.corrcoef と同じ
+    full = ~np.isnan(r[-window:]).any(axis=0)
+    ref = np.corrcoef(r[-window:, full], rowvar=False)
+    assert np.allclose(expected[np.ix_(full, full)], ref, atol=1e-12)
+    for block_size in (2, 3, 7):
+        corr = np.vstack([c for _, _, c in correlation.correlation_blocks(r, window, min_overlap, block_size)])
+        assert corr.dtype == np.float32 and corr.shape == (7, 7)
+        assert np.array_equal(np.isnan(corr), np.isnan(expected)), block_size
+        assert np.allclose(corr, expected, atol=1e-5, equal_nan=True), block_size
+    assert np.isnan(corr[3]).all() and np.isnan(corr[:, 3]).all()
+    assert abs(corr[0, 5] - 1.0) < 1e-5
+    # correlation_matrix (memmap) もブロックを並べた結果と同じ
+    with tempfile.TemporaryDirectory() as d:
+        mm = correlation.correlation_matrix(r, window, memmap_path=os.path.join(d, "c.npy"),
+                                            min_overlap=min_overlap, block_size=3)
+        assert np.allclose(mm, corr, equal_nan=True)
+        del mm
+    print("  ok: blocks_match_corrcoef")
+
+
+def test_top_k_peers_match_corrcoef():
+    r = _returns(seed=1)
+    window, min_overlap, k = 40, 32, 3
+    expected = _expected(r, window, min_overlap)
+    np.fill_diagonal(expected, np.nan)
+    peer_idx, peer_corr = correlation.top_k_peers(r, window, k, min_overlap=min_overlap, block_size=3)
+    assert peer_idx.shape == (7, k) and peer_corr.shape == (7, k)
+    for i in range(7):
+        row = np.where(np.isnan(expected[i]), -np.inf, expected[i])
+        want = [j for j in np.argsort(-row, kind="stable") if np.isfinite(row[j])][:k]
+        got = [j for j in peer_idx[i] if j >= 0]
+        assert i not in got, i
+        assert np.allclose(peer_corr[i, :len(got)], expected[i, got], atol=1e-5), i
+        assert np.allclose(sorted(expected[i, got]), sorted(expected[i, want]), atol=1e-5), (i, got, want)
+        # 該当なしの欄は -1 / NaN
+        assert (peer_idx[i, len(got):] == -1).all() and np.isnan(peer_corr[i, len(got):]).all(), i
+    assert (peer_idx[3] == -1).all()  # 欠損の多い銘柄には相関上位がない
+    assert peer_idx[0, 0] == 5 and peer_idx[5, 0] == 0
+    print("  ok: top_k_peers_match_corrcoef")
+
+
+def test_load_memoizes_missing_and_failed_reads():
+    with tempfile.TemporaryDirectory() as d:
+        missing = os.path.join(d, "missing.parquet")
+        broken = os.path.join(d, "broken.parquet")
+        with open(broken, "wb") as f:
+            f.write(b"not a parquet file")
+        saved = dict(correlation._peers_memo)
+        try:
+            assert correlation.load_correlation_peers(252, missing) == {}
+            assert (missing, 252) in correlation._peers_memo
+            assert correlation.load_correlation_peers(252, broken) == {}
+            assert (broken, 252) in correlation._peers_memo
+            # 索引を書き直すと覚えた結果は捨てられ、 新しい索引を読む
+            rng = np.random.default_rng(2)
+            dates = np.arange("2025-01-01", 60, dtype="datetime64[D]")
+            series = [(f"S{i}", dates, 100 * np.exp(np.cumsum(rng.normal(0, 0.01, 60)))) for i in range(4)]
+            correlation.update_correlation_peers(series, path=missing, windows=[40], k=2, min_symbols=1)
+            peers = correlation.load_correlation_peers(40, missing)
+            assert sorted(peers) == ["S0", "S1", "S2", "S3"], peers
+            assert all(len(v) == 2 for v in peers.values()), peers
+        finally:
+            correlation._peers_memo.clear()
+            correlation._peers_memo.update(saved)
+    print("  ok: load_memoizes_missing_and_failed_reads")
+
+
+def main() -> int:
+    tests = [
+        test_blocks_match_corrcoef,
+        test_top_k_peers_match_corrcoef,
+        test_load_memoizes_missing_and_failed_reads,
+    ]
+    failed = 0
+    for t in tests:
+        try:
+            t()
+        except AssertionError as e:
+            failed += 1
+            print(f"  FAIL: {t.__name__}: {e}")
+        except Exception as e:  # noqa: BLE001
+            failed += 1
+            print(f"  ERROR: {t.__name__}: {type(e).__name__}: {e}")
+    if failed:
+        print(f"\n{failed} 件失敗")
+        return 1
+    print(f"\n{len(tests)} 件すべて成功")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
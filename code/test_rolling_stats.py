@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""rolling_stats (累積和による移動統計) のネットワーク不要の単体テスト (合成データ)。
+
+窓ごとに np.mean / np.std で直接計算した値と一致すること、 欠損 (NaN) と
+非有限値 (±inf) が窓の外に影響しないことを確認する。
+
+実行:
+    uv run python test_rolling_stats.py
+    (または pytest があれば: uv run pytest test_rolling_stats.py -q)
+"""
+from __future__ import annotations
+
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import rolling_stats  # noqa: E402
+
+
+def _direct(values, start, stop, ddof=1):
+    """窓 [start, stop) の有限値だけで計算した (件数, 平均, 標準偏差)。"""
+    w = np.asarray(values[start:stop], dtype=np.float64)
+    w = w[np.isfinite(w)]
+    mean = w.mean() if len(w) else np.nan
+    std = w.std(ddof=ddof) if len(w) > ddof else np.nan
+    return len(w), mean, std
+
+
+def _close(a, b, tol=1e-12):
+    return (np.isnan(a) and np.isnan(b)) or abs(a - b) <= tol * max(1.0, abs(b))
+
+
+def test_window_matches_direct():
+    rng = np.random.default_rng(0)
+    # 平均から離れた値でも桁落ちしないこと
+    v = rng.normal(100.0, 0.01, 500)
+    m = rolling_stats.CumulativeMoments(v)
+    for start, stop in [(0, 500), (0, 2), (10, 11), (123, 400), (499, 500), (250, 250)]:
+        n, mean, std = _direct(v, start, stop)
+        assert m.window_count(start, stop) == n, (start, stop)
+        assert _close(m.window_mean(start, stop), mean), (start, stop)
+        assert _close(m.window_std(start, stop), std, 1e-9), (start, stop)
+    # 2 次元 (列 = 系列) では列ごとに start / stop を渡せる
+    v2 = rng.normal(0, 0.02, (300, 3))
+    m2 = rolling_stats.CumulativeMoments(v2)
+    starts, stops = np.array([0, 50, 200]), np.array([300, 120, 260])
+    std = m2.window_std(starts, stops)
+    for j in range(3):
+        assert _close(std[j], _direct(v2[:, j], starts[j], stops[j])[2], 1e-9), j
+    print("  ok: window_matches_direct")
+
+
+def test_nan_gaps():
+    rng = np.random.default_rng(1)
+    v = rng.normal(0, 0.02, 300)
+    v[:20] = np.nan  # 上場前
+    v[100:110] = np.nan  # 取引の無い日
+    m = rolling_stats.CumulativeMoments(v)
+    for start, stop in [(0, 300), (0, 20), (0, 21), (95, 115), (100, 110)]:
+        n, mean, std = _direct(v, start, stop)
+        assert m.window_count(start, stop) == n, (start, stop)
+        assert _close(m.window_mean(start, stop), mean), (start, stop)
+        assert _close(m.window_std(start, stop), std, 1e-9), (start, stop)
+    # 移動 HV: 窓内の有効な値が min_periods 未満の行は NaN
+    rolling = m.rolling_std(30, min_periods=25)
+    assert np.isnan(rolling[:44]).all(), rolling[:44]
+    assert _close(rolling[-1], _direct(v, 270, 300)[2], 1e-9)
+    print("  ok: nan_gaps")
+
+
+def test_non_finite_input():
+    rng = np.random.default_rng(2)
+    v = rng.normal(0, 0.02, 400)
+    # 終値 0 の日をはさむ対数リターン (-inf / +inf)
+    v[10], v[11] = -np.inf, np.inf
+    m = rolling_stats.CumulativeMoments(v)
+    assert np.isfinite(m.shift)
+    # inf を含まない窓は影響を受けない
+    for start, stop in [(200, 300), (12, 400), (0, 10)]:
+        n, mean, std = _direct(v, start, stop)
+        assert m.window_count(start, stop) == n, (start, stop)
+        assert _close(m.window_mean(start, stop), mean), (start, stop)
+        assert _close(m.window_std(start, stop), std, 1e-9), (start, stop)
+    # inf を含む窓は inf を欠損として除いた値
+    n, _, std = _direct(v, 0, 400)
+    assert n == 398 and _close(m.window_std(0, 400), std, 1e-9)
+    assert np.isfinite(m.rolling_std(20)[30:]).all()
+    print("  ok: non_finite_input")
+
+
+def test_annualized_return():
+    out = rolling_stats.annualized_return([0.1, 0.1, np.inf], [365, 3, 365])
+    assert _close(out[0], 0.1) and _close(out[1], 0.1) and out[2] == 0.0, out
+    print("  ok: annualized_return")
+
+
+def main() -> int:
+    tests = [
+        test_window_matches_direct,
+        test_nan_gaps,
+        test_non_finite_input,
+        test_annualized_return,
+    ]
+    failed = 0
+    for t in tests:
+        try:
+            t()
+        except AssertionError as e:
+            failed += 1
+            print(f"  FAIL: {t.__name__}: {e}")
+        except Exception as e:  # noqa: BLE001
+            failed += 1
+            print(f"  ERROR: {t.__name__}: {type(e).__name__}: {e}")
+    if failed:
+        print(f"\n{failed} 件失敗")
+        return 1
+    print(f"\n{len(tests)} 件すべて成功")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
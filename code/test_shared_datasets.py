@@ -0,0 +1,259 @@
+# -*- coding: utf-8 -*-
+"""共有データセット (generate_json_reports.export_scatter_datasets /
+export_benchmark_dataset) の単体テスト。
+
+ネットワーク不要 (合成データ、 R2 クライアントと価格履歴の取得は差し替え)。
+レポートに書く参照 (trace の meta) と共有データセットをフロントエンドと同じ手順
+(stock-blog/src/utils/risk-return-dataset.ts の resolveScatterDataset・
+performance-dataset.ts の resolveBenchmarkSeries) で展開すると従来の埋め込み版の
+図と一致すること、 R2 へのアップロードが成功した場合だけ参照を書くことを確認する。
+
+実行:
+    uv run python test_shared_datasets.py
+    (または pytest があれば: uv run pytest test_shared_datasets.py -q)
+"""
+from __future__ import annotations
+
+import json
+import os
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+import polars as pl
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import generate_json_reports as gjr  # noqa: E402
+import performance_comparison  # noqa: E402
+import risk_return  # noqa: E402
+import utils  # noqa: E402
+
+
+def _metrics(n=40, seed=0):
+    """指数の構成銘柄 n 件 + セクター ETF + ^GSPC の合成 df_metrics (Security 付き)。"""
+    rng = np.random.default_rng(seed)
+    symbols = [f"S{i:02d}" for i in range(n)] + ["XLK", "^GSPC"]
+    names = [f"Company {i}" for i in range(n)] + [None, None]
+    names[3] = None  # 銘柄名の無い銘柄
+    cols = {"Symbol": symbols, "Security": names}
+    for p in risk_return.PERIOD_CONFIGS:
+        hv = rng.uniform(0.1, 0.6, len(symbols))
+        ret = rng.normal(0.05, 0.2, len(symbols))
+        hv[0], ret[1] = 5.0, -3.0  # 軸範囲の外 (クリップされる点)
+        hv_l, ret_l = hv.tolist(), ret.tolist()
+        hv_l[2] = None  # 欠損は点にしない
+        cols[f"HV_{p['key']}"] = hv_l
+        cols[f"Ret_{p['key']}"] = ret_l
+    return pl.DataFrame(cols)
+
+
+def _resolve(chart, datasets):
+    """resolveScatterDataset (risk-return-dataset.ts) の Python 版。"""
+    for trace in chart.get("data", []):
+        meta = trace.get("meta")
+        if not isinstance(meta, dict) or not meta.get("dataset"):
+            continue
+        period = datasets[meta["dataset"]]["periods"].get(meta["period"])
+        if period is None:
+            continue
+        min_x, max_x, min_y, max_y = meta["range"]
+        clip = lambda v, lo, hi: None if v is None else min(hi, max(lo, v))  # noqa: E731
+        exclude = set(meta.get("exclude") or [])
+        x, y, text, customdata = [], [], [], []
+        for i, symbol in enumerate(period["symbols"]):
+            if symbol in exclude:
+                continue
+            hv, ret = period["hv"][i], period["ret"][i]
+            x.append(clip(hv, min_x, max_x))
+            y.append(clip(ret, min_y, max_y))
+            text.append(symbol)
+            customdata.append([hv, ret, symbol, period["names"][i]])
+        trace.update(x=x, y=y, text=text, customdata=customdata)
+        del trace["meta"]
+    return chart
+
+
+def _as_json(obj):
+    """レポートに書き出してフロントエンドが読んだ後と同じ形にする。"""
+    return json.loads(json.dumps(gjr.normalize_chart_data(obj), ensure_ascii=False, allow_nan=False))
+
+
+def test_overlay_rebuilds_inline_figure():
+    df = _metrics()
+    dataset = risk_return.build_scatter_dataset(df, index_name="S&P 500")
+    rel_path = "risk_return/S-P-500.json"
+    shared = {rel_path: _as_json(dataset)}
+    for target in ("S05", "S00", "S02"):
+        inline = _as_json(gjr.fig_to_dict(risk_return.generate_scatter_fig(df, target, "XLK", target_index="S&P 500")))
+        overlay = _as_json(gjr.fig_to_dict(risk_return.generate_scatter_fig(
+            df, target, "XLK", target_index="S&P 500", dataset=dataset, dataset_path=rel_path)))
+        refs = [t for t in overlay["data"] if isinstance(t.get("meta"), dict)]
+        assert len(refs) == len(dataset["periods"]) and all(not t["x"] for t in refs), target
+        assert _resolve(overlay, shared) == inline, target
+    print("  ok: overlay_rebuilds_inline_figure")
+
+
+class _FakeS3:
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.objects = {}
+
+    def put_object(self, Bucket, Key, Body, ContentType):
+        if self.fail:
+            raise ConnectionError("upload failed")
+        self.objects[Key] = json.loads(Body)
+
+
+def _export(client, local=False):
+    df_info = pl.DataFrame({"Symbol_YF": ["S00", "S01", "S02", "S03"], "Index": ["S&P 500", "S&P 500", "S&P 400", "S&P 400"]})
+    saved = gjr.s3_client, gjr.SHARED_DATASETS_LOCAL
+    gjr.s3_client, gjr.SHARED_DATASETS_LOCAL = client, local
+    try:
+        with tempfile.TemporaryDirectory() as out:
+            datasets = gjr.export_scatter_datasets(df_info, _metrics(), out)
+            files = sorted(os.listdir(os.path.join(out, "risk_return")))
+    finally:
+        gjr.s3_client, gjr.SHARED_DATASETS_LOCAL = saved
+    return datasets, files
+
+
+def test_references_only_when_published():
+    client = _FakeS3()
+    datasets, files = _export(client)
+    assert sorted(datasets) == ["S&P 400", "S&P 500"], datasets
+    assert files == ["S-P-400.json", "S-P-500.json"], files
+    # フロントエンドが読むキー (reports/<相対パス>) にレポートより先に置かれている
+    for dataset, rel_path in datasets.values():
+        assert client.objects[f"reports/{rel_path}"] == _as_json(dataset), rel_path
+
+    # アップロードに失敗した場合・R2 未設定の場合は参照を書かない (点を埋め込む)
+    assert _export(_FakeS3(fail=True))[0] == {}
+    datasets, files = _export(None)
+    assert datasets == {} and len(files) == 2, (datasets, files)
+    # ローカル確認用 (public/reports を直接配信) なら書き出しだけで参照させる
+    assert sorted(_export(None, local=True)[0]) == ["S&P 400", "S&P 500"]
+    print("  ok: references_only_when_published")
+
+
+def _history(start, end, seed):
+    """営業日の終値の合成履歴 (pandas, yfinance の history と同じく Date が index)。"""
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range(start, end, tz="America/New_York", name="Date")
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, len(dates))))
+    close[len(close) // 2] = np.nan  # 欠損の終値
+    return pd.DataFrame({"Close": close}, index=dates)
+
+
+class _FakeHistory:
+    """utils.get_ticker / safe_call と performance_comparison.get_cached_history の差し替え。"""
+
+    def __init__(self, histories):
+        self.histories = histories
+
+    def __enter__(self):
+        self.saved = utils.get_ticker, utils.safe_call, performance_comparison.get_cached_history
+        utils.get_ticker = lambda symbol: symbol
+        utils.safe_call = lambda symbol, attr, **kwargs: self.histories[symbol]
+        performance_comparison.get_cached_history = self.cached
+        return self
+
+    def __exit__(self, *exc):
+        utils.get_ticker, utils.safe_call, performance_comparison.get_cached_history = self.saved
+
+    def cached(self, symbol):
+        hist = self.histories.get(symbol)
+        if hist is None:
+            return None
+        df = pl.from_pandas(hist.reset_index()).select(["Date", "Close"])
+        return df.with_columns(pl.col("Date").dt.replace_time_zone(None).dt.date())
+
+
+def _resolve_benchmarks(chart, datasets):
+    """resolveBenchmarkSeries (performance-dataset.ts) の Python 版。"""
+    for trace in chart.get("data", []):
+        meta = trace.get("meta")
+        if not isinstance(meta, dict) or not meta.get("dataset"):
+            continue
+        series = datasets[meta["dataset"]]["symbols"].get(meta["symbol"], {}).get(meta["period"])
+        if series is None:
+            continue
+        trace.update(x=series["x"], y=series["y"])
+        del trace["meta"]
+    return chart
+
+
+def test_benchmark_overlay_rebuilds_inline_figure():
+    histories = {
+        "XLK": _history("2015-01-02", "2025-06-30", 1),
+        "^GSPC": _history("2015-01-02", "2025-06-30", 2),
+        # 上場が新しい銘柄は長い期間の開始日が共有系列とずれる (その期間は埋め込み)
+        "NEW": _history("2023-03-01", "2025-06-30", 3),
+        "OLD": _history("2012-01-03", "2025-06-30", 4),
+    }
+    rel_path = "performance/benchmarks.json"
+    with _FakeHistory(histories):
+        dataset = performance_comparison.build_benchmark_dataset(["XLK", "^GSPC"])
+        shared = {rel_path: _as_json(dataset)}
+        for target in ("NEW", "OLD"):
+            fig = performance_comparison.generate_performance_chart_fig
+            inline = _as_json(gjr.fig_to_dict(fig(target, "XLK")))
+            overlay = _as_json(gjr.fig_to_dict(fig(target, "XLK", dataset=dataset, dataset_path=rel_path)))
+            refs = [t for t in overlay["data"] if isinstance(t.get("meta"), dict)]
+            assert refs and all(not t["x"] for t in refs), target
+            assert _resolve_benchmarks(overlay, shared) == inline, target
+            # 片方だけ渡された場合は参照を書かずに埋め込む (dataset 無しでも落ちない)
+            assert _as_json(gjr.fig_to_dict(fig(target, "XLK", dataset_path=rel_path))) == inline, target
+            assert _as_json(gjr.fig_to_dict(fig(target, "XLK", dataset=dataset))) == inline, target
+        refs_new = {(t["meta"]["symbol"], t["meta"]["period"])
+                    for t in _as_json(gjr.fig_to_dict(fig("NEW", "XLK", dataset=dataset, dataset_path=rel_path)))["data"]
+                    if isinstance(t.get("meta"), dict)}
+        assert ("XLK", "1Y") in refs_new and ("XLK", "5Y") not in refs_new, refs_new
+    print("  ok: benchmark_overlay_rebuilds_inline_figure")
+
+
+def test_benchmark_reference_only_when_published():
+    histories = {"XLK": _history("2020-01-02", "2025-06-30", 1)}
+    saved = gjr.s3_client, gjr.SHARED_DATASETS_LOCAL
+    try:
+        with _FakeHistory(histories), tempfile.TemporaryDirectory() as out:
+            client = gjr.s3_client = _FakeS3()
+            gjr.SHARED_DATASETS_LOCAL = False
+            dataset, rel_path = gjr.export_benchmark_dataset(["XLK", "^GSPC"], out)
+            assert client.objects[f"reports/{rel_path}"] == _as_json(dataset)
+            gjr.s3_client = _FakeS3(fail=True)
+            assert gjr.export_benchmark_dataset(["XLK"], out) is None
+            gjr.s3_client = None
+            assert gjr.export_benchmark_dataset(["XLK"], out) is None
+    finally:
+        gjr.s3_client, gjr.SHARED_DATASETS_LOCAL = saved
+    print("  ok: benchmark_reference_only_when_published")
+
+
+def main() -> int:
+    tests = [
+        test_overlay_rebuilds_inline_figure,
+        test_references_only_when_published,
+        test_benchmark_overlay_rebuilds_inline_figure,
+        test_benchmark_reference_only_when_published,
+    ]
+    failed = 0
+    for t in tests:
+        try:
+            t()
+        except AssertionError as e:
+            failed += 1
+            print(f"  FAIL: {t.__name__}: {e}")
+        except Exception as e:  # noqa: BLE001
+            failed += 1
+            print(f"  ERROR: {t.__name__}: {type(e).__name__}: {e}")
+    if failed:
+        print(f"\n{failed} 件失敗")
+        return 1
+    print(f"\n{len(tests)} 件すべて成功")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""market_data.diff_universe (構成銘柄の差分) の単体テスト (合成データ)。
+
+ネットワーク不要。 追加・除外・ティッカー変更 (TICKER_OVERRIDES による既知の
+変更と、 同じ Security 名の除外・追加の組) の判定を確認する。
+
+実行:
+    uv run python test_universe_diff.py
+    (または pytest があれば: uv run pytest test_universe_diff.py -q)
+"""
+from __future__ import annotations
+
+import os
+import sys
+
+import polars as pl
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import market_data  # noqa: E402
+
+
+def _universe(rows):
+    """[(Symbol_YF, Security), ...] から Wikipedia 取得直後と同じ形の DataFrame を作る。"""
+    return pl.DataFrame(
+        {"Symbol": [s.replace("-", ".") for s, _ in rows], "Symbol_YF": [s for s, _ in rows],
+         "Security": [n for _, n in rows]},
+        schema={"Symbol": pl.Utf8, "Symbol_YF": pl.Utf8, "Security": pl.Utf8},
+    )
+
+
+def test_added_and_removed():
+    prev = _universe([("AAPL", "Apple Inc."), ("MSFT", "Microsoft"), ("OLD", "Old Corp")])
+    curr = _universe([("AAPL", "Apple Inc."), ("MSFT", "Microsoft"), ("NEW", "New Corp")])
+    diff = market_data.diff_universe(prev, curr)
+    assert diff == {"added": ["NEW"], "removed": ["OLD"], "renamed": []}, diff
+    assert market_data.diff_universe(prev, prev) == {"added": [], "removed": [], "renamed": []}
+    print("  ok: added_and_removed")
+
+
+def test_rename_by_security_name():
+    prev = _universe([("AAPL", "Apple Inc."), ("BRK-B", "Berkshire Hathaway"), ("X", "Same Name"), ("Y", "Same Name")])
+    curr = _universe([("AAPL", "Apple Inc."), ("BRKB", "Berkshire Hathaway"), ("Z", "Same Name")])
+    diff = market_data.diff_universe(prev, curr)
+    assert diff["renamed"] == [{"from": "BRK-B", "to": "BRKB"}], diff
+    # 同じ名前の除外が複数あると対応が決まらないので、 追加・除外のまま
+    assert diff["added"] == ["Z"] and diff["removed"] == ["X", "Y"], diff
+    print("  ok: rename_by_security_name")
+
+
+def test_rename_by_ticker_overrides():
+    saved = dict(market_data.TICKER_OVERRIDES)
+    market_data.TICKER_OVERRIDES.clear()
+    market_data.TICKER_OVERRIDES.update({"FI": "FISV"})
+    try:
+        # 前回のスナップショットは旧ティッカー FI (Wikipedia が上場替えを反映する前)
+        prev = _universe([("AAPL", "Apple Inc."), ("FI", "Fiserv")])
+        # 今回の Wikipedia は FI のままでも、 上書き後は FISV になり差分は出ない
+        wiki = _universe([("AAPL", "Apple Inc."), ("FI", "Fiserv Inc"), ("FISV", "Fiserv Inc")])
+        curr = market_data.apply_ticker_overrides(wiki)
+        assert curr["Symbol_YF"].to_list() == ["AAPL", "FISV"], curr
+        assert curr["Symbol"].to_list() == ["AAPL", "FISV"], curr
+        # Security 名が変わっていても既知の変更としてティッカー変更と判定する
+        diff = market_data.diff_universe(prev, curr)
+        assert diff == {"added": [], "removed": [], "renamed": [{"from": "FI", "to": "FISV"}]}, diff
+    finally:
+        market_data.TICKER_OVERRIDES.clear()
+        market_data.TICKER_OVERRIDES.update(saved)
+    print("  ok: rename_by_ticker_overrides")
+
+
+def main() -> int:
+    tests = [
+        test_added_and_removed,
+        test_rename_by_security_name,
+        test_rename_by_ticker_overrides,
+    ]
+    failed = 0
+    for t in tests:
+        try:
+            t()
+        except AssertionError as e:
+            failed += 1
+            print(f"  FAIL: {t.__name__}: {e}")
+        except Exception as e:  # noqa: BLE001
+            failed += 1
+            print(f"  ERROR: {t.__name__}: {type(e).__name__}: {e}")
+    if failed:
+        print(f"\n{failed} 件失敗")
+        return 1
+    print(f"\n{len(tests)} 件すべて成功")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -15,6 +15,10 @@ from typing import Optional
 import numpy as np
 import pandas as pd
 
+# 財務諸表の数値化は code/statement_numeric.py(pandas / numpy のみ)を共有する。
+# code/ を import パスに入れるのは呼び出し側(sources._ensure_code_on_path())
+import statement_numeric
+
 # 損益計算書の行ラベル(defeatbeta / yfinance 双方の表記揺れに対応)。
 # generate_transcript_report._IS_ROW_ALIASES と整合させている。
 IS_ROW_ALIASES = {
@@ -153,6 +157,8 @@ def fundamental_trend(qis_df, max_quarters: int = 8) -> dict:
     df = qis_df
     if "Breakdown" in getattr(df, "columns", []):
         df = df.set_index("Breakdown")
+    # Decimal / 数値文字列 / '*' / None を float64 にそろえる
+    df = statement_numeric.coerce_statement_frame(df)
 
     # 日付に変換できる列だけを四半期列として昇順に並べる
     date_cols = []
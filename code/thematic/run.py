@@ -26,6 +26,8 @@ import time
 # スクリプトのあるディレクトリ(thematic/)を import パスに追加。
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
+import sources  # noqa: E402  (重い依存は関数内で遅延 import。import はオフラインで安全)
+sources._ensure_code_on_path()  # metrics が使う code/statement_numeric.py のため
 import metrics  # noqa: E402  (pandas/numpy のみ。ネットワーク非依存)
 import report  # noqa: E402  (標準ライブラリのみ)
 from theme import list_themes, load_theme  # noqa: E402
@@ -148,8 +150,6 @@ def main() -> int:
         return 0
 
     # ここから先はネットワークが必要。重い依存は sources の関数内で遅延 import。
-    import sources  # noqa: E402
-
     bench_age = None if args.refresh else 12
     if args.limit and args.limit > 0:
         tickers = tickers[: args.limit]
@@ -19,9 +19,12 @@ import pandas as pd
 # thematic/ を import パスに追加(tests/ の 1 つ上)。
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-import metrics  # noqa: E402
 import sources  # noqa: E402
 
+# metrics が使う code/statement_numeric.py のため code/ も import パスに追加
+sources._ensure_code_on_path()
+import metrics  # noqa: E402
+
 
 def _approx(a, b, tol=1e-6):
     return a is not None and abs(a - b) <= tol
@@ -83,6 +86,42 @@ def test_fundamental_trend():
     print("  ok: fundamental_trend")
 
 
+def test_statement_numeric():
+    from decimal import Decimal
+
+    coerce = metrics.statement_numeric.coerce_statement_frame
+    # defeatbeta 形式: Decimal / 数値文字列 / '*' / None が混在する object 列
+    df = pd.DataFrame(
+        {
+            "2025-03-31": [Decimal("100.5"), "*", None, "12", "abc"],
+            "2025-06-30": [Decimal("-2E+3"), 3, float("nan"), "-3.25", Decimal("NaN")],
+        },
+        index=["Total Revenue", "Gross Profit", "Operating Income", "Net Income", "Diluted EPS"],
+        dtype=object,
+    )
+    out = coerce(df)
+    assert list(out.dtypes) == [np.float64, np.float64], out.dtypes
+    assert list(out.index) == list(df.index) and list(out.columns) == list(df.columns)
+    assert out.iloc[0].tolist() == [100.5, -2000.0], out.iloc[0].tolist()
+    assert out.iloc[3].tolist() == [12.0, -3.25], out.iloc[3].tolist()
+    assert out.iloc[1].isna().tolist() == [True, False], out.iloc[1].tolist()
+    assert out.iloc[2].isna().all() and out.iloc[4].isna().all(), out
+    # 数値列だけの DataFrame はそのまま float64 へ
+    out_num = coerce(pd.DataFrame({"a": [1, 2]}))
+    assert out_num["a"].dtype == np.float64 and out_num["a"].tolist() == [1.0, 2.0]
+    # Decimal の損益計算書でも fundamental_trend が計算できること
+    cols = ["2024-03-31", "2024-06-30", "2024-09-30", "2024-12-31", "2025-03-31"]
+    qis = pd.DataFrame(
+        {c: [Decimal(v), Decimal(v) / 5] for c, v in zip(cols, ["100", "110", "120", "130", "150"])},
+        index=["Total Revenue", "Operating Income"],
+        dtype=object,
+    )
+    trend = metrics.fundamental_trend(qis)
+    assert _approx(trend["revenue_yoy_latest"], 0.5, 1e-9), trend
+    assert _approx(trend["operating_margin"], 0.2, 1e-9), trend
+    print("  ok: statement_numeric")
+
+
 def test_transcript_signal_scan():
     df = pd.DataFrame({
         "speaker": ["CEO", "CFO"],
@@ -242,6 +281,7 @@ def main() -> int:
     tests = [
         test_price_metrics,
         test_fundamental_trend,
+        test_statement_numeric,
         test_transcript_signal_scan,
         test_cache_roundtrip,
         test_to_duckdb,
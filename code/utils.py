@@ -1,25 +1,90 @@
 # -*- coding: utf-8 -*-
-import yfinance as yf
-try:
-    from curl_cffi import requests as curl_requests
-    HAS_CURL_CFFI = True
-except ImportError:
-    HAS_CURL_CFFI = False
-    
-import requests as std_requests
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
-
+import importlib
+import importlib.util
 import os
+import sys
 import time
 import random
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future as _Future
 import pandas as pd
 import datetime
 from dotenv import load_dotenv
-from google import genai
-from google.genai import types
-from defeatbeta_api.data.ticker import Ticker as DBTicker
-from yfinance.exceptions import YFRateLimitError
+
+
+# --------------------------------------------------------------------------
+# 重い依存の遅延 import
+# --------------------------------------------------------------------------
+# yfinance / curl_cffi / google.genai / defeatbeta_api は import だけで合計数秒
+# かかる (defeatbeta は duckdb・HF クライアント、 genai は pydantic モデル群を
+# 読み込む)。 utils は analysis 系の補助スクリプトや --help からも import される
+# ため、 モジュール属性への初回アクセス時まで import を遅らせる。
+class _LazyModule:
+    """初回の属性アクセス時に実モジュールを import するプロキシ。"""
+
+    def __init__(self, name, on_load=None):
+        self.__dict__['_name'] = name
+        self.__dict__['_on_load'] = on_load
+        self.__dict__['_module'] = None
+
+    def _load(self):
+        module = self.__dict__['_module']
+        if module is None:
+            module = importlib.import_module(self.__dict__['_name'])
+            on_load = self.__dict__['_on_load']
+            if on_load is not None:
+                on_load()
+            self.__dict__['_module'] = module
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __repr__(self):
+        return f"<lazy module {self.__dict__['_name']!r}>"
+
+
+class _LazyAttr:
+    """遅延 import したモジュールのクラス/関数へのプロキシ (呼び出し・属性参照を委譲)。"""
+
+    def __init__(self, module, attr):
+        self._module = module
+        self._attr = attr
+
+    def _resolve(self):
+        return getattr(self._module, self._attr)
+
+    def __call__(self, *args, **kwargs):
+        return self._resolve()(*args, **kwargs)
+
+    def __getattr__(self, attr):
+        return getattr(self._resolve(), attr)
+
+
+HAS_CURL_CFFI = importlib.util.find_spec("curl_cffi") is not None
+
+yf = _LazyModule("yfinance")
+curl_requests = _LazyModule("curl_cffi.requests")
+genai = _LazyModule("google.genai")
+types = _LazyModule("google.genai.types")
+# defeatbeta は読み込んだ時点で update_time の正規化パッチを当てる
+# (_patch_defeatbeta_update_time の docstring 参照)。
+DBTicker = _LazyAttr(
+    _LazyModule("defeatbeta_api.data.ticker",
+                on_load=lambda: _patch_defeatbeta_update_time()),
+    "Ticker",
+)
+
+
+def _is_yf_rate_limit(e) -> bool:
+    """e が yfinance の YFRateLimitError か判定する。
+
+    yfinance が未 import ならこの例外は発生し得ないので、 判定のために
+    yfinance を import することはしない。"""
+    yf_exceptions = sys.modules.get("yfinance.exceptions")
+    return yf_exceptions is not None and isinstance(e, yf_exceptions.YFRateLimitError)
+
 
 # .envファイルを読み込む
 load_dotenv(os.path.join(os.path.dirname(os.path.dirname(__file__)), ".env"), override=True)
@@ -82,8 +147,6 @@ def _patch_defeatbeta_update_time():
         pass
 
 
-_patch_defeatbeta_update_time()
-
 def get_gemini_client():
     """
     最新の google-genai SDK クライアントを初期化して返します。
@@ -139,6 +202,7 @@ def get_session():
     if HAS_CURL_CFFI:
         session = curl_requests.Session(impersonate="chrome")
     else:
+        import requests as std_requests
         session = std_requests.Session()
     
     headers = {
@@ -154,6 +218,8 @@ def get_session():
     }
     
     if not HAS_CURL_CFFI:
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
         session.headers.update(headers)
         # リトライ設定
         retry = Retry(
@@ -221,7 +287,90 @@ def format_summary(text):
             
     return "".join(formatted_sentences).strip()
 
-def calculate_dcf(symbol, ticker=None, yf_info=None, yf_growth_estimates=None):
+# --------------------------------------------------------------------------
+# マーケット共通入力 (リスクフリーレート / 市場リターン) のラン単位キャッシュ
+# --------------------------------------------------------------------------
+# daily_treasure_yield() は全銘柄で同一の国債利回りテーブルを返すため、 銘柄ごとに
+# ロード → to_datetime → 直近 3 年 median を繰り返すと 1 ランで 1,500 回の冗長な
+# テーブル読み込みになる。 1 ラン (= 1 日) につき 1 度だけ計算して全 DCF で共有する。
+RF_LOOKBACK_YEARS = 3
+_market_inputs_cache = {}
+_market_inputs_lock = threading.Lock()
+
+
+def _latest_sp500_10y_cagr():
+    """defeatbeta 同梱の S&P500 年次リターンから最新の 10Y CAGR を返す (取得不可なら None)。"""
+    try:
+        from defeatbeta_api.utils.util import sp500_cagr_returns_rolling
+        df = sp500_cagr_returns_rolling(10)
+        if df is None or df.empty:
+            return None
+        df = df.sort_values('end_date')
+        return float(df['cagr_returns_10_years'].iloc[-1])
+    except Exception:
+        return None
+
+
+def _compute_market_inputs(db_ticker=None):
+    """国債利回りテーブルから Rf (直近 3 年 median の生値) 等を計算する。"""
+    inputs = {
+        "risk_free_rate_raw": None,
+        "treasure_10y_latest": None,
+        "sp500_10y_cagr": _latest_sp500_10y_cagr(),
+        "db_update_time": None,
+    }
+    _patch_defeatbeta_update_time()
+    try:
+        treasure = db_ticker.treasure if db_ticker is not None else None
+        if treasure is None:
+            from defeatbeta_api.data.treasure import Treasure
+            treasure = Treasure()
+        treasure_df = treasure.daily_treasure_yield()
+        treasure_df['report_date'] = pd.to_datetime(treasure_df['report_date'])
+        treasure_df = treasure_df.sort_values('report_date')
+        cutoff = pd.Timestamp.now() - pd.DateOffset(years=RF_LOOKBACK_YEARS)
+        recent_treasure = treasure_df[treasure_df['report_date'] >= cutoff]
+        yields = recent_treasure['bc_10year'].dropna() if not recent_treasure.empty else None
+        if yields is not None and len(yields) > 0:
+            inputs["risk_free_rate_raw"] = float(yields.median())
+            inputs["treasure_10y_latest"] = float(yields.iloc[-1])
+    except Exception as e:
+        log_event("WARN", "MARKET", f"market inputs: daily_treasure_yield failed: {e}")
+    try:
+        from defeatbeta_api.client.hugging_face_client import HuggingFaceClient
+        inputs["db_update_time"] = HuggingFaceClient().get_data_update_time()
+    except Exception:
+        pass
+    return inputs
+
+
+def get_market_inputs(db_ticker=None, refresh=False):
+    """全銘柄共通のマーケット入力を返す (1 日 1 回だけ計算し、 以降はキャッシュ)。
+
+    戻り値の dict:
+      risk_free_rate_raw: 直近 RF_LOOKBACK_YEARS 年の bc_10year の median (生値。
+        % 形式/小数形式の正規化とクランプは calculate_dcf 側で行う)。
+      treasure_10y_latest: 最新の bc_10year。
+      sp500_10y_cagr: 最新の S&P500 10Y CAGR (小数)。
+      db_update_time: 計算時点の defeatbeta データ更新時刻。
+    並行ワーカーから同時に呼ばれてもロックで 1 度だけ計算する。
+    """
+    key = datetime.date.today().isoformat()
+    with _market_inputs_lock:
+        if not refresh and key in _market_inputs_cache:
+            return _market_inputs_cache[key]
+        inputs = _compute_market_inputs(db_ticker)
+        _market_inputs_cache.clear()
+        _market_inputs_cache[key] = inputs
+        log_event("INFO", "MARKET",
+                  f"market inputs computed: rf_raw={inputs['risk_free_rate_raw']} "
+                  f"sp500_10y_cagr={inputs['sp500_10y_cagr']} "
+                  f"db_update_time={inputs['db_update_time']}")
+        return inputs
+
+
+def calculate_dcf(symbol, ticker=None, yf_info=None, yf_growth_estimates=None,
+                  market_inputs=None):
     """
     詳細なDCF理論株価を計算する。
 
@@ -237,6 +386,8 @@ def calculate_dcf(symbol, ticker=None, yf_info=None, yf_growth_estimates=None):
         payoutRatio) の取得に使う。
       yf_growth_estimates: yfinance.Ticker.growth_estimates 相当の rows list/dict
         (任意)。+5y 期間の stockTrend をアナリスト LT として優先的に使う。
+      market_inputs: get_market_inputs() の戻り値 (任意)。省略時はラン単位の
+        キャッシュから取得する。
     """
     if ticker is None:
         db_ticker = DBTicker(symbol)
@@ -273,6 +424,13 @@ def calculate_dcf(symbol, ticker=None, yf_info=None, yf_growth_estimates=None):
         w_eq          = float(last_wacc_data.get('weight_of_equity', 0.8))
         w_de          = float(last_wacc_data.get('weight_of_debt', 0.2))
 
+        # 国債利回り・S&P500 CAGR は全銘柄共通のため get_market_inputs() で
+        # ラン単位に 1 度だけ集計したものを使う。
+        if market_inputs is None:
+            market_inputs = get_market_inputs(db_ticker)
+        if pd.isna(market_raw) and market_inputs.get("sp500_10y_cagr") is not None:
+            market_raw = market_inputs["sp500_10y_cagr"]
+
         rfr_d    = _to_decimal(rfr_raw,    0.04)
         market_d = _to_decimal(market_raw, 0.10)
         tax_d    = _to_decimal(tax_raw,    0.21)
@@ -316,20 +474,10 @@ def calculate_dcf(symbol, ticker=None, yf_info=None, yf_growth_estimates=None):
         # サニティクランプする (10Y 国債利回りが 10% を超えるのは現代では異常値)。
         # これによって winsorize の floor が cap (20%) を超えて全シグナルが
         # degenerate にクリップされる事故 (= 全シグナル一律 20% になる) を防ぐ。
-        RF_LOOKBACK_YEARS = 3
-        try:
-            treasure_df = db_ticker.treasure.daily_treasure_yield()
-            treasure_df['report_date'] = pd.to_datetime(treasure_df['report_date'])
-            cutoff = pd.Timestamp.now() - pd.DateOffset(years=RF_LOOKBACK_YEARS)
-            recent_treasure = treasure_df[treasure_df['report_date'] >= cutoff]
-            yields = recent_treasure['bc_10year'].dropna() if not recent_treasure.empty else None
-            if yields is not None and len(yields) > 0:
-                raw_rf = float(yields.median())
-            else:
-                raw_rf = rfr_raw
-            risk_free_rate = _to_decimal(raw_rf, rfr_d)
-        except Exception:
-            risk_free_rate = rfr_d
+        raw_rf = market_inputs.get("risk_free_rate_raw")
+        if raw_rf is None:
+            raw_rf = rfr_raw
+        risk_free_rate = _to_decimal(raw_rf, rfr_d)
         # サニティクランプ (0.5% ≤ Rf ≤ 10%)
         risk_free_rate = max(0.005, min(0.10, risk_free_rate))
         wacc_details["risk_free_rate"] = risk_free_rate
@@ -909,6 +1057,49 @@ def _period_span_days(period_label) -> int:
         return None
 
 
+# item_name / breakdown_type / period_label の分類結果はプロセス全体でメモ化する。
+# "United States" や "Europe" 等の同じラベルが S&P 1500 全銘柄で繰り返し現れる
+# ため、 銘柄ごとに Python ループで部分文字列判定をやり直すのは無駄が大きい。
+# 未知のラベルだけを 1 度ベクトル化判定し、 以降は dict 参照で済ませる。
+_GEO_SUBSTRINGS_RE = re.compile('|'.join(re.escape(sub) for sub in _GEO_SUBSTRINGS))
+_geo_item_memo = {}
+_segment_priority_memo = {}
+_period_span_memo = {}
+
+
+def _classify_geo_items(names: "pd.Series") -> "pd.Series":
+    """_is_geo_item() のベクトル化版 (ユニークなラベル列を想定)。"""
+    is_str = names.map(lambda v: isinstance(v, str)).astype(bool)
+    s = names.where(is_str, '').astype(str).str.strip()
+    sl = s.str.lower()
+    two_letter = (s.str.len() == 2) & s.str.isupper() & s.str.isalpha()
+    hit = (
+        sl.isin(_GEO_TOKENS_EXACT)
+        | two_letter
+        | sl.str.contains(_GEO_SUBSTRINGS_RE, regex=True)
+    )
+    return hit & is_str & (sl != '')
+
+
+def _memo_map(values: "pd.Series", memo: dict, classify) -> "pd.Series":
+    """values のユニーク値のうち memo に無いものだけ classify で判定して memo に
+    追加し、 memo を引いた Series を返す。 classify は Series → 同長の iterable。"""
+    uniq = pd.unique(values.dropna())
+    missing = [u for u in uniq if u not in memo]
+    if missing:
+        memo.update(zip(missing, classify(pd.Series(missing, dtype=object))))
+    return values.map(memo)
+
+
+def _geo_item_flags(names: "pd.Series") -> "pd.Series":
+    """item_name 列を _is_geo_item() 相当の bool Series に変換する (メモ化付き)。"""
+    return (
+        _memo_map(names, _geo_item_memo, _classify_geo_items)
+        .fillna(False)
+        .astype(bool)
+    )
+
+
 # 完全分解判定のときに採用する許容誤差 (テーブル合計 / 参照売上 の許容範囲)。
 # XBRL の丸めや小さなセグメント間調整を吸収するため、 ±5% を採用する。
 _COMPLETE_REVENUE_TOL = 0.05
@@ -988,6 +1179,8 @@ def _pivot_breakdown_long_to_wide(long_df: "pd.DataFrame",
     df = long_df.copy()
     if 'item_name' not in df.columns or 'breakdown_type' not in df.columns:
         return pd.DataFrame()
+    # item_name の geo 判定は step 2 と step 3-4 の双方で使うため 1 度だけ行う
+    df['__is_geo'] = _geo_item_flags(df['item_name'])
     # (1) depth=1 のみ採用
     if 'depth' in df.columns:
         depth1 = df[df['depth'] == 1]
@@ -1006,7 +1199,10 @@ def _pivot_breakdown_long_to_wide(long_df: "pd.DataFrame",
     # report_date に年次データしか無いケースを除外し、 通年売上が四半期
     # として表示される異常を防ぐ。
     if 'period_label' in df.columns:
-        df['__span'] = df['period_label'].apply(_period_span_days)
+        df['__span'] = _memo_map(
+            df['period_label'], _period_span_memo,
+            lambda labels: labels.map(_period_span_days),
+        )
         df['__is_q'] = df['__span'].fillna(-1).between(60, 120)
         df['__is_y'] = df['__span'].fillna(-1).between(300, 400)
         # 採用 span は classification (geography/segment) ごとに判定する。
@@ -1017,22 +1213,20 @@ def _pivot_breakdown_long_to_wide(long_df: "pd.DataFrame",
         # 12/31 のような年次データ混入を防ぐ)。 一方、 ターゲット側に
         # 四半期データが無ければ年次データを採用 (ABBV geography は
         # 10-K の年次のみ提供されている)。
-        df['__row_is_geo'] = df['item_name'].apply(_is_geo_item)
         target_geo = (classification == 'geography')
-        target_mask = (df['__row_is_geo'] == target_geo)
+        target_mask = (df['__is_geo'] == target_geo)
         target_has_q = bool(df.loc[target_mask, '__is_q'].any())
         if target_has_q:
             df = df[df['__is_q']].copy()
         else:
             df = df[df['__is_y']].copy()
         df = df.drop(
-            columns=['__span', '__is_q', '__is_y', '__row_is_geo'],
+            columns=['__span', '__is_q', '__is_y'],
             errors='ignore',
         )
     if df.empty:
         return pd.DataFrame()
     # (3) (4) 各テーブルの合計・純度を集計
-    df['__is_geo'] = df['item_name'].apply(_is_geo_item)
     table_stats = (
         df.groupby(['report_date', 'breakdown_type'])
         .agg(
@@ -1073,7 +1267,10 @@ def _pivot_breakdown_long_to_wide(long_df: "pd.DataFrame",
         candidates = table_stats[table_stats['__complete'] & table_stats['__pure_seg']].copy()
         if candidates.empty:
             return pd.DataFrame()
-        candidates['__prio'] = candidates['breakdown_type'].apply(_segment_table_priority)
+        candidates['__prio'] = _memo_map(
+            candidates['breakdown_type'], _segment_priority_memo,
+            lambda bts: bts.map(_segment_table_priority),
+        )
         # Statement Table 等の優先度対象外テーブルは採用候補から外す
         candidates = candidates[candidates['__prio'].notna()]
         if candidates.empty:
@@ -1099,6 +1296,110 @@ def _pivot_breakdown_long_to_wide(long_df: "pd.DataFrame",
     return pivot
 
 
+# --------------------------------------------------------------------------
+# Yahoo quoteSummary のまとめ取得
+# --------------------------------------------------------------------------
+# yfinance は info / calendar / recommendations / upgrades_downgrades /
+# earnings_estimate / revenue_estimate / eps_trend / eps_revisions / holders /
+# sustainability を、 同じ quoteSummary エンドポイントへ「プロパティごとに
+# 1 リクエスト」で取りに行く (1 銘柄あたり約 10 リクエスト)。 ここでは yf.Ticker
+# 内部のスクレイパー (_quote / _analysis / _holders) の _fetch を差し替え、 初回
+# アクセス時にグループ内の全モジュールを 1 リクエストで取得してキャッシュし、
+# 以降は要求されたモジュールだけを切り出した同じ形のレスポンスを返す。
+# パースは yfinance 自身が行うため、 返る DataFrame / dict は従来と同一。
+_QUOTE_SUMMARY_MODULE_GROUPS = (
+    # info (+ analyst_price_targets) / calendar / recommendations /
+    # upgrades_downgrades / sustainability
+    ('financialData', 'quoteType', 'defaultKeyStatistics', 'assetProfile',
+     'summaryDetail', 'calendarEvents', 'recommendationTrend',
+     'upgradeDowngradeHistory', 'esgScores'),
+    # earnings/revenue_estimate, eps_trend/revisions, growth_estimates,
+    # earnings_history, holders 一式
+    ('earningsTrend', 'earningsHistory', 'industryTrend', 'sectorTrend',
+     'indexTrend', 'institutionOwnership', 'fundOwnership', 'majorDirectHolders',
+     'majorHoldersBreakdown', 'insiderTransactions', 'insiderHolders',
+     'netSharePurchaseActivity'),
+)
+# yfinance の Holders._fetch() が要求するモジュール (引数を取らないため固定)
+_HOLDER_MODULES = ('institutionOwnership', 'fundOwnership', 'majorDirectHolders',
+                   'majorHoldersBreakdown', 'insiderTransactions', 'insiderHolders',
+                   'netSharePurchaseActivity')
+
+
+class _QuoteSummaryBatch:
+    """1 銘柄分の quoteSummary をモジュールグループ単位でまとめ取得・キャッシュする。"""
+
+    def __init__(self, yf_ticker):
+        self._yf_ticker = yf_ticker
+        self._modules = {}       # module 名 → レスポンス本体
+        self._done = set()       # 取得を試みたグループ index
+        self._failed = set()     # まとめ取得に失敗したグループ index (個別取得へフォールバック)
+        self._lock = threading.Lock()
+
+    def _fetch_group(self, gi):
+        from yfinance.config import YfConfig
+        from yfinance.scrapers.quote import _QUOTE_SUMMARY_URL_
+        symbol = self._yf_ticker.ticker
+        params = {
+            "modules": ",".join(_QUOTE_SUMMARY_MODULE_GROUPS[gi]),
+            "corsDomain": "finance.yahoo.com",
+            "formatted": "false",
+            "symbol": symbol,
+            "lang": YfConfig.locale.lang,
+            "region": YfConfig.locale.region,
+        }
+        try:
+            data = self._yf_ticker._data.get_raw_json(
+                _QUOTE_SUMMARY_URL_ + f"/{symbol}", params=params)
+            result = ((data or {}).get("quoteSummary") or {}).get("result") or []
+            if not result:
+                raise ValueError(f"empty quoteSummary result: {data}")
+            self._modules.update(result[0])
+        except Exception as e:
+            # rate limit は呼び出し側 (safe_get / ブレーカー) に伝える。 それ以外は
+            # 個別取得にフォールバックさせる (銘柄ごとに欠けるモジュールがあるため)。
+            if is_rate_limit_error(e):
+                raise
+            log_event("DEBUG", symbol, f"quoteSummary batch {gi} failed, falling back: {e}")
+            self._failed.add(gi)
+        self._done.add(gi)
+
+    def serve(self, modules, fallback):
+        """modules 分のレスポンスを yfinance の _fetch と同じ形で返す。"""
+        wanted = list(modules)
+        groups = set()
+        for m in wanted:
+            gi = next((i for i, g in enumerate(_QUOTE_SUMMARY_MODULE_GROUPS) if m in g), None)
+            if gi is None:
+                return fallback(modules)
+            groups.add(gi)
+        with self._lock:
+            for gi in sorted(groups):
+                if gi not in self._done:
+                    self._fetch_group(gi)
+            if groups & self._failed:
+                return fallback(modules)
+            entry = {m: self._modules[m] for m in wanted if m in self._modules}
+        return {"quoteSummary": {"result": [entry], "error": None}}
+
+
+def enable_quote_summary_batching(yf_ticker):
+    """yf.Ticker の quoteSummary 系取得をまとめ取得に切り替えて返す。
+
+    yfinance の内部構造が想定と異なる (バージョン差異) 場合は何もせずそのまま返す。"""
+    try:
+        quote, analysis, holders = yf_ticker._quote, yf_ticker._analysis, yf_ticker._holders
+        orig_quote, orig_analysis, orig_holders = quote._fetch, analysis._fetch, holders._fetch
+    except AttributeError:
+        return yf_ticker
+    batch = _QuoteSummaryBatch(yf_ticker)
+    quote._fetch = lambda modules: batch.serve(modules, orig_quote)
+    analysis._fetch = lambda modules: batch.serve(modules, orig_analysis)
+    holders._fetch = lambda: batch.serve(list(_HOLDER_MODULES), lambda _m: orig_holders())
+    yf_ticker._quote_summary_batch = batch
+    return yf_ticker
+
+
 class YFinanceAdapterTicker:
     def __init__(self, symbol):
         self.ticker = symbol
@@ -1111,7 +1412,9 @@ class YFinanceAdapterTicker:
             global _shared_session
             if _shared_session is None:
                 _shared_session = get_session()
-            self._yf_ticker_cached = yf.Ticker(self.ticker, session=_shared_session)
+            # quoteSummary 系プロパティは 1〜2 リクエストにまとめて取得する
+            self._yf_ticker_cached = enable_quote_summary_batching(
+                yf.Ticker(self.ticker, session=_shared_session))
         return self._yf_ticker_cached
 
     def history(self, period="10y", start=None, end=None, **kwargs):
@@ -1528,19 +1831,18 @@ class YFinanceAdapterTicker:
     def _revenue_breakdown_raw(self, period_type='quarterly'):
         """defeatbeta 0.0.58 の {quarterly,trailing}_revenue_by_breakdown() 結果を
         旧 (0.0.57) スキーマに変換して period_type ごとにキャッシュ。"""
-        if not hasattr(self, '_breakdown_cache'):
-            self._breakdown_cache = {}
-        if period_type not in self._breakdown_cache:
+        def load():
             method = (self._db_ticker.quarterly_revenue_by_breakdown
                       if period_type == 'quarterly'
                       else self._db_ticker.trailing_revenue_by_breakdown)
             try:
-                self._breakdown_cache[period_type] = _adapt_breakdown_schema(method())
+                return _adapt_breakdown_schema(method())
             except Exception as e:
                 log_event("DEBUG", self.ticker,
                           f"Error in {period_type}_revenue_by_breakdown: {e}")
-                self._breakdown_cache[period_type] = pd.DataFrame()
-        return self._breakdown_cache[period_type]
+                return pd.DataFrame()
+        # get_ticker は呼び出しごとに新しいインスタンスを返すため、 銘柄単位で共有する
+        return _breakdown_cache().get_or_load((self.ticker, period_type), load)
 
     def _breakdown_wide(self, classification):
         """quarterly を主データに分類別ワイド表を作る。 当該分類が quarterly に
@@ -1574,11 +1876,211 @@ def get_ticker(symbol):
     """
     return YFinanceAdapterTicker(symbol)
 
+# --------------------------------------------------------------------------
+# サーキットブレーカー (上流 × エンドポイント種別)
+# --------------------------------------------------------------------------
+# Yahoo が runner の IP をブロックすると、 全銘柄 × 全フィールドが 429 の
+# リトライ (15〜30 秒 × 数回) を律儀に繰り返し、 ラン全体が何時間も sleep する。
+# 短時間に上流の障害 (rate limit・タイムアウト・接続エラー・5xx) が続いた
+# エンドポイント種別はブレーカーを open にして即座に諦め (default / None を返す)、
+# cooldown 後に 1 リクエストだけ試す (half-open)。 その probe が応答を得れば
+# close に戻し、 失敗すれば再び open にする。 404 やデータの不備は上流が応答して
+# いるので成功として扱う。
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", 5))
+BREAKER_WINDOW_SECONDS = float(os.getenv("BREAKER_WINDOW_SECONDS", 120))
+BREAKER_COOLDOWN_SECONDS = float(os.getenv("BREAKER_COOLDOWN_SECONDS", 300))
+
+# yfinance の属性名 → Yahoo 側のエンドポイント種別。 同じ種別は同じ API を
+# 叩くため、 1 つが rate limit されれば他も同様に弾かれる。
+_ENDPOINT_CLASSES = {
+    'history': 'chart',
+    'dividends': 'chart',
+    'earnings_dates': 'earnings_dates',
+    'income_stmt': 'timeseries',
+    'balance_sheet': 'timeseries',
+    'balancesheet': 'timeseries',
+    'cashflow': 'timeseries',
+    'quarterly_income_stmt': 'timeseries',
+    'quarterly_balance_sheet': 'timeseries',
+    'quarterly_balancesheet': 'timeseries',
+    'quarterly_cashflow': 'timeseries',
+}
+
+
+def endpoint_class(name):
+    """属性名/フィールド名をエンドポイント種別に変換する (既定は quoteSummary)。"""
+    return _ENDPOINT_CLASSES.get(name, 'quote_summary')
+
+
+def is_rate_limit_error(e) -> bool:
+    """例外が上流の rate limit (429) を表すか判定する。"""
+    if _is_yf_rate_limit(e):
+        return True
+    err_str = str(e)
+    return "Too Many Requests" in err_str or "429" in err_str or "Rate limited" in err_str
+
+
+# requests / curl_cffi の通信エラーの例外クラス名 (ライブラリを import せずに判定する)
+_TRANSPORT_ERROR_NAMES = {
+    "Timeout", "ConnectTimeout", "ReadTimeout", "ConnectionError", "ProxyError",
+    "SSLError", "ChunkedEncodingError",
+}
+_SERVER_ERROR_PATTERN = re.compile(
+    r"\b5\d\d\b[^\n]*(Server Error|Bad Gateway|Service Unavailable|Gateway Time-?out)"
+    r"|Internal Server Error|Bad Gateway|Service Unavailable|Gateway Time-?out",
+    re.IGNORECASE,
+)
+
+
+def is_upstream_failure(e) -> bool:
+    """例外が上流の障害 (rate limit・タイムアウト・接続エラー・5xx) を表すか判定する。
+
+    404 やレスポンスの解析エラーは上流が応答しているので含めない。"""
+    if is_rate_limit_error(e) or isinstance(e, (TimeoutError, ConnectionError)):
+        return True
+    if any(cls.__name__ in _TRANSPORT_ERROR_NAMES for cls in type(e).__mro__):
+        return True
+    status = getattr(getattr(e, "response", None), "status_code", None)
+    if isinstance(status, int) and status >= 500:
+        return True
+    return bool(_SERVER_ERROR_PATTERN.search(str(e)))
+
+
+class CircuitBreaker:
+    """closed → (短時間に失敗が閾値到達) → open → (cooldown 経過) → half_open
+    → (probe 成功) → closed / (probe 失敗) → open と遷移するブレーカー。
+
+    half_open 中は probe を送ったスレッドの結果だけで遷移する (closed の間に
+    送られて遅れて返ってきたリクエストの結果では閉じない / 開かない)。
+    clock は経過時間の計測に使う関数 (テストで差し替える)。"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name, failure_threshold=None, window_seconds=None,
+                 cooldown_seconds=None, clock=time.monotonic):
+        self.name = name
+        self._clock = clock
+        self.failure_threshold = failure_threshold or BREAKER_FAILURE_THRESHOLD
+        self.window_seconds = window_seconds or BREAKER_WINDOW_SECONDS
+        self.cooldown_seconds = cooldown_seconds or BREAKER_COOLDOWN_SECONDS
+        self.state = self.CLOSED
+        self.rejected = 0
+        self.transitions = 0
+        self._failures = []
+        self._opened_at = 0.0
+        self._probe_owner = None  # probe を送ったスレッドの ident
+        self._lock = threading.Lock()
+
+    def _transition(self, new_state, reason):
+        old_state, self.state = self.state, new_state
+        self.transitions += 1
+        log_event("WARN" if new_state == self.OPEN else "INFO", "BREAKER",
+                  f"{self.name}: {old_state} -> {new_state} ({reason})")
+
+    def allow(self) -> bool:
+        """リクエストを送ってよいか。 open 中は False (rejected を数える)。"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN:
+                if self._clock() - self._opened_at < self.cooldown_seconds:
+                    self.rejected += 1
+                    return False
+                self._transition(self.HALF_OPEN, "cooldown elapsed, probing")
+            # half_open: probe は同時に 1 つだけ
+            if self._probe_owner is not None:
+                self.rejected += 1
+                return False
+            self._probe_owner = threading.get_ident()
+            return True
+
+    def _is_probe_locked(self):
+        return self.state == self.HALF_OPEN and self._probe_owner == threading.get_ident()
+
+    def record_success(self):
+        """上流から応答を得た (404 等を含む)。 half_open の probe なら close に戻す。"""
+        with self._lock:
+            if self._is_probe_locked():
+                self._probe_owner = None
+                self._failures.clear()
+                self._transition(self.CLOSED, "probe succeeded")
+
+    def record_failure(self):
+        """上流の障害。 閾値に達したら open、 half_open の probe なら再び open にする。"""
+        with self._lock:
+            now = self._clock()
+            if self.state == self.HALF_OPEN:
+                if self._is_probe_locked():
+                    self._probe_owner = None
+                    self._opened_at = now
+                    self._transition(self.OPEN, "probe failed")
+                return
+            if self.state == self.OPEN:
+                return
+            self._failures = [t for t in self._failures if now - t <= self.window_seconds]
+            self._failures.append(now)
+            if len(self._failures) >= self.failure_threshold:
+                self._opened_at = now
+                self._transition(
+                    self.OPEN,
+                    f"{len(self._failures)} failures within {self.window_seconds:.0f}s",
+                )
+
+    def record_error(self, e):
+        """リクエストの例外 e を記録する (上流の障害なら失敗、 それ以外は応答ありの成功)。"""
+        if is_upstream_failure(e):
+            self.record_failure()
+        else:
+            self.record_success()
+
+    @property
+    def is_closed(self) -> bool:
+        return self.state == self.CLOSED
+
+
+_circuit_breakers = {}
+_circuit_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(upstream, endpoint):
+    """(upstream, endpoint) ごとのブレーカーを返す (プロセス内で共有)。"""
+    key = f"{upstream}/{endpoint}"
+    with _circuit_breakers_lock:
+        breaker = _circuit_breakers.get(key)
+        if breaker is None:
+            breaker = _circuit_breakers[key] = CircuitBreaker(key)
+        return breaker
+
+
+def _breaker_for(ticker_obj, name):
+    """ticker オブジェクトの種類と属性名から該当するブレーカーを返す。"""
+    module = type(ticker_obj).__module__ or ""
+    upstream = "defeatbeta" if module.startswith("defeatbeta_api") else "yahoo"
+    return get_circuit_breaker(upstream, endpoint_class(name))
+
+
+def circuit_breaker_summary():
+    """状態遷移のあったブレーカーの状態と、 open 中に諦めたリクエスト数を返す。"""
+    with _circuit_breakers_lock:
+        breakers = list(_circuit_breakers.values())
+    return {
+        b.name: {"state": b.state, "rejected": b.rejected, "transitions": b.transitions}
+        for b in breakers if b.transitions or b.rejected
+    }
+
+
 def safe_get(ticker_obj, attr_name, default=None, max_retries=3):
     """
     Safely access yfinance Ticker properties with retries and throttling.
+    The upstream circuit breaker short-circuits to `default` while open.
     """
     symbol = getattr(ticker_obj, 'ticker', 'Unknown')
+    breaker = _breaker_for(ticker_obj, attr_name)
+    if not breaker.allow():
+        log_event("DEBUG", symbol, f"Circuit {breaker.name} open. Skipping {attr_name}")
+        return default
     
     # 連続リクエストを避けるための微小なスロットリング
     time.sleep(random.uniform(0.1, 0.3))
@@ -1586,26 +2088,28 @@ def safe_get(ticker_obj, attr_name, default=None, max_retries=3):
     for attempt in range(max_retries):
         try:
             val = getattr(ticker_obj, attr_name, None)
+            breaker.record_success()
             if val is not None:
                 # If it's a dataframe, check if it's empty
                 if hasattr(val, 'empty') and val.empty:
                     return default
                 return val
             return default
-        except YFRateLimitError:
-            wait_time = (attempt + 1) * 15 + random.uniform(0, 10)
-            log_event("WARN", symbol, f"Rate limited on {attr_name}. Waiting {wait_time:.1f}s (Attempt {attempt+1}/{max_retries})")
-            time.sleep(wait_time)
         except Exception as e:
-            err_str = str(e)
-            if "Too Many Requests" in err_str or "429" in err_str or "Rate limited" in err_str:
+            if is_rate_limit_error(e):
+                breaker.record_failure()
+                if not breaker.is_closed:
+                    log_event("WARN", symbol, f"Rate limited on {attr_name}. Circuit {breaker.name} open, giving up")
+                    break
                 wait_time = (attempt + 1) * 15 + random.uniform(0, 10)
-                log_event("WARN", symbol, f"429 error on {attr_name}. Waiting {wait_time:.1f}s (Attempt {attempt+1}/{max_retries})")
+                log_event("WARN", symbol, f"Rate limited on {attr_name}. Waiting {wait_time:.1f}s (Attempt {attempt+1}/{max_retries})")
                 time.sleep(wait_time)
                 continue
             
             # 404などはリトライせずスキップ
             # yfinance internally might print "404 Not Found" but not raise Exception for some properties
+            # (タイムアウト・5xx は上流の障害としてブレーカーに記録する)
+            breaker.record_error(e)
             log_event("DEBUG", symbol, f"Failed to get {attr_name}: {e}")
             break
             
@@ -1614,11 +2118,16 @@ def safe_get(ticker_obj, attr_name, default=None, max_retries=3):
 def safe_call(ticker_obj, method_name, *args, **kwargs):
     """
     Safely call yfinance Ticker methods with retries and throttling.
+    The upstream circuit breaker short-circuits to None while open.
     """
     symbol = getattr(ticker_obj, 'ticker', 'Unknown')
     # Extract max_retries if present, default to 3
     # Use a copy to avoid modifying kwargs if it's reused
     retries = kwargs.pop('max_retries', 3)
+    breaker = _breaker_for(ticker_obj, method_name)
+    if not breaker.allow():
+        log_event("DEBUG", symbol, f"Circuit {breaker.name} open. Skipping {method_name}")
+        return None
     
     # 連続リクエストを避けるための微小なスロットリング
     time.sleep(random.uniform(0.1, 0.3))
@@ -1626,21 +2135,204 @@ def safe_call(ticker_obj, method_name, *args, **kwargs):
     for attempt in range(retries):
         try:
             method = getattr(ticker_obj, method_name)
-            return method(*args, **kwargs)
-        except YFRateLimitError:
-            wait_time = (attempt + 1) * 20 + random.uniform(0, 10)
-            log_event("WARN", symbol, f"Rate limited on {method_name}. Waiting {wait_time:.1f}s (Attempt {attempt+1}/{retries})")
-            time.sleep(wait_time)
+            result = method(*args, **kwargs)
+            breaker.record_success()
+            return result
         except Exception as e:
-            err_str = str(e)
-            if "Too Many Requests" in err_str or "429" in err_str or "Rate limited" in err_str:
+            if is_rate_limit_error(e):
+                breaker.record_failure()
+                if not breaker.is_closed:
+                    log_event("WARN", symbol, f"Rate limited on {method_name}. Circuit {breaker.name} open, giving up")
+                    break
                 wait_time = (attempt + 1) * 20 + random.uniform(0, 10)
-                log_event("WARN", symbol, f"429 error on {method_name}. Waiting {wait_time:.1f}s (Attempt {attempt+1}/{retries})")
+                log_event("WARN", symbol, f"Rate limited on {method_name}. Waiting {wait_time:.1f}s (Attempt {attempt+1}/{retries})")
                 time.sleep(wait_time)
                 continue
             
             # その他のエラーはログに記録して再スロー
+            # (タイムアウト・5xx は上流の障害としてブレーカーに記録する)
+            breaker.record_error(e)
             log_event("ERROR", symbol, f"Error calling {method_name}: {e}")
             raise e
             
     return None
+
+# --------------------------------------------------------------------------
+# 上限付きキャッシュ (LRU × バイト数上限 × TTL、 single-flight)
+# --------------------------------------------------------------------------
+# モジュールグローバルの dict キャッシュは追い出しが無く、 全銘柄を回すと
+# 際限なく膨らむ。 また「無ければ取得」を複数スレッドが同時に行うと同じ
+# 銘柄を重複して取得する。 BoundedCache は合計サイズ (推定バイト数) が上限を
+# 超えたら古い順に追い出し、 同じキーの取得は 1 回にまとめる (他のスレッドは
+# その結果を待つ)。 ヒット / ミス / 追い出し件数は cache_summary() で集計する。
+
+
+def estimate_size(value):
+    """キャッシュ値のおおよそのバイト数。"""
+    if value is None:
+        return 0
+    try:
+        if hasattr(value, "estimated_size"):  # polars
+            return int(value.estimated_size())
+        if hasattr(value, "memory_usage"):  # pandas
+            usage = value.memory_usage(deep=True)
+            return int(usage.sum() if hasattr(usage, "sum") else usage)
+        if hasattr(value, "nbytes"):  # numpy
+            return int(value.nbytes)
+        if isinstance(value, str):
+            return len(value.encode("utf-8"))
+    except Exception:
+        pass
+    return sys.getsizeof(value)
+
+
+class BoundedCache:
+    """LRU + バイト数上限 + TTL (任意) のスレッドセーフなキャッシュ。
+
+    max_bytes: 合計サイズの上限 (None なら無制限)。 上限を超える値は保存しない
+    ttl_seconds: 保存からの有効期間 (None なら無期限)
+    """
+
+    def __init__(self, name, max_bytes=None, ttl_seconds=None, sizeof=estimate_size):
+        self.name = name
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._sizeof = sizeof
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (value, size, stored_at)
+        self._inflight = {}            # key -> Future
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.coalesced = 0
+
+    def _lookup_locked(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return False, None
+        value, size, stored_at = entry
+        if self.ttl_seconds is not None and time.monotonic() - stored_at > self.ttl_seconds:
+            del self._entries[key]
+            self.bytes -= size
+            self.expirations += 1
+            return False, None
+        self._entries.move_to_end(key)
+        return True, value
+
+    def _store_locked(self, key, value):
+        size = self._sizeof(value)
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self.bytes -= old[1]
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+        self._entries[key] = (value, size, time.monotonic())
+        self.bytes += size
+        while self.max_bytes is not None and self.bytes > self.max_bytes:
+            _, (_, evicted_size, _) = self._entries.popitem(last=False)
+            self.bytes -= evicted_size
+            self.evictions += 1
+
+    def get(self, key, default=None):
+        with self._lock:
+            found, value = self._lookup_locked(key)
+            if found:
+                self.hits += 1
+                return value
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        with self._lock:
+            self._store_locked(key, value)
+
+    def get_or_load(self, key, loader, cache_none=False):
+        """キーの値を返す。 無ければ loader() で取得して保存する。
+
+        同じキーを同時に要求したスレッドは 1 回の loader() の結果を共有する
+        (loader の例外も共有する)。 cache_none=False なら None は保存しない。
+        """
+        with self._lock:
+            found, value = self._lookup_locked(key)
+            if found:
+                self.hits += 1
+                return value
+            self.misses += 1
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = _Future()
+            else:
+                self.coalesced += 1
+        if not leader:
+            return future.result()
+        try:
+            value = loader()
+        except BaseException as e:
+            with self._lock:
+                del self._inflight[key]
+            future.set_exception(e)
+            raise
+        with self._lock:
+            if value is not None or cache_none:
+                self._store_locked(key, value)
+            del self._inflight[key]
+        future.set_result(value)
+        return value
+
+    def __contains__(self, key):
+        with self._lock:
+            return self._lookup_locked(key)[0]
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries), "bytes": self.bytes, "max_bytes": self.max_bytes,
+                "hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                "expirations": self.expirations, "coalesced": self.coalesced,
+            }
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_cache(name, max_bytes=None, ttl_seconds=None, sizeof=estimate_size):
+    """名前付きの BoundedCache を返す (プロセス内で共有、 設定は初回のみ有効)。"""
+    with _caches_lock:
+        cache = _caches.get(name)
+        if cache is None:
+            cache = _caches[name] = BoundedCache(name, max_bytes, ttl_seconds, sizeof)
+        return cache
+
+
+def _breakdown_cache():
+    """売上内訳 (defeatbeta) の共有キャッシュ。"""
+    return get_cache("revenue_breakdown", max_bytes=int(float(os.getenv("BREAKDOWN_CACHE_MB", 128)) * 1024 * 1024))
+
+
+def cache_summary():
+    """使われたキャッシュのヒット / ミス / 追い出し件数とサイズを返す。"""
+    with _caches_lock:
+        caches = list(_caches.values())
+    return {c.name: c.stats() for c in caches if c.hits or c.misses}
+
+
+def log_cache_summary():
+    """cache_summary() を run_log に記録する。"""
+    for name, st in cache_summary().items():
+        log_event("INFO", "CACHE",
+                  f"{name}: hits={st['hits']} misses={st['misses']} coalesced={st['coalesced']} "
+                  f"evictions={st['evictions']} expirations={st['expirations']} "
+                  f"entries={st['entries']} bytes={st['bytes']}")
@@ -0,0 +1,41 @@
+// 累積リターン比較チャートの共有ベンチマーク系列の展開ヘルパー。
+// generate_json_reports.py はセクター ETF・S&P 500 の期間ごとの累積リターン系列を
+// 各レポートに埋め込まず、reports/performance/benchmarks.json に 1 回だけ書き出す。
+// 開始日が共有系列と一致する trace には meta.dataset で参照だけが入っているので、
+// SSR 時にここで x / y を補い、従来と同じ Plotly 形式の図にしてから ChartJs に渡す。
+
+import { loadSharedDataset } from "./shared-dataset";
+
+interface BenchmarkSeries {
+  start: string;
+  x: string[];
+  y: (number | null)[];
+}
+
+interface BenchmarkDataset {
+  version: number;
+  last_date: string | null;
+  symbols: Record<string, Record<string, BenchmarkSeries>>;
+}
+
+/**
+ * performance チャートのうち共有ベンチマーク系列を参照している trace に値を補う。
+ * 読めなければ系列なしのまま返す (対象銘柄の系列は表示される)。
+ */
+export async function resolveBenchmarkSeries(
+  chart: any,
+  env: unknown,
+  siteUrl: URL
+): Promise<any> {
+  const traces: any[] = chart?.data || [];
+  for (const trace of traces) {
+    const meta = trace?.meta;
+    if (!meta?.dataset) continue;
+    const dataset = await loadSharedDataset<BenchmarkDataset>(env, siteUrl, meta.dataset);
+    const series = dataset?.symbols?.[meta.symbol]?.[meta.period];
+    if (!series) continue;
+    Object.assign(trace, { x: series.x, y: series.y });
+    delete trace.meta;
+  }
+  return chart;
+}
@@ -0,0 +1,60 @@
+// リスク・リターン散布図の共有データセットの読み込み・展開ヘルパー。
+// generate_json_reports.py は全銘柄の HV / リターン (「その他の銘柄」の点) を
+// 各レポートに埋め込まず、指数ごとの reports/risk_return/<指数>.json に 1 回だけ
+// 書き出す。レポート側の該当 trace には meta.dataset で参照だけが入っているので、
+// SSR 時にここで点を補い、従来と同じ Plotly 形式の図にしてから ChartJs に渡す。
+
+import { loadSharedDataset } from "./shared-dataset";
+
+interface ScatterPeriod {
+  label: string;
+  symbols: string[];
+  names: (string | null)[];
+  hv: (number | null)[];
+  ret: (number | null)[];
+}
+
+interface ScatterDataset {
+  version: number;
+  index: string | null;
+  periods: Record<string, ScatterPeriod>;
+}
+
+const clip = (v: number | null, lo: number, hi: number) =>
+  v === null || v === undefined ? null : Math.min(hi, Math.max(lo, v));
+
+/**
+ * risk_return チャートのうち共有データセットを参照している trace に点を補う。
+ * データセットが読めなければ点なしのまま返す (対象銘柄などの点は表示される)。
+ */
+export async function resolveScatterDataset(
+  chart: any,
+  env: unknown,
+  siteUrl: URL
+): Promise<any> {
+  const traces: any[] = chart?.data || [];
+  for (const trace of traces) {
+    const meta = trace?.meta;
+    if (!meta?.dataset) continue;
+    const period = (await loadSharedDataset<ScatterDataset>(env, siteUrl, meta.dataset))?.periods?.[meta.period];
+    if (!period) continue;
+    const [minX, maxX, minY, maxY] = meta.range;
+    const exclude = new Set<string>(meta.exclude || []);
+    const x: (number | null)[] = [];
+    const y: (number | null)[] = [];
+    const text: string[] = [];
+    const customdata: any[] = [];
+    period.symbols.forEach((symbol, i) => {
+      if (exclude.has(symbol)) return;
+      const hv = period.hv[i];
+      const ret = period.ret[i];
+      x.push(clip(hv, minX, maxX));
+      y.push(clip(ret, minY, maxY));
+      text.push(symbol);
+      customdata.push([hv, ret, symbol, period.names[i] ?? null]);
+    });
+    Object.assign(trace, { x, y, text, customdata });
+    delete trace.meta;
+  }
+  return chart;
+}
@@ -0,0 +1,53 @@
+// レポート間で共有するデータファイル (reports/ 以下の JSON) の読み込みヘルパー。
+// generate_json_reports.py は全レポートで同じになるデータ (散布図の全銘柄の点、
+// セクター ETF・指数の累積リターン系列など) を各レポートに埋め込まず、
+// 共有ファイルに 1 回だけ書き出す。レポート側の trace には meta.dataset で
+// 参照だけが入っているので、SSR 時に各 resolve* ヘルパーがここで読んで補う。
+
+// 同じ isolate 内ではファイルごとに 1 回だけ読む
+const datasetCache = new Map<string, Promise<unknown | null>>();
+
+async function fetchDataset(
+  env: unknown,
+  siteUrl: URL,
+  relPath: string
+): Promise<unknown | null> {
+  const key = `reports/${relPath}`;
+  // 1) 本番: R2 バインディングから読む
+  try {
+    const bucket = (env as any)?.STOCK_DATA;
+    if (bucket) {
+      const object = await bucket.get(key);
+      if (object) return JSON.parse(await object.text());
+    }
+  } catch (e) {
+    if (import.meta.env.DEV)
+      console.error(`R2 shared dataset fetch failed (${key}):`, e);
+  }
+  // 2) ローカル開発フォールバック: public/ の静的ファイル
+  try {
+    const resp = await fetch(new URL(`/${key}`, siteUrl));
+    if (resp.ok) return await resp.json();
+  } catch (e) {
+    if (import.meta.env.DEV)
+      console.error(`Local shared dataset fetch failed (${key}):`, e);
+  }
+  return null;
+}
+
+export function loadSharedDataset<T>(
+  env: unknown,
+  siteUrl: URL,
+  relPath: string
+): Promise<T | null> {
+  let p = datasetCache.get(relPath);
+  if (!p) {
+    p = fetchDataset(env, siteUrl, relPath);
+    datasetCache.set(relPath, p);
+    // 失敗はキャッシュしない (次のリクエストで再試行する)
+    p.then(d => {
+      if (!d) datasetCache.delete(relPath);
+    });
+  }
+  return p as Promise<T | null>;
+}